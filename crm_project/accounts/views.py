@@ -28,7 +28,6 @@ def get_user_info(request):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def change_password(request):
-    print(request.body)
     serializer = ChangePasswordSerializer(data=request.data)
     
     if serializer.is_valid():
@@ -1,6 +1,22 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
 
 
 class CrmConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'crm'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .search import setup_search_after_migrate
+
+        # full-text search tables/indexes live outside the model definitions
+        post_migrate.connect(setup_search_after_migrate, sender=self, dispatch_uid='crm_setup_search')
+
+        from crm_project.database import apply_sqlite_pragmas
+        connection_created.connect(apply_sqlite_pragmas, dispatch_uid='crm_sqlite_pragmas')
+
+        from .metrics import install_query_recorder
+        # counts the SQL of sampled requests (crm.middleware.RequestMetricsMiddleware)
+        connection_created.connect(install_query_recorder, dispatch_uid='crm_query_metrics')
@@ -0,0 +1,178 @@
+# crm_project/crm/async_views.py
+
+import json
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from .companies import acompany_ids_for
+from .etags import aconditional_list
+from .fastpath import CAR_ROWS, CUSTOMER_ROWS, LEASING_ROWS, TRANSACTION_ROWS
+from .filters import CAR_FILTERS, CAR_ORDERING, CUSTOMER_FILTERS, CUSTOMER_ORDERING, filter_queryset, get_ordering
+from .models import Cars, Customer, Leasing, OutOfStockError, Transaction
+from .pagination import apaginate
+from .renderers import json_response
+from .serializers import CarImportSerializer, CarSerializer, CustomerCreateSerializer, CustomerSerializer
+
+
+# Native async versions of the hot API endpoints for the ASGI entry point.
+# DRF function views are sync only, so these are plain Django async views
+# with the same JWT authentication, responses and error bodies.
+
+jwt_authentication = JWTAuthentication()
+
+
+async def authenticate(request):
+    """The user of the request's JWT access token, or None. Only the user lookup hits the database."""
+    header = jwt_authentication.get_header(request)
+    raw_token = jwt_authentication.get_raw_token(header) if header else None
+    if raw_token is None:
+        return None
+    try:
+        token = jwt_authentication.get_validated_token(raw_token)
+        user = await User.objects.aget(**{jwt_settings.USER_ID_FIELD: token[jwt_settings.USER_ID_CLAIM]})
+    except (InvalidToken, KeyError, User.DoesNotExist):
+        return None
+    return user if user.is_active else None
+
+
+def async_endpoint(*methods):
+    """Method check, JWT authentication and company scope for an async view."""
+    def decorator(view):
+        @wraps(view)
+        async def wrapped(request, *args, **kwargs):
+            if request.method not in methods:
+                return json_response({'error': 'Invalid request method.'}, status=400)
+            user = await authenticate(request)
+            if user is None:
+                return json_response({'detail': 'Authentication credentials were not provided.'}, status=401)
+            request.user = user
+            request.company_ids = await acompany_ids_for(user)
+            if not request.company_ids:
+                return json_response({'error': 'Not authorized'}, status=403)
+            return await view(request, *args, **kwargs)
+        # token authenticated like the DRF views, so no CSRF cookie is involved
+        return csrf_exempt(wrapped)
+    return decorator
+
+
+def read_json(request):
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        raise ValueError("Request body must be JSON.")
+    if not isinstance(data, dict):
+        raise ValueError("Request body must be a JSON object.")
+    return data
+
+
+async def list_response(request, plan, queryset, key, empty_message, ordering=('-id',)):
+    try:
+        rows, page_info = await apaginate(request, plan.values(queryset), ordering)
+    except ValueError as ve:
+        return json_response({'error': str(ve)}, status=400)
+
+    if not rows:
+        return json_response({'message': empty_message}, status=204)
+    return json_response({**page_info, key: plan.represent(rows)})
+
+
+# ------------------------------------------------------------------------------------------------------------
+
+@async_endpoint('GET')
+@aconditional_list('cars')
+async def show_all_cars(request):
+    try:
+        queryset = filter_queryset(request, Cars.objects.for_companies(request.company_ids), CAR_FILTERS)
+        ordering = get_ordering(request, CAR_ORDERING)
+    except ValueError as ve:
+        return json_response({'error': str(ve)}, status=400)
+    return await list_response(request, CAR_ROWS, queryset, 'cars', 'No cars found!', ordering)
+
+
+@async_endpoint('GET')
+@aconditional_list('customers')
+async def customer_details(request):
+    try:
+        queryset = filter_queryset(request, Customer.objects.for_companies(request.company_ids), CUSTOMER_FILTERS)
+        ordering = get_ordering(request, CUSTOMER_ORDERING)
+    except ValueError as ve:
+        return json_response({'error': str(ve)}, status=400)
+    return await list_response(request, CUSTOMER_ROWS, queryset, 'customers', 'No customers found!', ordering)
+
+
+@async_endpoint('GET')
+@aconditional_list('transactions', 'cars', 'customers')
+async def transaction_list(request):
+    queryset = Transaction.objects.for_companies(request.company_ids)
+    return await list_response(request, TRANSACTION_ROWS, queryset, 'transactions', 'No transactions found!')
+
+
+@async_endpoint('GET')
+@aconditional_list('leases', 'cars', 'customers')
+async def leasing_list(request):
+    queryset = Leasing.objects.for_companies(request.company_ids)
+    return await list_response(request, LEASING_ROWS, queryset, 'leases', 'No leases found!')
+
+
+# ------------------------------------------------------------------------------------------------------------
+
+async def create_response(request, serializer_class, model, output_serializer_class):
+    try:
+        serializer = serializer_class(data=read_json(request))
+    except ValueError as ve:
+        return json_response({'error': str(ve)}, status=400)
+    # field validation only; these serializers have no database-backed validators
+    if not serializer.is_valid():
+        return json_response(serializer.errors, status=400)
+    # acreate() still runs save() in a worker thread: the saves open atomic
+    # blocks, which Django only supports on the synchronous side
+    instance = await model.objects.acreate(company_id=request.company_ids[0], **serializer.validated_data)
+    return json_response(output_serializer_class(instance).data, status=201)
+
+
+@async_endpoint('POST')
+async def add_car(request):
+    return await create_response(request, CarImportSerializer, Cars, CarSerializer)
+
+
+@async_endpoint('POST')
+async def add_customer(request):
+    return await create_response(request, CustomerCreateSerializer, Customer, CustomerSerializer)
+
+
+# ------------------------------------------------------------------------------------------------------------
+
+async def inventory_response(request, count_field, take, done_message):
+    try:
+        data = read_json(request)
+    except ValueError as ve:
+        return json_response({'error': str(ve)}, status=400)
+    number = data.get(count_field)
+    if number is None or not isinstance(number, int) or isinstance(number, bool) or number <= 0:
+        return json_response({'error': f"Invalid {count_field} value. Must be a positive integer."}, status=400)
+
+    try:
+        car = await Cars.objects.for_companies(request.company_ids).aget(id=data.get('id'))
+        # the stock update and the dashboard counters share one transaction
+        await sync_to_async(take)(car, number)
+    except OutOfStockError as e:
+        return json_response({'error': str(e)}, status=409)
+    except (Cars.DoesNotExist, ValueError, TypeError):
+        return json_response({'error': "Car not found."}, status=404)
+    return json_response({'message': done_message})
+
+
+@async_endpoint('POST')
+async def sold(request):
+    return await inventory_response(request, 'number_of_sold', Cars.sold, "Car sold successfully.")
+
+
+@async_endpoint('POST')
+async def lease(request):
+    return await inventory_response(request, 'number_of_lease', Cars.lease, "Car leased successfully.")
@@ -0,0 +1,90 @@
+# crm_project/crm/availability.py
+
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import transaction as db_transaction
+from django.db.models import Max
+
+from .models import ACTIVE_LEASE, CarOccupancy, Leasing
+
+
+# Leasing fields whose changes move a lease's days in CarOccupancy
+OCCUPANCY_FIELDS = {'car', 'lease_start_date', 'lease_end_date', 'mark_as_returned_from_lease'}
+
+
+def fleet_size(car):
+    # units on the lot plus units out on lease
+    return (car.total_available_number or 0) + (car.number_of_cars_in_lease or 0)
+
+
+def availability(car, date_from, date_to):
+    """
+    Units of `car` free on every day from date_from to date_to: the fleet
+    minus the busiest day in the range, read with one range scan over the
+    (car, date) index instead of loading the car's leases.
+    """
+    busiest = CarOccupancy.objects.filter(car=car, date__range=(date_from, date_to)).aggregate(
+        leased=Max('leased'))['leased'] or 0
+    units = fleet_size(car)
+    return {'car': car.id, 'date_from': date_from, 'date_to': date_to, 'units': units,
+            'leased': busiest, 'available': max(units - busiest, 0)}
+
+
+def lease_intervals(leases):
+    """Counter of (car id, first day, last day) over the active leases of a queryset."""
+    return Counter(leases.filter(ACTIVE_LEASE).values_list('car_id', 'lease_start_date', 'lease_end_date')
+                   .order_by().iterator())
+
+
+def add_intervals(intervals, sign=1):
+    for (car_id, start, end), number in intervals.items():
+        CarOccupancy.add(car_id, start, end, sign * number)
+
+
+@contextmanager
+def track_occupancy(model, ids, changes):
+    """
+    Wraps a QuerySet.update() over leases `ids`, which skips Leasing.save():
+    the occupancy of the rows before the update is swapped for the occupancy
+    after it. Must run inside the same transaction as the update.
+    """
+    if model is not Leasing or not OCCUPANCY_FIELDS & set(changes):
+        yield
+        return
+    rows = Leasing.objects.filter(id__in=ids)
+    before = lease_intervals(rows)
+    yield
+    after = lease_intervals(rows)
+    add_intervals(before - after, -1)
+    add_intervals(after - before)
+
+
+def rebuild(car_ids=None):
+    """Recomputes CarOccupancy from the active leases."""
+    occupancy = CarOccupancy.objects.all()
+    leases = Leasing.objects.filter(ACTIVE_LEASE)
+    if car_ids is not None:
+        occupancy = occupancy.filter(car_id__in=car_ids)
+        leases = leases.filter(car_id__in=car_ids)
+
+    # +1 on the first day and -1 after the last, summed up per car below
+    changes = defaultdict(Counter)
+    for car_id, start, end in leases.values_list('car_id', 'lease_start_date', 'lease_end_date').iterator():
+        changes[car_id][start] += 1
+        changes[car_id][end + timedelta(days=1)] -= 1
+
+    rows = []
+    for car_id, car_changes in changes.items():
+        leased, day = 0, None
+        for change_day in sorted(car_changes):
+            while leased and day < change_day:
+                rows.append(CarOccupancy(car_id=car_id, date=day, leased=leased))
+                day += timedelta(days=1)
+            leased, day = leased + car_changes[change_day], change_day
+
+    with db_transaction.atomic():
+        occupancy.delete()
+        CarOccupancy.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
@@ -0,0 +1,170 @@
+# crm_project/crm/batches.py
+
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+from django.db import transaction as db_transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.db.models.functions import Coalesce
+
+from .models import (CarOccupancy, Cars, CompanyStats, CompanyVersion, Customer, DailyRevenue, Leasing,
+                     OutOfStockError, Transaction)
+from .pricing import price_leases
+from .receipts import next_receipts
+
+
+MAX_BATCH_ITEMS = 1000
+
+
+class BatchItemError(ValueError):
+    """Some items reference cars or customers outside the caller's companies; `errors` is per item."""
+
+    def __init__(self, errors):
+        super().__init__("Unknown car or customer.")
+        self.errors = errors
+
+
+def parse_items(data, name):
+    if not isinstance(data, dict):
+        raise ValueError("Expected a JSON object.")
+    items = data.get(name)
+    if not isinstance(items, list) or not items:
+        raise ValueError(f"'{name}' must be a non-empty list.")
+    if len(items) > MAX_BATCH_ITEMS:
+        raise ValueError(f"At most {MAX_BATCH_ITEMS} {name} can be sent per request.")
+    return items
+
+
+def check_references(items, cars, company_ids):
+    customer_ids = {item['customer'] for item in items}
+    customers = set(Customer.objects.for_companies(company_ids).filter(id__in=customer_ids)
+                    .values_list('id', flat=True))
+    errors = []
+    for item in items:
+        item_errors = {}
+        if item['car'] not in cars:
+            item_errors['car'] = ["Car not found."]
+        if item['customer'] not in customers:
+            item_errors['customer'] = ["Customer not found."]
+        errors.append(item_errors)
+    if any(errors):
+        raise BatchItemError(errors)
+
+
+def per_car(units):
+    """SQL CASE giving each car id of `units` its number, for grouped UPDATEs."""
+    return Case(*[When(id=pk, then=Value(number)) for pk, number in units.items()], output_field=IntegerField())
+
+
+def take_units(items, company_ids, counter):
+    """
+    Takes one unit per item from the referenced cars: the cars are locked
+    once, in id order, and decremented with a single grouped UPDATE that
+    also adds the units to `counter` ('sold_cars' or 'number_of_cars_in_lease').
+    Returns {car id: company id}. Must run inside a transaction.
+    """
+    units = Counter(item['car'] for item in items)
+    rows = (Cars.objects.for_companies(company_ids).filter(id__in=units).order_by('id')
+            .select_for_update().values_list('id', 'company_id', 'total_available_number'))
+    stock = {pk: (company_id, available or 0) for pk, company_id, available in rows}
+    check_references(items, stock, company_ids)
+
+    short = sorted(pk for pk, number in units.items() if stock[pk][1] < number)
+    if short:
+        raise OutOfStockError(f"Not enough cars available for car ids {short}.")
+
+    taken = per_car(units)
+    # the guard repeats the stock check in the UPDATE itself, like Cars._take_from_stock
+    enough = Q()
+    left_in_stock = Q()
+    for pk, number in units.items():
+        enough |= Q(id=pk, total_available_number__gte=number)
+        left_in_stock |= Q(id=pk, total_available_number__gt=number)
+    updated = Cars.objects.filter(enough).update(
+        total_available_number=F('total_available_number') - taken,
+        is_still_in_stock=Case(When(left_in_stock, then=Value(True)), default=Value(False)),
+        **{counter: Coalesce(F(counter), 0) + taken},
+    )
+    if updated != len(units):
+        raise OutOfStockError("Not enough cars available.")
+    return {pk: company_id for pk, (company_id, _) in stock.items()}
+
+
+def check_calendar(intervals):
+    """
+    Raises OutOfStockError when the booked `intervals` (Counter of (car id,
+    first day, last day)) leave a day of one of them with more units leased
+    than the car's fleet, counting the batch's own leases. The cars must be
+    locked, so the check and the booking cannot interleave with another lease.
+    """
+    fleets = dict(Cars.objects.filter(id__in={car_id for car_id, _, _ in intervals})
+                  .annotate(fleet=Coalesce(F('total_available_number'), 0) + Coalesce(F('number_of_cars_in_lease'), 0))
+                  .values_list('id', 'fleet'))
+    overbooked = Q()
+    for car_id, start, end in intervals:
+        overbooked |= Q(car_id=car_id, date__range=(start, end), leased__gt=fleets[car_id])
+    short = sorted(set(CarOccupancy.objects.filter(overbooked).values_list('car_id', flat=True)))
+    if short:
+        raise OutOfStockError(f"No unit free for the whole lease period for car ids {short}.")
+
+
+def units_per_company(items, companies):
+    return Counter(companies[item['car']] for item in items)
+
+
+def create_sales(items, company_ids):
+    """One Transaction per validated item, all or nothing."""
+    with db_transaction.atomic():
+        companies = take_units(items, company_ids, 'sold_cars')
+        sales = [
+            Transaction(company_id=companies[item['car']], car_id=item['car'], customer_id=item['customer'],
+                        amount=item['amount'], date=item['date'])
+            for item in items
+        ]
+        for company_id, number in units_per_company(items, companies).items():
+            receipts = iter(next_receipts(company_id, number))
+            for sale in sales:
+                if sale.company_id == company_id:
+                    sale.receipt = next(receipts)
+        Transaction.objects.bulk_create(sales)
+        Customer.add_history(Transaction.customer_history_field, Counter(sale.customer_id for sale in sales))
+
+        # bulk_create and update() skip save() and its signals, so the
+        # summary tables and list versions are updated once per company / day
+        revenue = defaultdict(lambda: [Decimal(0), 0])
+        for sale in sales:
+            totals = revenue[sale.company_id, sale.date]
+            totals[0] += sale.amount
+            totals[1] += 1
+        for (company_id, day), (amount, count) in revenue.items():
+            DailyRevenue.apply(company_id, day, revenue=amount, transactions=count)
+        for company_id, number in units_per_company(items, companies).items():
+            CompanyStats.apply(company_id, cars_in_stock=-number, units_sold=number)
+            CompanyVersion.bump(company_id, 'cars', 'transactions')
+    return sales
+
+
+def create_leases(items, company_ids):
+    """One Leasing per validated item, all or nothing."""
+    with db_transaction.atomic():
+        companies = take_units(items, company_ids, 'number_of_cars_in_lease')
+        leases = [
+            Leasing(company_id=companies[item['car']], car_id=item['car'], customer_id=item['customer'],
+                    lease_start_date=item['lease_start_date'], lease_end_date=item['lease_end_date'])
+            for item in items
+        ]
+        amounts = price_leases((lease.company_id, lease.car_id, lease.lease_start_date, lease.lease_end_date)
+                               for lease in leases)
+        for lease, amount in zip(leases, amounts):
+            lease.amount = amount
+        Leasing.objects.bulk_create(leases)
+        Customer.add_history(Leasing.customer_history_field, Counter(lease.customer_id for lease in leases))
+        intervals = Counter((lease.car_id, lease.lease_start_date, lease.lease_end_date) for lease in leases)
+        for (car_id, start, end), number in intervals.items():
+            CarOccupancy.add(car_id, start, end, number)
+        check_calendar(intervals)
+
+        for company_id, number in units_per_company(items, companies).items():
+            CompanyStats.apply(company_id, cars_in_stock=-number, cars_leased=number, active_leases=number)
+            CompanyVersion.bump(company_id, 'cars', 'leases')
+    return leases
@@ -0,0 +1,517 @@
+# crm_project/crm/benchmarks.py
+
+import asyncio
+import json
+import random
+import re
+import statistics
+import time
+from array import array
+from collections import Counter, namedtuple
+from datetime import date, timedelta
+from decimal import Decimal
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction as db_transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.urls import reverse
+
+from . import availability, stats
+from .models import (
+    ACTIVE_LEASE, Cars, Company, Customer, Leasing, ReceiptSequence, Transaction,
+)
+from .pricing import price_leases
+from .receipts import format_receipt, next_receipts
+
+
+# ---------------------------------------------------------------------------------------------------------
+# synthetic data
+
+SCALES = {'10k': 10_000, '1m': 1_000_000, '10m': 10_000_000}
+# share of the rows that goes to each table; companies come on top
+ROW_SHARES = (('cars', 0.1), ('customers', 0.2), ('transactions', 0.4), ('leases', 0.3))
+SEED_BATCH_SIZE = 5000
+HISTORY_DAYS = 3 * 365  # transactions and lease starts go back this far
+LEASE_HORIZON_DAYS = 90  # and lease starts this far ahead
+OCCUPANCY_CHUNK = 2000  # cars per CarOccupancy rebuild, which holds its rows in memory
+
+MODELS = {
+    'Toyota': ('Corolla', 'Camry', 'RAV4', 'Yaris'),
+    'Volkswagen': ('Golf', 'Passat', 'Tiguan', 'Polo'),
+    'Ford': ('Focus', 'Fiesta', 'Kuga', 'Mondeo'),
+    'BMW': ('320d', 'X3', '118i', '520d'),
+    'Skoda': ('Octavia', 'Fabia', 'Superb', 'Kodiaq'),
+}
+BRANDS = tuple(MODELS)
+COLORS = ('Black', 'White', 'Silver', 'Grey', 'Blue', 'Red', 'Green')
+ENGINES = ('1.0 TSI', '1.5 TSI', '2.0 TDI', '1.8 Hybrid', 'Electric')
+STREETS = ('Main Street', 'Station Road', 'Church Lane', 'Park Avenue', 'Mill Road', 'High Street')
+
+
+def split_rows(rows):
+    return {name: int(rows * share) for name, share in ROW_SHARES}
+
+
+def spread(total, parts):
+    """`total` split into `parts` counts that differ by at most one."""
+    return [total // parts + (1 if i < total % parts else 0) for i in range(parts)]
+
+
+def in_batches(count, batch_size):
+    for start in range(0, count, batch_size):
+        yield range(start, min(start + batch_size, count))
+
+
+def count_per(queryset, field):
+    counts = queryset.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(total=Count('id'))
+    return Coalesce(Subquery(counts.values('total'), output_field=IntegerField()), 0)
+
+
+def seed_dataset(rows, companies=10, seed=0, username='bench', password='bench', batch_size=SEED_BATCH_SIZE,
+                 today=None, log=None):
+    """
+    Fills an empty database with about `rows` cars, customers, transactions
+    and leases (split by ROW_SHARES) spread evenly over `companies`
+    companies, all owned by a new user `username`. The same seed, scale and
+    `today` give the same rows, so runs on different commits compare. Rows
+    are written with bulk_create; the counters, summary tables and the
+    occupancy calendar are rebuilt once at the end.
+    """
+    rng = random.Random(seed)
+    today = today or date.today()
+    log = log or (lambda message: None)
+    counts = split_rows(rows)
+    if min(counts.values()) < companies:
+        raise ValueError(f"{rows} rows are too few to give each of {companies} companies some of every table.")
+
+    owner = User.objects.create_user(username, password=password)
+    company_ids = [company.pk for company in Company.objects.bulk_create(
+        [Company(name=f'Benchmark dealer {i + 1:02d}', address=f'{i + 1} {STREETS[i % len(STREETS)]}', owner=owner)
+         for i in range(companies)])]
+    shares = {name: spread(count, companies) for name, count in counts.items()}
+
+    for k, company_id in enumerate(company_ids):
+        with db_transaction.atomic():
+            car_ids = array('q')
+            for batch in in_batches(shares['cars'][k], batch_size):
+                cars = []
+                for _ in batch:
+                    brand = rng.choice(BRANDS)
+                    cars.append(Cars(
+                        company_id=company_id, brand=brand, model=rng.choice(MODELS[brand]),
+                        year=rng.randint(today.year - 8, today.year), color=rng.choice(COLORS),
+                        engine=rng.choice(ENGINES), total_available_number=rng.randint(50, 500),
+                        number_of_cars_in_lease=0, is_still_in_stock=True, sold_cars=0,
+                    ))
+                car_ids.extend(car.pk for car in Cars.objects.bulk_create(cars))
+
+            customer_ids = array('q')
+            for batch in in_batches(shares['customers'][k], batch_size):
+                customers = [Customer(
+                    company_id=company_id, name=f'Customer {company_id}-{i + 1}',
+                    email=f'customer{company_id}-{i + 1}@example.com', phone_number=rng.randint(1000000, 9999999),
+                    address=f'{rng.randint(1, 300)} {rng.choice(STREETS)}',
+                ) for i in batch]
+                customer_ids.extend(customer.pk for customer in Customer.objects.bulk_create(customers))
+
+            for batch in in_batches(shares['transactions'][k], batch_size):
+                Transaction.objects.bulk_create([Transaction(
+                    company_id=company_id, customer_id=rng.choice(customer_ids), car_id=rng.choice(car_ids),
+                    amount=Decimal(rng.randint(500000, 6000000)).scaleb(-2),
+                    date=today - timedelta(days=rng.randrange(HISTORY_DAYS)),
+                    receipt=format_receipt(company_id, i + 1),
+                ) for i in batch])
+            ReceiptSequence.objects.update_or_create(company_id=company_id,
+                                                     defaults={'allocated': shares['transactions'][k]})
+
+            for batch in in_batches(shares['leases'][k], batch_size):
+                leases = []
+                for _ in batch:
+                    start = today + timedelta(days=rng.randint(-HISTORY_DAYS, LEASE_HORIZON_DAYS))
+                    end = start + timedelta(days=rng.randrange(60))
+                    leases.append(Leasing(
+                        company_id=company_id, customer_id=rng.choice(customer_ids), car_id=rng.choice(car_ids),
+                        lease_start_date=start, lease_end_date=end, mark_as_returned_from_lease=end < today,
+                    ))
+                amounts = price_leases((company_id, lease.car_id, lease.lease_start_date, lease.lease_end_date)
+                                       for lease in leases)
+                for lease, amount in zip(leases, amounts):
+                    lease.amount = amount
+                Leasing.objects.bulk_create(leases)
+        log(f"company {k + 1}/{companies}: {len(car_ids)} cars, {len(customer_ids)} customers, "
+            f"{shares['transactions'][k]} transactions, {shares['leases'][k]} leases")
+
+    # bulk_create skipped save() and its signals
+    Cars.objects.filter(company_id__in=company_ids).update(
+        number_of_cars_in_lease=count_per(Leasing.objects.filter(ACTIVE_LEASE), 'car_id'),
+        sold_cars=count_per(Transaction.objects.all(), 'car_id'),
+    )
+    Customer.objects.filter(company_id__in=company_ids).update(
+        nr_of_bought_cars=count_per(Transaction.objects.all(), 'customer_id'),
+        nr_of_leased_cars=count_per(Leasing.objects.all(), 'customer_id'),
+    )
+    stats.rebuild(company_ids)
+    car_ids = list(Cars.objects.filter(company_id__in=company_ids).order_by('id').values_list('id', flat=True))
+    for start in range(0, len(car_ids), OCCUPANCY_CHUNK):
+        availability.rebuild(car_ids[start:start + OCCUPANCY_CHUNK])
+    log("rebuilt counters, dashboard stats and the occupancy calendar")
+    return {'companies': companies, **counts}
+
+
+# ---------------------------------------------------------------------------------------------------------
+# HTTP client
+
+SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+async def read_response(reader):
+    """Reads one HTTP/1.1 response; returns (status, keep-alive, Server-Timing header or None)."""
+    status_line = await reader.readuntil(b'\r\n')
+    status = int(status_line.split()[1])
+    length, chunked, keep_alive, server_timing = 0, False, True, None
+    while (line := await reader.readuntil(b'\r\n')) != b'\r\n':
+        name, _, value = line.decode('latin-1').partition(':')
+        name, value = name.strip().lower(), value.strip()
+        if name == 'content-length':
+            length = int(value)
+        elif name == 'transfer-encoding':
+            chunked = 'chunked' in value.lower()
+        elif name == 'connection':
+            keep_alive = value.lower() != 'close'
+        elif name == 'server-timing':
+            server_timing = value
+    if chunked:
+        while (size := int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)):
+            await reader.readexactly(size + 2)
+        await reader.readuntil(b'\r\n')
+    elif length:
+        await reader.readexactly(length)
+    return status, keep_alive, server_timing
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of sorted `values`."""
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+Call = namedtuple('Call', 'method path body content_type headers', defaults=(b'', None, {}))
+
+
+def encode_request(call, host, token):
+    headers = {'Host': host, 'Connection': 'keep-alive', 'Accept': 'application/json'}
+    if token:
+        headers['Authorization'] = f'Bearer {token}'
+    headers.update(call.headers)
+    if call.body:
+        headers['Content-Type'] = call.content_type
+        headers['Content-Length'] = len(call.body)
+    head = f'{call.method} {call.path} HTTP/1.1\r\n' + ''.join(f'{k}: {v}\r\n' for k, v in headers.items())
+    return (head + '\r\n').encode('latin-1') + call.body
+
+
+async def drive(host, port, requests, concurrency, timeout):
+    """
+    Sends the encoded `requests` over `concurrency` keep-alive connections,
+    each connection taking the next request when its last one is answered.
+    """
+    results = {'latencies': [], 'queries': [], 'statuses': Counter(), 'errors': Counter()}
+    pending = iter(requests)
+
+    async def worker():
+        reader = writer = None
+        for request in pending:
+            started = time.perf_counter()
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+                writer.write(request)
+                status, keep_alive, server_timing = await asyncio.wait_for(read_response(reader), timeout)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as e:
+                results['errors'][type(e).__name__] += 1
+                if writer is not None:
+                    writer.close()
+                reader = writer = None
+                continue
+            results['latencies'].append(time.perf_counter() - started)
+            results['statuses'][status] += 1
+            if server_timing and (match := SERVER_TIMING_QUERIES.search(server_timing)):
+                results['queries'].append(int(match[1]))
+            if not keep_alive:
+                writer.close()
+                reader = writer = None
+        if writer is not None:
+            writer.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    results['seconds'] = time.perf_counter() - started
+    return results
+
+
+def summarize(results):
+    latencies = sorted(latency * 1000 for latency in results['latencies'])
+    queries = results['queries']
+    return {
+        'requests': len(latencies),
+        'statuses': {str(code): count for code, count in sorted(results['statuses'].items())},
+        'errors': dict(results['errors']),
+        'rps': round(len(latencies) / results['seconds'], 1) if results['seconds'] else 0.0,
+        'latency_ms': {
+            'mean': round(statistics.fmean(latencies), 2), 'p50': round(percentile(latencies, 0.50), 2),
+            'p95': round(percentile(latencies, 0.95), 2), 'p99': round(percentile(latencies, 0.99), 2),
+            'max': round(latencies[-1], 2),
+        } if latencies else None,
+        # read from Server-Timing: only requests the server sampled, with SERVER_TIMING_HEADER on
+        'queries': {'mean': round(statistics.fmean(queries), 2), 'max': max(queries)} if queries else None,
+    }
+
+
+def regressions(baseline, current, threshold):
+    """(endpoint, metric, before, after) for every endpoint of both reports that got worse."""
+    found = []
+    for name, after in current['endpoints'].items():
+        before = baseline['endpoints'].get(name)
+        if not before:
+            continue
+        if before['latency_ms'] and after['latency_ms']:
+            old, new = before['latency_ms']['p95'], after['latency_ms']['p95']
+            if new > old * (1 + threshold):
+                found.append((name, 'p95 ms', old, new))
+        if before['queries'] and after['queries'] and after['queries']['max'] > before['queries']['max']:
+            found.append((name, 'queries max', before['queries']['max'], after['queries']['max']))
+        old_failed, new_failed = (sum(count for code, count in report['statuses'].items() if int(code) >= 400)
+                                  + sum(report['errors'].values()) for report in (before, after))
+        if new_failed > old_failed:
+            found.append((name, 'failed requests', old_failed, new_failed))
+    return found
+
+
+# ---------------------------------------------------------------------------------------------------------
+# endpoints
+
+READ, WRITE, DELETE = 'read', 'write', 'delete'
+PHASES = (READ, WRITE, DELETE)
+POOL_SIZE = 100  # existing rows the reads and updates cycle through
+BULK_IDS = 10  # ids per bulk request
+BATCH_ITEMS = 20  # items per batch request
+QUOTE_ITEMS = 1000
+
+
+class Fixtures:
+    """
+    Ids the requests of a run point at: recent rows of the user's first
+    company, read straight from the database the server uses, plus rows
+    made up front for the endpoints that delete or return them.
+    """
+
+    def __init__(self, user, today=None):
+        company_ids = list(Company.objects.filter(owner=user).order_by('id').values_list('id', flat=True))
+        if not company_ids:
+            raise ValueError(f"User '{user.username}' owns no company; run seed_benchmark_data first.")
+        self.user = user
+        self.company_id = company_ids[0]
+        self.today = today or date.today()
+        self.run = f'{int(time.time())}'  # keeps created names unique across runs
+        self.metrics_token = getattr(settings, 'METRICS_TOKEN', '')
+        self.victims = {}
+        for name, model in (('cars', Cars), ('customers', Customer), ('transactions', Transaction),
+                            ('leases', Leasing)):
+            ids = list(model.objects.filter(company_id=self.company_id).order_by('-id')
+                       .values_list('id', flat=True)[:POOL_SIZE])
+            if not ids:
+                raise ValueError(f"Company {self.company_id} has no {name}; run seed_benchmark_data first.")
+            setattr(self, name, ids)
+
+    def pick(self, pool, i):
+        return pool[i % len(pool)]
+
+    def window(self, pool, i, size=BULK_IDS):
+        return [pool[(i * size + j) % len(pool)] for j in range(size)]
+
+    def day(self, offset):
+        return (self.today + timedelta(days=offset)).isoformat()
+
+    # rows for the endpoints that use up what they are sent, made with
+    # bulk_create: the dashboard counters drift a little over a run, so
+    # reseed before runs that are compared
+
+    def new_cars(self, count):
+        return [car.pk for car in Cars.objects.bulk_create([Cars(
+            company_id=self.company_id, brand='Victim', model=f'{self.run}-{i}', total_available_number=0,
+            number_of_cars_in_lease=0, is_still_in_stock=False, sold_cars=0) for i in range(count)])]
+
+    def new_customers(self, count):
+        return [customer.pk for customer in Customer.objects.bulk_create([Customer(
+            company_id=self.company_id, name=f'Victim {self.run}-{i}', email=f'victim{i}@example.com',
+            phone_number=i, address='-') for i in range(count)])]
+
+    def new_transactions(self, count):
+        return [transaction.pk for transaction in Transaction.objects.bulk_create([Transaction(
+            company_id=self.company_id, customer_id=self.customers[0], car_id=self.cars[0], amount=0,
+            date=self.today, receipt=receipt) for receipt in next_receipts(self.company_id, count)])]
+
+    def new_leases(self, count, returned=True):
+        # in a year with no occupancy rows, so returning them moves no calendar
+        return [lease.pk for lease in Leasing.objects.bulk_create([Leasing(
+            company_id=self.company_id, customer_id=self.customers[0], car_id=self.cars[0],
+            lease_start_date=date(2000, 1, 1), lease_end_date=date(2000, 1, 1), amount=0,
+            mark_as_returned_from_lease=returned) for _ in range(count)])]
+
+
+Endpoint = namedtuple('Endpoint', 'phase build prepare', defaults=(None,))
+
+
+def url(name, *args, **params):
+    path = reverse(f'crm:{name}', args=args)
+    return path + ('?' + urlencode(params) if params else '')
+
+
+def get(name, *args, **params):
+    return Call('GET', url(name, *args, **params))
+
+
+def send(method, path, data):
+    return Call(method, path, json.dumps(data).encode(), 'application/json')
+
+
+def customer_data(fx, i, **extra):
+    return {'name': f'Bench customer {fx.run}-{i}', 'email': f'bench{i}@example.com', 'phone_number': 5550000 + i,
+            'address': f'{i} Bench Road', **extra}
+
+
+def car_data(fx, i):
+    return {'brand': BRANDS[i % len(BRANDS)], 'model': f'Bench {fx.run}-{i}', 'year': fx.today.year,
+            'color': COLORS[i % len(COLORS)], 'total_available_number': 100, 'number_of_cars_in_lease': 0}
+
+
+def import_csv(fx, i):
+    lines = ['brand,model,year,color,engine,total_available_number,number_of_cars_in_lease']
+    lines += [f'{BRANDS[j % len(BRANDS)]},Import {fx.run}-{i}-{j},{fx.today.year},{COLORS[j % len(COLORS)]},'
+              f'{ENGINES[j % len(ENGINES)]},{10 + j},0' for j in range(BATCH_ITEMS)]
+    return Call('POST', url('import_cars'), '\n'.join(lines).encode(), 'text/csv')
+
+
+def sale(fx, i, **extra):
+    return {'customer': fx.pick(fx.customers, i), 'car': fx.pick(fx.cars, i), 'amount': f'{15000 + i}.00',
+            'date': fx.day(0), **extra}
+
+
+def future_lease(fx, i, **extra):
+    # one day each, well past the seeded leases so the calendar has room
+    start = fx.day(LEASE_HORIZON_DAYS + 90 + i % 365)
+    return {'customer': fx.pick(fx.customers, i), 'car': fx.pick(fx.cars, i), 'lease_start_date': start,
+            'lease_end_date': start, **extra}
+
+
+def delete_one(name, victims):
+    return Endpoint(DELETE, lambda fx, i: Call('DELETE', url(name, fx.victims[name][i])),
+                    lambda fx, count: getattr(fx, victims)(count))
+
+
+def delete_many(name, victims):
+    return Endpoint(DELETE, lambda fx, i: send('POST', url(name), {'ids': fx.window(fx.victims[name], i)}),
+                    lambda fx, count: getattr(fx, victims)(count * BULK_IDS))
+
+
+# Every route of crm/urls.py, by name. Reads run first, then writes, then
+# the deletes, which only ever delete the rows their `prepare` made.
+ENDPOINTS = {
+    'create_company': Endpoint(WRITE, lambda fx, i: send('POST', url('create_company'),
+                                                          {'name': f'Bench company {fx.run}-{i}'})),
+    'get_company': Endpoint(READ, lambda fx, i: get('get_company')),
+    'dashboard_stats': Endpoint(READ, lambda fx, i: get('dashboard_stats', group_by='month',
+                                                        date_from=fx.day(-365), date_to=fx.day(0))),
+    'metrics': Endpoint(READ, lambda fx, i: Call('GET', url('metrics'),
+                                                 headers={'Authorization': f'Bearer {fx.metrics_token}'})),
+    'export_transactions': Endpoint(READ, lambda fx, i: get('export_transactions', output_format='ndjson',
+                                                            date_from=fx.day(-30), date_to=fx.day(0))),
+    'export_leases': Endpoint(READ, lambda fx, i: get('export_leases', output_format='ndjson',
+                                                      date_from=fx.day(-30), date_to=fx.day(0))),
+    # customers
+    'customer_details': Endpoint(READ, lambda fx, i: get('customer_details', page_size=50)),
+    'add_customer': Endpoint(WRITE, lambda fx, i: send('POST', url('add_customer'),
+                                                        customer_data(fx, i, company=fx.company_id))),
+    'update_customer': Endpoint(WRITE, lambda fx, i: send('PUT', url('update_customer', fx.pick(fx.customers, i)),
+                                                           {'address': f'{i} Update Street'})),
+    'delete_customer': delete_one('delete_customer', 'new_customers'),
+    'customer_purchases': Endpoint(READ, lambda fx, i: get('customer_purchases', fx.pick(fx.customers, i))),
+    'customer_leases': Endpoint(READ, lambda fx, i: get('customer_leases', fx.pick(fx.customers, i))),
+    'bulk_delete_customers': delete_many('bulk_delete_customers', 'new_customers'),
+    'bulk_update_customers': Endpoint(WRITE, lambda fx, i: send('PATCH', url('bulk_update_customers'), {
+        'ids': fx.window(fx.customers, i), 'changes': {'address': f'{i} Bulk Street'}})),
+    # cars
+    'show_all_cars': Endpoint(READ, lambda fx, i: get('show_all_cars', page_size=50)),
+    'add_car': Endpoint(WRITE, lambda fx, i: send('POST', url('add_car'), car_data(fx, i))),
+    'import_cars': Endpoint(WRITE, import_csv),
+    'update_car': Endpoint(WRITE, lambda fx, i: send('PUT', url('update_car', fx.pick(fx.cars, i)),
+                                                      {'color': COLORS[i % len(COLORS)]})),
+    'delete_car': delete_one('delete_car', 'new_cars'),
+    'bulk_delete_cars': delete_many('bulk_delete_cars', 'new_cars'),
+    'bulk_update_cars': Endpoint(WRITE, lambda fx, i: send('PATCH', url('bulk_update_cars'), {
+        'ids': fx.window(fx.cars, i), 'changes': {'color': COLORS[i % len(COLORS)]}})),
+    # transactions
+    'transaction_list': Endpoint(READ, lambda fx, i: get('transaction_list', page_size=50)),
+    'add_transaction': Endpoint(WRITE, lambda fx, i: send('POST', url('add_transaction'),
+                                                           sale(fx, i, company=fx.company_id))),
+    'update_transaction': Endpoint(WRITE, lambda fx, i: send(
+        'PUT', url('update_transaction', fx.pick(fx.transactions, i)), {'amount': f'{20000 + i}.00'})),
+    'delete_transaction': delete_one('delete_transaction', 'new_transactions'),
+    'bulk_delete_transactions': delete_many('bulk_delete_transactions', 'new_transactions'),
+    'bulk_update_transactions': Endpoint(WRITE, lambda fx, i: send('PATCH', url('bulk_update_transactions'), {
+        'ids': fx.window(fx.transactions, i), 'changes': {'amount': f'{25000 + i}.00'}})),
+    'batch_transactions': Endpoint(WRITE, lambda fx, i: send('POST', url('batch_transactions'), {
+        'transactions': [sale(fx, i * BATCH_ITEMS + j) for j in range(BATCH_ITEMS)]})),
+    'sold': Endpoint(WRITE, lambda fx, i: send('POST', url('sold'), {'id': fx.pick(fx.cars, i),
+                                                                     'number_of_sold': 1})),
+    # leases
+    'leasing_list': Endpoint(READ, lambda fx, i: get('leasing_list', page_size=50)),
+    'add_lease': Endpoint(WRITE, lambda fx, i: send('POST', url('add_lease'),
+                                                     future_lease(fx, i, company=fx.company_id))),
+    'update_lease': Endpoint(WRITE, lambda fx, i: send('PUT', url('update_lease', fx.pick(fx.leases, i)), {
+        'lease_start_date': fx.day(LEASE_HORIZON_DAYS + 90 + i % 30),
+        'lease_end_date': fx.day(LEASE_HORIZON_DAYS + 92 + i % 30)})),
+    'delete_lease': delete_one('delete_lease', 'new_leases'),
+    'bulk_delete_leases': delete_many('bulk_delete_leases', 'new_leases'),
+    'bulk_update_leases': Endpoint(WRITE, lambda fx, i: send('PATCH', url('bulk_update_leases'), {
+        'ids': fx.window(fx.leases, i), 'changes': {
+            'lease_start_date': fx.day(LEASE_HORIZON_DAYS + 90 + i % 30),
+            'lease_end_date': fx.day(LEASE_HORIZON_DAYS + 95 + i % 30)}})),
+    'car_availability': Endpoint(READ, lambda fx, i: get('car_availability', fx.pick(fx.cars, i),
+                                                         date_from=fx.day(0), date_to=fx.day(90))),
+    'quote_leases': Endpoint(READ, lambda fx, i: send('POST', url('quote_leases'), {'leases': [
+        {'car': fx.pick(fx.cars, i + j), 'lease_start_date': fx.day(j % 60),
+         'lease_end_date': fx.day(j % 60 + j % 14)} for j in range(QUOTE_ITEMS)]})),
+    'lease_rates': Endpoint(READ, lambda fx, i: get('lease_rates')),
+    'batch_leases': Endpoint(WRITE, lambda fx, i: send('POST', url('batch_leases'), {
+        'leases': [future_lease(fx, i * BATCH_ITEMS + j) for j in range(BATCH_ITEMS)]})),
+    'update_mark_as_returned': Endpoint(
+        DELETE, lambda fx, i: Call('PUT', url('update_mark_as_returned', fx.victims['update_mark_as_returned'][i])),
+        lambda fx, count: fx.new_leases(count, returned=False)),
+    # async views
+    'async_show_all_cars': Endpoint(READ, lambda fx, i: get('async_show_all_cars', page_size=50)),
+    'async_customer_details': Endpoint(READ, lambda fx, i: get('async_customer_details', page_size=50)),
+    'async_transaction_list': Endpoint(READ, lambda fx, i: get('async_transaction_list', page_size=50)),
+    'async_leasing_list': Endpoint(READ, lambda fx, i: get('async_leasing_list', page_size=50)),
+    'async_add_car': Endpoint(WRITE, lambda fx, i: send('POST', url('async_add_car'), car_data(fx, i))),
+    'async_add_customer': Endpoint(WRITE, lambda fx, i: send('POST', url('async_add_customer'),
+                                                              customer_data(fx, i))),
+    'async_sold': Endpoint(WRITE, lambda fx, i: send('POST', url('async_sold'), {'id': fx.pick(fx.cars, i),
+                                                                                 'number_of_sold': 1})),
+    'async_lease': Endpoint(WRITE, lambda fx, i: send('POST', url('async_lease'), {'id': fx.pick(fx.cars, i),
+                                                                                   'number_of_lease': 1})),
+}
+
+
+def missing_endpoints():
+    from .urls import urlpatterns
+
+    return sorted({pattern.name for pattern in urlpatterns} - set(ENDPOINTS))
+
+
+def planned(only=None):
+    """(name, Endpoint) in run order: by phase, then as listed."""
+    names = [name for name in ENDPOINTS if not only or name in only]
+    return sorted(((name, ENDPOINTS[name]) for name in names), key=lambda item: PHASES.index(item[1].phase))
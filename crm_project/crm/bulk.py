@@ -0,0 +1,93 @@
+# crm_project/crm/bulk.py
+
+from collections import Counter
+from contextlib import contextmanager
+
+from django.db import transaction as db_transaction
+
+from .availability import track_occupancy
+from .models import CompanyVersion, Customer
+from .pricing import track_prices
+from .stats import track_bulk_change
+
+
+MAX_BULK_IDS = 1000
+
+
+def parse_ids(data):
+    if not isinstance(data, dict):
+        raise ValueError("Expected a JSON object.")
+    ids = data.get('ids')
+    if not isinstance(ids, list) or not ids:
+        raise ValueError("'ids' must be a non-empty list of integers.")
+    if len(ids) > MAX_BULK_IDS:
+        raise ValueError(f"At most {MAX_BULK_IDS} ids can be sent per request.")
+    try:
+        # keep the caller's order but drop duplicates
+        return list(dict.fromkeys(int(pk) for pk in ids))
+    except (TypeError, ValueError):
+        raise ValueError("'ids' must be a non-empty list of integers.")
+
+
+def results_for(ids, found, done_status):
+    return [{'id': pk, 'status': done_status if pk in found else 'not_found'} for pk in ids]
+
+
+def bulk_delete(queryset, ids):
+    """Deletes every row of `queryset` whose id is in `ids` in one transaction."""
+    with db_transaction.atomic():
+        rows = queryset.filter(id__in=ids)
+        found = set(rows.values_list('id', flat=True))
+        if found:
+            queryset.filter(id__in=found).delete()
+    return results_for(ids, found, 'deleted')
+
+
+def bulk_update(queryset, ids, changes):
+    """Applies the same validated `changes` to all ids with a single UPDATE."""
+    with db_transaction.atomic():
+        rows = queryset.filter(id__in=ids)
+        companies = dict(rows.select_for_update().values_list('id', 'company_id'))
+        found = set(companies)
+        if found:
+            with track_bulk_change(queryset.model, found, changes), \
+                    track_occupancy(queryset.model, found, changes), \
+                    track_customer_history(queryset.model, found, changes), \
+                    track_prices(queryset.model, found, changes):
+                queryset.filter(id__in=found).update(**changes)
+            # update() sends no post_save, so bump the list versions once per company
+            for company_id in set(companies.values()):
+                CompanyVersion.bump(company_id, queryset.model.version_resource)
+    return results_for(ids, found, 'updated')
+
+
+@contextmanager
+def track_customer_history(model, ids, changes):
+    # moving rows to another customer moves them between the customers' counters
+    field = getattr(model, 'customer_history_field', None)
+    if field is None or 'customer' not in changes:
+        yield
+        return
+    rows = model.objects.filter(id__in=ids)
+    before = Counter(rows.values_list('customer_id', flat=True))
+    yield
+    after = Counter(rows.values_list('customer_id', flat=True))
+    after.subtract(before)
+    Customer.add_history(field, after)
+
+
+def car_changes(changes):
+    # QuerySet.update() skips Cars.save(), so keep is_still_in_stock in sync here
+    if 'total_available_number' in changes:
+        total = changes['total_available_number']
+        changes['is_still_in_stock'] = total is not None and total > 0
+    return changes
+
+
+def lease_changes(changes):
+    # One shared UPDATE of a single date could end some leases before they
+    # start, so dates move together; track_prices reprices each lease after it.
+    if 'lease_start_date' in changes or 'lease_end_date' in changes:
+        if 'lease_start_date' not in changes or 'lease_end_date' not in changes:
+            raise ValueError("Both lease_start_date and lease_end_date are required to change lease dates.")
+    return changes
@@ -0,0 +1,85 @@
+# crm_project/crm/cache.py
+
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .cache_backends import RespError
+
+
+# Backend failures turn into cache misses instead of failing the request
+CACHE_ERRORS = (OSError, RespError)
+
+
+class ResponseCache:
+    """Read-through cache for list response data, with per-process hit/miss counters."""
+
+    def __init__(self, alias):
+        self.alias = alias
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def get(self, key):
+        try:
+            value = self.backend.get(key)
+        except CACHE_ERRORS:
+            self._count('errors')
+            value = None
+        self._count('misses' if value is None else 'hits')
+        return value
+
+    def set(self, key, value):
+        try:
+            self.backend.set(key, value)
+        except CACHE_ERRORS:
+            self._count('errors')
+
+    async def aget(self, key):
+        try:
+            value = await self.backend.aget(key)
+        except CACHE_ERRORS:
+            self._count('errors')
+            value = None
+        self._count('misses' if value is None else 'hits')
+        return value
+
+    async def aset(self, key, value):
+        try:
+            await self.backend.aset(key, value)
+        except CACHE_ERRORS:
+            self._count('errors')
+
+    def clear(self):
+        try:
+            self.backend.clear()
+        except CACHE_ERRORS:
+            self._count('errors')
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = {'hits': 0, 'misses': 0, 'errors': 0}
+
+
+response_cache = ResponseCache(getattr(settings, 'RESPONSE_CACHE_ALIAS', 'responses'))
+
+
+def clear_response_cache(sender, **kwargs):
+    # Entries are keyed by company version counters, which restart when a
+    # company row goes away; drop everything so a reused id sees nothing stale.
+    response_cache.clear()
@@ -0,0 +1,170 @@
+# crm_project/crm/cache_backends.py
+
+import pickle
+import re
+import socket
+import threading
+from urllib.parse import urlparse
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+
+class RespError(Exception):
+    """Error reply sent by the server."""
+
+
+class RespConnection:
+    """Blocking RESP2 connection: enough of the protocol for GET/SET/DEL style commands."""
+
+    def __init__(self, host, port, db=0, password=None, timeout=1.0):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.reader = self.sock.makefile('rb')
+        if password:
+            self.execute('AUTH', password)
+        if db:
+            self.execute('SELECT', db)
+
+    @staticmethod
+    def encode(args):
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode()
+            parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        return b''.join(parts)
+
+    def read_reply(self):
+        line = self.reader.readline()
+        if not line.endswith(b'\r\n'):
+            raise ConnectionError("Connection closed by server.")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b'+':
+            return rest
+        if kind == b'-':
+            raise RespError(rest.decode())
+        if kind == b':':
+            return int(rest)
+        if kind == b'$':
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self.reader.read(length + 2)
+            return data[:-2]
+        if kind == b'*':
+            length = int(rest)
+            return None if length < 0 else [self.read_reply() for _ in range(length)]
+        raise ConnectionError(f"Unexpected reply type {kind!r}.")
+
+    def execute(self, *args):
+        self.sock.sendall(self.encode(args))
+        return self.read_reply()
+
+    def close(self):
+        try:
+            self.reader.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class RespCache(BaseCache):
+    """
+    Django cache backend for any server speaking the Redis protocol
+    (Redis, Valkey, KeyDB, ...), without a client library dependency.
+
+    LOCATION is a URL: redis://[:password@]host:port/db
+    OPTIONS: SOCKET_TIMEOUT (seconds, default 1.0)
+
+    clear() only removes keys under KEY_PREFIX, so the database can be shared.
+    """
+
+    SCAN_COUNT = 1000  # keys examined per SCAN call of clear()
+
+    def __init__(self, server, params):
+        super().__init__(params)
+        url = urlparse(server if '://' in server else f'redis://{server}')
+        self._host = url.hostname or 'localhost'
+        self._port = url.port or 6379
+        self._db = int(url.path.lstrip('/') or 0)
+        self._password = url.password
+        self._socket_timeout = float(params.get('OPTIONS', {}).get('SOCKET_TIMEOUT', 1.0))
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = RespConnection(self._host, self._port, self._db, self._password, self._socket_timeout)
+            self._local.connection = connection
+        return connection
+
+    def _execute(self, *args):
+        try:
+            return self._connection().execute(*args)
+        except (OSError, ConnectionError):
+            # drop the broken socket; the next command reconnects
+            self._disconnect()
+            raise
+
+    def _ttl_ms(self, timeout):
+        if timeout == DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is None:
+            return None
+        return max(0, int(timeout * 1000))
+
+    def get(self, key, default=None, version=None):
+        value = self._execute('GET', self.make_and_validate_key(key, version=version))
+        return default if value is None else pickle.loads(value)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._store(key, value, timeout, version)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._store(key, value, timeout, version, 'NX')
+
+    def _store(self, key, value, timeout, version, *flags):
+        ttl = self._ttl_ms(timeout)
+        key = self.make_and_validate_key(key, version=version)
+        if ttl == 0:
+            self._execute('DEL', key)
+            return False
+        args = ['SET', key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), *flags]
+        if ttl is not None:
+            args += ['PX', ttl]
+        return self._execute(*args) is not None
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        ttl = self._ttl_ms(timeout)
+        if ttl is None:
+            self._execute('PERSIST', key)
+            return bool(self._execute('EXISTS', key))
+        return bool(self._execute('PEXPIRE', key, ttl))
+
+    def delete(self, key, version=None):
+        return bool(self._execute('DEL', self.make_and_validate_key(key, version=version)))
+
+    def has_key(self, key, version=None):
+        return bool(self._execute('EXISTS', self.make_and_validate_key(key, version=version)))
+
+    def clear(self):
+        # SCAN + DEL of this cache's namespace instead of FLUSHDB, which would
+        # also wipe every other user of the database
+        pattern = re.sub(r'([*?\[\]\\])', r'\\\1', self.key_prefix) + ':*'
+        cursor = b'0'
+        while True:
+            cursor, keys = self._execute('SCAN', cursor, 'MATCH', pattern, 'COUNT', self.SCAN_COUNT)
+            if keys:
+                self._execute('DEL', *keys)
+            if cursor == b'0':
+                return
+
+    def close(self, **kwargs):
+        # Django closes caches after every request; keep the socket for the next one
+        pass
+
+    def _disconnect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
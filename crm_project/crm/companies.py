@@ -0,0 +1,81 @@
+# crm_project/crm/companies.py
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .models import Company
+
+
+class TTLCache:
+    """Small thread-safe LRU cache whose entries expire after `ttl` seconds."""
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+company_ids_cache = TTLCache(
+    maxsize=getattr(settings, 'COMPANY_CACHE_SIZE', 1024),
+    ttl=getattr(settings, 'COMPANY_CACHE_TTL', 60),
+)
+
+
+def company_ids_for(user):
+    """Ids of the companies owned by `user`, cached per process."""
+    if not user or not user.is_authenticated:
+        return ()
+    company_ids = company_ids_cache.get(user.pk)
+    if company_ids is None:
+        company_ids = tuple(Company.objects.filter(owner=user).order_by('id').values_list('id', flat=True))
+        company_ids_cache.set(user.pk, company_ids)
+    return company_ids
+
+
+async def acompany_ids_for(user):
+    """company_ids_for() for async views, reading through the async ORM on a miss."""
+    if not user or not user.is_authenticated:
+        return ()
+    company_ids = company_ids_cache.get(user.pk)
+    if company_ids is None:
+        queryset = Company.objects.filter(owner=user).order_by('id').values_list('id', flat=True)
+        company_ids = tuple([pk async for pk in queryset])
+        company_ids_cache.set(user.pk, company_ids)
+    return company_ids
+
+
+def invalidate_company_ids(sender, **kwargs):
+    # The owner may have changed, so the previous owner's entry is stale too;
+    # company writes are rare enough to simply drop everything.
+    company_ids_cache.clear()
@@ -0,0 +1,107 @@
+# crm_project/crm/etags.py
+
+import hashlib
+import json
+from functools import wraps
+
+from django.http import HttpResponseNotModified
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from .cache import response_cache
+from .models import CompanyVersion
+from .renderers import json_response
+
+
+def list_etag(request, resources, versions=None):
+    """
+    Strong ETag for a list response: the caller's companies, the version of
+    every resource the response embeds, and the full query string. One
+    indexed read, no list query.
+    """
+    if versions is None:
+        versions = CompanyVersion.current(request.company_ids, resources)
+    key = json.dumps([request.path, sorted(request.GET.lists()), resources, versions], default=str)
+    return '"{}"'.format(hashlib.sha1(key.encode()).hexdigest())
+
+
+def etag_matches(request, etag):
+    # If-None-Match uses the weak comparison, so W/ prefixes still match
+    client_tags = {tag.removeprefix('W/') for tag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))}
+    return '*' in client_tags or etag in client_tags
+
+
+def tag_response(response, etag):
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def conditional_list(*resources):
+    """
+    Answers If-None-Match with 304 when none of `resources` changed for the
+    caller's companies, before the wrapped view runs its query. Otherwise the
+    response data is read through the response cache under the same tag, so
+    writes (which bump the versions) invalidate it.
+    Must sit below @api_view so request.company_ids is resolved.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if request.method != 'GET' or not request.company_ids:
+                return view(request, *args, **kwargs)
+
+            # the version is read before the data, so a concurrent write can
+            # only make the tag older than the body, never newer
+            etag = list_etag(request, list(resources))
+            if etag_matches(request, etag):
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            else:
+                cache_key = 'list:' + etag.strip('"')
+                data = response_cache.get(cache_key)
+                if data is not None:
+                    response = Response(data, status=status.HTTP_200_OK)
+                    response['X-Cache'] = 'HIT'
+                else:
+                    response = view(request, *args, **kwargs)
+                    if response.status_code != status.HTTP_200_OK:
+                        return response
+                    response_cache.set(cache_key, response.data)
+                    response['X-Cache'] = 'MISS'
+
+            return tag_response(response, etag)
+        return wrapped
+    return decorator
+
+
+def aconditional_list(*resources):
+    """
+    conditional_list() for the async views in async_views.py, which set
+    request.company_ids themselves and return json_response() objects.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapped(request, *args, **kwargs):
+            if request.method != 'GET' or not request.company_ids:
+                return await view(request, *args, **kwargs)
+
+            versions = await CompanyVersion.acurrent(request.company_ids, list(resources))
+            etag = list_etag(request, list(resources), versions)
+            if etag_matches(request, etag):
+                return tag_response(HttpResponseNotModified(), etag)
+
+            cache_key = 'list:' + etag.strip('"')
+            data = await response_cache.aget(cache_key)
+            if data is not None:
+                response = json_response(data)
+                response['X-Cache'] = 'HIT'
+            else:
+                response = await view(request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                await response_cache.aset(cache_key, response.data)
+                response['X-Cache'] = 'MISS'
+            return tag_response(response, etag)
+        return wrapped
+    return decorator
@@ -0,0 +1,96 @@
+# crm_project/crm/expiry.py
+
+import time
+from collections import Counter
+
+from django.db import transaction as db_transaction
+from django.db.models import Case, Count, F, Min, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .batches import per_car
+from .models import ACTIVE_LEASE, CarOccupancy, Cars, CompanyStats, CompanyVersion, Leasing
+
+
+EXPIRY_BATCH_SIZE = 2000
+
+
+def due_leases(as_of):
+    """Active leases that ended before `as_of`; served by the leasing_due_idx partial index."""
+    return Leasing.objects.filter(ACTIVE_LEASE, lease_end_date__lt=as_of)
+
+
+def due_summary(as_of):
+    return due_leases(as_of).aggregate(
+        leases=Count('id'), cars=Count('car', distinct=True), companies=Count('company', distinct=True),
+        oldest_end_date=Min('lease_end_date'),
+    )
+
+
+def mark_returned(rows):
+    """
+    Flips the leases of `rows` to returned where they are still active and
+    returns the rows this call flipped. Where select_for_update() locks
+    nothing (SQLite), a lease returned by hand since the select is left out,
+    so its unit is not put back twice.
+    """
+    active = Leasing.objects.filter(ACTIVE_LEASE)
+    with db_transaction.atomic():
+        if active.filter(id__in=[row[0] for row in rows]).update(mark_as_returned_from_lease=True) == len(rows):
+            return rows
+        db_transaction.set_rollback(True)
+    # rare: find the leases that were taken, one row at a time
+    return [row for row in rows if active.filter(id=row[0]).update(mark_as_returned_from_lease=True)]
+
+
+def return_batch(as_of, batch_size=EXPIRY_BATCH_SIZE):
+    """
+    Marks up to `batch_size` due leases as returned and puts their units back
+    in stock, in one transaction: one UPDATE for the leases, one grouped
+    UPDATE for their cars and one counter update per company, instead of a
+    Leasing.save() and a car UPDATE per lease. Rows locked by a concurrent
+    request are skipped and picked up by the next run.
+    Returns (leases returned, cars updated).
+    """
+    with db_transaction.atomic():
+        rows = []
+        while not rows:
+            rows = list(due_leases(as_of).order_by('lease_end_date', 'id').select_for_update(skip_locked=True)
+                        .values_list('id', 'company_id', 'car_id', 'lease_start_date', 'lease_end_date')
+                        [:batch_size])
+            if not rows:
+                return 0, 0
+            # empty only when every lease of the batch was returned by hand meanwhile
+            rows = mark_returned(rows)
+
+        units = Counter(row[2] for row in rows)
+        intervals = Counter(row[2:] for row in rows)
+        returned = per_car(units)
+        Cars.objects.filter(id__in=units).update(
+            number_of_cars_in_lease=Coalesce(F('number_of_cars_in_lease'), 0) - returned,
+            total_available_number=F('total_available_number') + returned,
+            # evaluated on the old row: at least one unit comes back
+            is_still_in_stock=Case(When(total_available_number__gte=0, then=Value(True)), default=Value(False)),
+        )
+        # days before today can no longer be booked, so their occupancy rows go;
+        # with a future as_of the returned leases also free the days from today on
+        today = timezone.localdate()
+        CarOccupancy.objects.filter(car_id__in=units, date__lt=today).delete()
+        for (car_id, start, end), number in intervals.items():
+            if end >= today:
+                CarOccupancy.add(car_id, max(start, today), end, -number)
+        # update() sends no post_save; Leasing.save() books the car units on the lease's company too
+        for company_id, number in Counter(row[1] for row in rows).items():
+            CompanyStats.apply(company_id, cars_in_stock=number, cars_leased=-number, active_leases=-number)
+            CompanyVersion.bump(company_id, 'cars', 'leases')
+    return len(rows), len(units)
+
+
+def return_due_leases(as_of, batch_size=EXPIRY_BATCH_SIZE):
+    """Returns due leases batch by batch, yielding the metrics of each batch."""
+    while True:
+        started = time.perf_counter()
+        leases, cars = return_batch(as_of, batch_size)
+        if not leases:
+            return
+        yield {'leases': leases, 'cars': cars, 'seconds': time.perf_counter() - started}
@@ -0,0 +1,107 @@
+# crm_project/crm/exports.py
+
+import csv
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Leasing, Transaction
+
+
+EXPORT_CHUNK_SIZE = 2000  # rows fetched per database round trip
+FLUSH_BYTES = 64 * 1024   # output is handed to the server in pieces of about this size
+
+# (column name, lookup) per exported model; customer and car columns come from joins
+EXPORT_COLUMNS = {
+    Transaction: (
+        ('id', 'id'), ('company', 'company_id'), ('date', 'date'), ('amount', 'amount'), ('receipt', 'receipt'),
+        ('customer_id', 'customer_id'), ('customer_name', 'customer__name'), ('customer_email', 'customer__email'),
+        ('car_id', 'car_id'), ('car_brand', 'car__brand'), ('car_model', 'car__model'), ('car_year', 'car__year'),
+    ),
+    Leasing: (
+        ('id', 'id'), ('company', 'company_id'), ('lease_start_date', 'lease_start_date'),
+        ('lease_end_date', 'lease_end_date'), ('amount', 'amount'),
+        ('returned', 'mark_as_returned_from_lease'),
+        ('customer_id', 'customer_id'), ('customer_name', 'customer__name'), ('customer_email', 'customer__email'),
+        ('car_id', 'car_id'), ('car_brand', 'car__brand'), ('car_model', 'car__model'), ('car_year', 'car__year'),
+    ),
+}
+
+# Column the date range applies to
+EXPORT_DATE_FIELDS = {
+    Transaction: 'date',
+    Leasing: 'lease_start_date',
+}
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+
+
+def export_queryset(model, company_ids, date_from=None, date_to=None):
+    date_field = EXPORT_DATE_FIELDS[model]
+    queryset = model.objects.for_companies(company_ids)
+    if date_from:
+        queryset = queryset.filter(**{f'{date_field}__gte': date_from})
+    if date_to:
+        queryset = queryset.filter(**{f'{date_field}__lte': date_to})
+    lookups = [lookup for _, lookup in EXPORT_COLUMNS[model]]
+    return queryset.order_by('company_id', date_field, 'id').values_list(*lookups)
+
+
+class LineBuffer:
+    """File-like sink for csv.writer that just hands back what was written."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(model, rows):
+    writer = csv.writer(LineBuffer())
+    yield writer.writerow([name for name, _ in EXPORT_COLUMNS[model]])
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def ndjson_lines(model, rows):
+    names = [name for name, _ in EXPORT_COLUMNS[model]]
+    encoder = DjangoJSONEncoder(separators=(',', ':'), ensure_ascii=False)
+    for row in rows:
+        yield encoder.encode(dict(zip(names, row))) + '\n'
+
+
+def buffered(lines):
+    # one write per ~64 KB instead of one per row
+    parts, size = [], 0
+    for line in lines:
+        data = line.encode()
+        parts.append(data)
+        size += len(data)
+        if size >= FLUSH_BYTES:
+            yield b''.join(parts)
+            parts, size = [], 0
+    if parts:
+        yield b''.join(parts)
+
+
+def gzipped(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(queryset, fmt, compress=False):
+    """
+    Byte chunks of the export. Rows are read through a server-side cursor
+    (`.iterator()`) and encoded as they arrive, so memory does not grow with
+    the number of rows.
+    """
+    model = queryset.model
+    rows = queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    lines = csv_lines(model, rows) if fmt == 'csv' else ndjson_lines(model, rows)
+    chunks = buffered(lines)
+    return gzipped(chunks) if compress else chunks
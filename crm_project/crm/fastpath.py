@@ -0,0 +1,81 @@
+# crm_project/crm/fastpath.py
+
+from rest_framework import serializers
+from rest_framework.relations import PrimaryKeyRelatedField
+
+from .metrics import recording
+from .serializers import (CarSerializer, CustomerLeaseSerializer, CustomerPurchaseSerializer, CustomerSerializer,
+                          LeasingReadSerializer, TransactionReadSerializer)
+
+
+# Fields whose to_representation() is the identity for the values the database returns
+IDENTITY_FIELDS = (serializers.CharField, serializers.IntegerField, serializers.BooleanField)
+
+
+class ValuesPlan:
+    """
+    Read-only shortcut for a ModelSerializer on list pages: the serializer's
+    fields are compiled once into `.values()` lookups (following nested
+    serializers through joins), and each row is mapped straight to the same
+    dict the serializer would build, without model instances or per-field
+    get_attribute() calls.
+
+    Only plain fields, primary-key relations and nested single serializers
+    are supported; anything else raises TypeError when the plan is built.
+    """
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+        self.lookups = []
+        self.entries = self.compile(serializer_class(), '')
+
+    def compile(self, serializer, prefix):
+        entries = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if field.source == '*' or isinstance(field, (serializers.ListSerializer, serializers.ManyRelatedField,
+                                                         serializers.SerializerMethodField)):
+                raise TypeError(f"{type(serializer).__name__}.{name} cannot be read from .values().")
+            lookup = prefix + field.source.replace('.', '__')
+            self.lookups.append(lookup)  # for a nested serializer this is the FK id, used as the null check
+            if isinstance(field, serializers.BaseSerializer):
+                entries.append((name, lookup, self.compile(field, lookup + '__')))
+            elif isinstance(field, (PrimaryKeyRelatedField, *IDENTITY_FIELDS)):
+                entries.append((name, lookup, None))
+            elif isinstance(field, serializers.Field):
+                entries.append((name, lookup, field.to_representation))
+            else:
+                raise TypeError(f"{type(serializer).__name__}.{name} cannot be read from .values().")
+        return entries
+
+    def values(self, queryset):
+        return queryset.values(*self.lookups)
+
+    def build(self, row, entries):
+        data = {}
+        for name, lookup, convert in entries:
+            value = row[lookup]
+            if value is None:
+                data[name] = None
+            elif convert is None:
+                data[name] = value
+            elif isinstance(convert, list):
+                data[name] = self.build(row, convert)
+            else:
+                data[name] = convert(value)
+        return data
+
+    def represent(self, rows):
+        entries = self.entries
+        with recording('serialize'):
+            return [self.build(row, entries) for row in rows]
+
+
+# List pages are read with .values() and mapped to the serializers' output
+CAR_ROWS = ValuesPlan(CarSerializer)
+CUSTOMER_ROWS = ValuesPlan(CustomerSerializer)
+TRANSACTION_ROWS = ValuesPlan(TransactionReadSerializer)
+LEASING_ROWS = ValuesPlan(LeasingReadSerializer)
+PURCHASE_ROWS = ValuesPlan(CustomerPurchaseSerializer)
+CUSTOMER_LEASE_ROWS = ValuesPlan(CustomerLeaseSerializer)
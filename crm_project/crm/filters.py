@@ -0,0 +1,71 @@
+# crm_project/crm/filters.py
+
+from django.core.exceptions import ValidationError
+from django.db import models
+
+from .search import search_queryset
+
+
+# query parameter -> ORM lookup; every lookup column has a (company, column) index
+CAR_FILTERS = {
+    'brand': 'brand',
+    'model': 'model',
+    'color': 'color',
+    'year': 'year',
+    'year_min': 'year__gte',
+    'year_max': 'year__lte',
+    'in_stock': 'is_still_in_stock',
+}
+CAR_ORDERING = ('id', 'brand', 'model', 'year')
+
+CUSTOMER_FILTERS = {
+    'name': 'name',
+    'email': 'email',
+}
+CUSTOMER_ORDERING = ('id', 'name', 'email')
+
+DEFAULT_ORDERING = ('-id',)
+
+BOOLEAN_VALUES = {'true': True, 'yes': True, '1': True, 'false': False, 'no': False, '0': False}
+
+
+def filter_queryset(request, queryset, filters):
+    """
+    Applies the `filters` present in the query string plus the full-text
+    `search` parameter. Raises ValueError on values the column cannot hold.
+    """
+    for param, lookup in filters.items():
+        raw = request.GET.get(param)
+        if raw is None or raw == '':
+            continue
+        field = queryset.model._meta.get_field(lookup.split('__')[0])
+        if isinstance(field, models.BooleanField):
+            raw = BOOLEAN_VALUES.get(raw.lower(), raw)
+        try:
+            value = field.to_python(raw)
+        except ValidationError:
+            raise ValueError(f"Invalid value for '{param}'.")
+        queryset = queryset.filter(**{lookup: value})
+
+    search = request.GET.get('search', '').strip()
+    if search:
+        queryset = search_queryset(queryset, search)
+    return queryset
+
+
+def get_ordering(request, allowed):
+    """Parses `ordering=brand,-year`, allowing only indexed columns; `-id` breaks ties."""
+    raw = request.GET.get('ordering', '').strip()
+    if not raw:
+        return DEFAULT_ORDERING
+
+    ordering = []
+    for term in raw.split(','):
+        term = term.strip()
+        name = term.lstrip('-')
+        if name not in allowed:
+            raise ValueError(f"Cannot order by '{name}'. Allowed: {', '.join(allowed)}.")
+        ordering.append(term)
+    if 'id' not in [term.lstrip('-') for term in ordering]:
+        ordering.append('-id')
+    return tuple(ordering)
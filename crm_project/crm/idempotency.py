@@ -0,0 +1,85 @@
+# crm_project/crm/idempotency.py
+
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction as db_transaction
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyConflict(Exception):
+    """The key was already used for a different request body."""
+
+
+def request_key(request):
+    key = request.headers.get(IDEMPOTENCY_HEADER, '').strip()
+    if len(key) > MAX_KEY_LENGTH:
+        raise ValueError(f"{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters.")
+    return key or None
+
+
+def fingerprint(data):
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def expiry_cutoff():
+    # keys created before this are forgotten
+    return timezone.now() - timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 60 * 60))
+
+
+def keys_for(user, endpoint):
+    return IdempotencyKey.objects.filter(user=user, endpoint=endpoint, created_at__gte=expiry_cutoff())
+
+
+def stored_outcome(user, endpoint, key, data):
+    """(status code, body) stored for `key`, or None if the key is new or expired."""
+    record = keys_for(user, endpoint).filter(key=key).first()
+    if record is None:
+        return None
+    if record.fingerprint != fingerprint(data):
+        raise IdempotencyConflict(f"{IDEMPOTENCY_HEADER} '{key}' was already used for a different request.")
+    return record.status_code, record.response
+
+
+def run_once(user, endpoint, key, data, apply):
+    """
+    Runs `apply()` -> (status code, body) at most once per (user, endpoint, key).
+
+    The key row is inserted in the same transaction as the changes `apply()`
+    makes, so a retry either finds the committed outcome or, when the first
+    attempt failed or rolled back, runs again. Two concurrent attempts collide
+    on the unique key; the loser replays the winner's outcome.
+    Returns (status code, body, replayed).
+    """
+    outcome = stored_outcome(user, endpoint, key, data)
+    if outcome is not None:
+        return (*outcome, True)
+    try:
+        with db_transaction.atomic():
+            # an expired row with the same key would block the insert; a live one,
+            # committed since the lookup, must collide so its outcome is replayed
+            IdempotencyKey.objects.filter(user=user, endpoint=endpoint, key=key,
+                                          created_at__lt=expiry_cutoff()).delete()
+            record = IdempotencyKey.objects.create(user=user, endpoint=endpoint, key=key,
+                                                   fingerprint=fingerprint(data), status_code=0, response={})
+            status_code, body = apply()
+            if status_code >= 400:
+                # failures are not remembered: roll back and let the client retry
+                db_transaction.set_rollback(True)
+                return status_code, body, False
+            record.status_code, record.response = status_code, body
+            record.save(update_fields=['status_code', 'response'])
+    except IntegrityError:
+        outcome = stored_outcome(user, endpoint, key, data)
+        if outcome is None:
+            raise
+        return (*outcome, True)
+    return status_code, body, False
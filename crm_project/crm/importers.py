@@ -0,0 +1,129 @@
+# crm_project/crm/importers.py
+
+import csv
+import json
+from itertools import islice
+
+from django.db import transaction as db_transaction
+from rest_framework.exceptions import ValidationError
+
+from .models import Cars, CompanyStats, CompanyVersion
+from .serializers import CarImportSerializer
+
+
+IMPORT_BATCH_SIZE = 1000
+
+CSV_CONTENT_TYPES = ('text/csv', 'application/csv')
+NDJSON_CONTENT_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl',
+                        'application/json-lines', 'application/x-jsonlines')
+
+
+def detect_format(request):
+    fmt = request.GET.get('input_format')
+    if fmt:
+        return fmt.lower()
+    content_type = request.content_type.split(';')[0].strip().lower()
+    if content_type in CSV_CONTENT_TYPES:
+        return 'csv'
+    if content_type in NDJSON_CONTENT_TYPES:
+        return 'ndjson'
+    return None
+
+
+def iter_csv_rows(stream):
+    # Lines are decoded one at a time so the body is never held in memory
+    lines = (line.decode('utf-8-sig') for line in stream)
+    for row in csv.DictReader(lines):
+        # empty CSV cells mean "no value" for the nullable car columns
+        yield {key: (value if value != '' else None) for key, value in row.items() if key}
+
+
+class RowParseError(Exception):
+    pass
+
+
+def iter_ndjson_rows(stream):
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield RowParseError(f"Invalid JSON: {e}")
+            continue
+        if not isinstance(row, dict):
+            yield RowParseError("Each line must be a JSON object.")
+            continue
+        yield row
+
+
+def iter_rows(stream, fmt):
+    if fmt == 'csv':
+        return iter_csv_rows(stream)
+    if fmt == 'ndjson':
+        return iter_ndjson_rows(stream)
+    raise ValueError("Unsupported import format. Use text/csv or application/x-ndjson.")
+
+
+def read_chunk(numbered, batch_size):
+    """Up to `batch_size` rows, and the error that cut the feed short, if any."""
+    chunk = []
+    try:
+        chunk.extend(islice(numbered, batch_size))
+    except (ValueError, csv.Error) as e:  # undecodable bytes, malformed CSV
+        return chunk, str(e)
+    return chunk, None
+
+
+def import_cars(rows, company_id, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Validates `rows` in chunks with a single CarImportSerializer and inserts
+    the valid ones with bulk_create, one transaction per chunk.
+    Returns a per-row report: counts plus the errors of every rejected row.
+    When the feed itself breaks, the rows read before are still imported and
+    the report gets an 'error' saying where it stopped.
+    """
+    serializer = CarImportSerializer()
+    report = {'created': 0, 'failed': 0, 'errors': []}
+    numbered = enumerate(rows, start=1)
+    rows_read = 0
+
+    while True:
+        chunk, stream_error = read_chunk(numbered, batch_size)
+        if not chunk and not stream_error:
+            break
+        rows_read += len(chunk)
+
+        cars = []
+        for row_number, row in chunk:
+            if isinstance(row, RowParseError):
+                report['errors'].append({'row': row_number, 'errors': {'non_field_errors': [str(row)]}})
+                continue
+            try:
+                data = serializer.run_validation(row)
+            except ValidationError as e:
+                report['errors'].append({'row': row_number, 'errors': e.detail})
+                continue
+            total = data.get('total_available_number')
+            # same rule as Cars.is_still_in_stock_method, computed here instead of per save()
+            data['is_still_in_stock'] = total is not None and total > 0
+            cars.append(Cars(company_id=company_id, **data))
+
+        with db_transaction.atomic():
+            Cars.objects.bulk_create(cars, batch_size=batch_size)
+            # bulk_create skips Cars.save(), so add the chunk to the dashboard in one step
+            CompanyStats.apply(
+                company_id,
+                cars_in_stock=sum(car.total_available_number or 0 for car in cars),
+                cars_leased=sum(car.number_of_cars_in_lease or 0 for car in cars),
+            )
+            if cars:
+                CompanyVersion.bump(company_id, 'cars')
+        report['created'] += len(cars)
+        if stream_error:
+            report['error'] = f"Import stopped after row {rows_read}: {stream_error}"
+            break
+
+    report['failed'] = len(report['errors'])
+    return report
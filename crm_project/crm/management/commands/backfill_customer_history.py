@@ -0,0 +1,23 @@
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.core.management.base import BaseCommand
+
+from crm.models import Customer, Leasing, Transaction
+
+
+def count_per_customer(model):
+    counts = (model.objects.filter(customer_id=OuterRef('pk')).order_by()
+              .values('customer_id').annotate(total=Count('id')).values('total'))
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+class Command(BaseCommand):
+    help = ("Recomputes Customer.nr_of_bought_cars / nr_of_leased_cars from Transaction and Leasing. "
+            "Purchase and lease history is read from those tables, replacing the old text columns.")
+
+    def handle(self, *args, **options):
+        updated = Customer.objects.update(
+            nr_of_bought_cars=count_per_customer(Transaction),
+            nr_of_leased_cars=count_per_customer(Leasing),
+        )
+        self.stdout.write(self.style.SUCCESS(f"Backfilled purchase history counters for {updated} customers."))
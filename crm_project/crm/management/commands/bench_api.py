@@ -0,0 +1,126 @@
+import asyncio
+import json
+import platform
+import subprocess
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework_simplejwt.tokens import AccessToken
+
+from crm.benchmarks import (
+    ENDPOINTS, Fixtures, drive, encode_request, missing_endpoints, planned, regressions, summarize,
+)
+from crm.models import Cars, Company, Customer, Leasing, Transaction
+
+
+class Command(BaseCommand):
+    help = (
+        "Sends --requests requests to every endpoint of crm/urls.py over --concurrency keep-alive "
+        "connections and reports latency percentiles, throughput and SQL queries per request (read from "
+        "Server-Timing, so run the server with REQUEST_METRICS_SAMPLE_RATE=1 SERVER_TIMING_HEADER=true). "
+        "Reads run first, then writes, then deletes of rows made for them. The command must use the "
+        "server's database; SQLite "
+        "serialises writers, so concurrent writes there fail with 'database is locked' above --concurrency 1. "
+        "Typical run, on a freshly seeded database:\n"
+        "  manage.py seed_benchmark_data --scale 1m\n"
+        "  SERVER_TIMING_HEADER=true gunicorn crm_project.wsgi -w 4 --threads 8 -b 127.0.0.1:8000\n"
+        "  manage.py bench_api --output bench-$(git rev-parse --short HEAD).json --compare bench-main.json"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help="Server root (default %(default)s).")
+        parser.add_argument('--user', default='bench', help="Username to mint a JWT access token for.")
+        parser.add_argument('--requests', type=int, default=200, help="Measured requests per endpoint.")
+        parser.add_argument('--warmup', type=int, default=10, help="Unmeasured requests per endpoint first.")
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--timeout', type=float, default=30.0, help="Per-request timeout in seconds.")
+        parser.add_argument('--only', action='append', choices=sorted(ENDPOINTS), metavar='NAME',
+                            help="Only this endpoint (URL name); repeat for several.")
+        parser.add_argument('--output', help="Write the report to this JSON file.")
+        parser.add_argument('--compare', help="Earlier JSON report to flag regressions against.")
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help="Relative p95 slowdown counted as a regression (default 0.2).")
+        parser.add_argument('--fail-on-regression', action='store_true')
+
+    def handle(self, *args, url, user, requests, warmup, concurrency, timeout, only=None, output=None,
+               compare=None, threshold=0.2, fail_on_regression=False, **options):
+        missing = missing_endpoints()
+        if missing:
+            raise CommandError(f"No benchmark spec for {', '.join(missing)}; add them to crm.benchmarks.ENDPOINTS.")
+        parts = urlsplit(url)
+        if parts.scheme != 'http' or not parts.hostname:
+            raise CommandError("Only plain http:// URLs are supported.")
+        if requests <= 0 or concurrency <= 0 or warmup < 0:
+            raise CommandError("--requests and --concurrency must be positive, --warmup not negative.")
+        try:
+            user = User.objects.get(username=user)
+            fixtures = Fixtures(user)
+        except User.DoesNotExist:
+            raise CommandError(f"Unknown user '{user}'; run seed_benchmark_data first.")
+        except ValueError as e:
+            raise CommandError(str(e))
+        baseline = self.load(compare) if compare else None
+
+        token = str(AccessToken.for_user(user))
+        report = {'meta': self.meta(url, requests, warmup, concurrency), 'endpoints': {}}
+        for name, endpoint in planned(only):
+            count = warmup + requests
+            if endpoint.prepare:
+                fixtures.victims[name] = endpoint.prepare(fixtures, count)
+            encoded = [encode_request(endpoint.build(fixtures, i), parts.netloc, token) for i in range(count)]
+            if warmup:
+                asyncio.run(drive(parts.hostname, parts.port or 80, encoded[:warmup], concurrency, timeout))
+            results = asyncio.run(drive(parts.hostname, parts.port or 80, encoded[warmup:], concurrency, timeout))
+            report['endpoints'][name] = summary = summarize(results)
+            self.stdout.write(self.line(name, endpoint.phase, summary))
+
+        if output:
+            with open(output, 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"wrote {output}")
+        if baseline:
+            for key in ('database', 'concurrency', 'requests', 'rows'):
+                if baseline['meta'].get(key) != report['meta'][key]:
+                    self.stdout.write(self.style.WARNING(
+                        f"{key} differs from {compare}: {baseline['meta'].get(key)} -> {report['meta'][key]}"))
+            found = regressions(baseline, report, threshold)
+            for name, metric, before, after in found:
+                self.stdout.write(self.style.WARNING(f"regression {name}: {metric} {before} -> {after}"))
+            if not found:
+                self.stdout.write(self.style.SUCCESS(f"no regressions against {compare}"))
+            elif fail_on_regression:
+                raise CommandError(f"{len(found)} regressions against {compare}.")
+
+    def load(self, path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Cannot read {path}: {e}")
+
+    def meta(self, url, requests, warmup, concurrency):
+        try:
+            commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True,
+                                    text=True, timeout=10).stdout.strip() or None
+        except (OSError, subprocess.SubprocessError):
+            commit = None
+        return {
+            'commit': commit, 'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'url': url, 'requests': requests, 'warmup': warmup, 'concurrency': concurrency,
+            'database': connection.vendor, 'python': platform.python_version(), 'django': django.get_version(),
+            'rows': {model._meta.model_name: model.objects.count()
+                     for model in (Company, Cars, Customer, Transaction, Leasing)},
+        }
+
+    def line(self, name, phase, summary):
+        latency, queries = summary['latency_ms'], summary['queries']
+        timings = (f"p50 {latency['p50']:.1f}  p95 {latency['p95']:.1f}  p99 {latency['p99']:.1f} ms"
+                   if latency else "no responses")
+        return (f"{name:<26} {phase:<6} {summary['rps']:>8.1f} req/s  {timings}  "
+                f"queries {queries['mean'] if queries else '-'}  statuses {summary['statuses']}"
+                + (f"  errors {summary['errors']}" if summary['errors'] else ""))
@@ -0,0 +1,80 @@
+import time
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction as db_transaction
+from rest_framework.renderers import JSONRenderer
+
+from crm.fastpath import ValuesPlan
+from crm.models import Cars, Company, Customer, Transaction
+from crm.renderers import FastJSONRenderer
+from crm.serializers import CarSerializer, TransactionReadSerializer
+
+
+class Command(BaseCommand):
+    help = ("Times one large list page through the DRF serializers and through the .values() fast path "
+            "(query, mapping and JSON rendering). Sample rows are created in a transaction that is rolled back.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help="Rows per page (default 1000).")
+        parser.add_argument('--repeat', type=int, default=20, help="Timed runs per path (default 20).")
+
+    def handle(self, *args, rows=1000, repeat=20, **options):
+        with db_transaction.atomic():
+            company = self.populate(rows)
+            cases = (
+                ('cars', Cars.objects.filter(company=company), CarSerializer),
+                ('transactions', Transaction.objects.filter(company=company).select_related('customer', 'car'),
+                 TransactionReadSerializer),
+            )
+            for name, queryset, serializer_class in cases:
+                self.compare(name, queryset, serializer_class, rows, repeat)
+            db_transaction.set_rollback(True)
+
+    def populate(self, rows):
+        user = User.objects.create_user(username=f'bench-{time.time_ns()}')
+        company = Company.objects.create(name='Benchmark dealer', owner=user)
+        cars = Cars.objects.bulk_create([
+            Cars(company=company, brand=f'Brand {i}', model='Model', year=2020, color='Blue', engine='1.6',
+                 more_info='Some notes', total_available_number=5, number_of_cars_in_lease=1,
+                 is_still_in_stock=True)
+            for i in range(rows)
+        ])
+        customers = Customer.objects.bulk_create([
+            Customer(company=company, name=f'Customer {i}', email=f'c{i}@example.com', phone_number=i,
+                     address='Main St')
+            for i in range(rows)
+        ])
+        Transaction.objects.bulk_create([
+            Transaction(company=company, customer=customer, car=car, amount='1999.99', date=date(2024, 1, 1),
+                        receipt=f'R-Bench-{i}')
+            for i, (car, customer) in enumerate(zip(cars, customers))
+        ])
+        return company
+
+    def time_path(self, render, repeat):
+        render()  # warm-up
+        started = time.perf_counter()
+        for _ in range(repeat):
+            body = render()
+        return (time.perf_counter() - started) / repeat, body
+
+    def compare(self, name, queryset, serializer_class, rows, repeat):
+        plan = ValuesPlan(serializer_class)
+        stock, fast = JSONRenderer(), FastJSONRenderer()
+
+        def serializer_path():
+            page = queryset.order_by('-id')[:rows]
+            return stock.render({name: serializer_class(page, many=True).data})
+
+        def values_path():
+            page = plan.values(queryset).order_by('-id')[:rows]
+            return fast.render({name: plan.represent(page)})
+
+        slow_time, slow_body = self.time_path(serializer_path, repeat)
+        fast_time, fast_body = self.time_path(values_path, repeat)
+        self.stdout.write(
+            f"{name}: {rows} rows  serializer {slow_time * 1000:.1f} ms  values {fast_time * 1000:.1f} ms  "
+            f"speed-up {slow_time / fast_time:.1f}x  identical={slow_body == fast_body}"
+        )
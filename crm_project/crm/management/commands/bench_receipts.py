@@ -0,0 +1,77 @@
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections
+from django.utils.crypto import get_random_string
+
+from crm.models import Company
+from crm.receipts import LEGACY_RECEIPT_PREFIX, receipt_blocks
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares receipt generators. The legacy random 6-digit receipts are drawn in memory and their "
+        "collisions counted (each one was an IntegrityError and a retry). The sequence generator is run "
+        "against the configured database by --threads workers, one receipt per call as Transaction.save() "
+        "does, and checked for duplicates. Needs the tables (manage.py migrate --run-syncdb)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=100_000, help="Receipts per generator (default 100000).")
+        parser.add_argument('--threads', type=int, default=8)
+
+    def handle(self, *args, count=100_000, threads=8, **options):
+        self.legacy(count)
+        self.sequence(count, threads)
+
+    def legacy(self, count):
+        seen, collisions = set(), 0
+        started = time.perf_counter()
+        for _ in range(count):
+            while True:
+                receipt = f'{LEGACY_RECEIPT_PREFIX}{get_random_string(length=6, allowed_chars="1234567890")}'
+                if receipt not in seen:
+                    break
+                collisions += 1
+            seen.add(receipt)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"legacy random    {count} receipts  {collisions} collisions/retries  "
+            f"next insert collides with p={count / 1_000_000:.1%}  ({count / elapsed:.0f}/s in memory)"
+        )
+
+    def sequence(self, count, threads):
+        user = User.objects.create_user(username=f'bench-{time.time_ns()}')
+        company = Company.objects.create(name=f'Receipt benchmark {time.time_ns()}', owner=user)
+        per_thread = count // threads
+        issued = [[] for _ in range(threads)]
+        errors = []
+
+        def worker(receipts):
+            try:
+                for _ in range(per_thread):
+                    try:
+                        receipts.append(receipt_blocks.take(company.id, 1)[0])
+                    except OperationalError as e:
+                        errors.append(str(e))
+            finally:
+                connections.close_all()
+
+        workers = [threading.Thread(target=worker, args=(receipts,)) for receipts in issued]
+        started = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        user.delete()
+
+        numbers = [number for receipts in issued for number in receipts]
+        duplicates = len(numbers) - len(set(numbers))
+        ordered = all(receipts == sorted(receipts) for receipts in issued)
+        self.stdout.write(
+            f"sequence blocks  {len(numbers)} receipts  {duplicates} duplicates  {len(errors)} errors  "
+            f"increasing per thread: {ordered}  {len(numbers) / elapsed:.0f}/s with {threads} threads"
+        )
@@ -0,0 +1,90 @@
+import asyncio
+import statistics
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from crm.benchmarks import percentile, read_response
+
+
+class Command(BaseCommand):
+    help = (
+        "Keeps --concurrency HTTP/1.1 keep-alive connections busy against URL for --duration seconds and "
+        "reports throughput and latency percentiles. Used to compare the WSGI and ASGI entry points, e.g.\n"
+        "  gunicorn crm_project.wsgi -w 4 --threads 8 -b 127.0.0.1:8000\n"
+        "  uvicorn crm_project.asgi:application --workers 4 --host 127.0.0.1 --port 8001\n"
+        "  manage.py loadtest http://127.0.0.1:8000/crm/api/cars/ --user owner --concurrency 1000\n"
+        "  manage.py loadtest http://127.0.0.1:8001/crm/api/async/cars/ --user owner --concurrency 1000"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('url')
+        parser.add_argument('--concurrency', type=int, default=100, help="Open connections (default 100).")
+        parser.add_argument('--duration', type=float, default=10.0, help="Seconds to run (default 10).")
+        parser.add_argument('--user', help="Username to mint a JWT access token for.")
+        parser.add_argument('--timeout', type=float, default=30.0, help="Per-request timeout in seconds.")
+
+    def handle(self, *args, url, concurrency, duration, user=None, timeout=30.0, **options):
+        parts = urlsplit(url)
+        if parts.scheme != 'http' or not parts.hostname:
+            raise CommandError("Only plain http:// URLs are supported.")
+
+        headers = [f'Host: {parts.netloc}', 'Connection: keep-alive', 'Accept: application/json']
+        if user:
+            try:
+                token = AccessToken.for_user(User.objects.get(username=user))
+            except User.DoesNotExist:
+                raise CommandError(f"Unknown user '{user}'.")
+            headers.append(f'Authorization: Bearer {token}')
+        path = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+        request = (f'GET {path} HTTP/1.1\r\n' + '\r\n'.join(headers) + '\r\n\r\n').encode()
+
+        results = asyncio.run(self.run(parts.hostname, parts.port or 80, request, concurrency, duration, timeout))
+        self.report(results, duration, concurrency)
+
+    async def run(self, host, port, request, concurrency, duration, timeout):
+        deadline = time.monotonic() + duration
+        results = {'latencies': [], 'statuses': Counter(), 'errors': Counter()}
+        await asyncio.gather(*(self.worker(host, port, request, deadline, timeout, results)
+                               for _ in range(concurrency)))
+        return results
+
+    async def worker(self, host, port, request, deadline, timeout, results):
+        reader = writer = None
+        while time.monotonic() < deadline:
+            started = time.monotonic()
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+                writer.write(request)
+                status, keep_alive, _ = await asyncio.wait_for(read_response(reader), timeout)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as e:
+                results['errors'][type(e).__name__] += 1
+                if writer is not None:
+                    writer.close()
+                reader = writer = None
+                await asyncio.sleep(0.05)
+                continue
+            results['latencies'].append(time.monotonic() - started)
+            results['statuses'][status] += 1
+            if not keep_alive:
+                writer.close()
+                reader = writer = None
+        if writer is not None:
+            writer.close()
+
+    def report(self, results, duration, concurrency):
+        latencies = sorted(latency * 1000 for latency in results['latencies'])
+        if not latencies:
+            raise CommandError(f"No request completed. Errors: {dict(results['errors'])}")
+
+        self.stdout.write(
+            f"connections {concurrency}  requests {len(latencies)}  {len(latencies) / duration:.0f} req/s\n"
+            f"latency ms  mean {statistics.fmean(latencies):.1f}  p50 {percentile(latencies, 0.50):.1f}  "
+            f"p95 {percentile(latencies, 0.95):.1f}  p99 {percentile(latencies, 0.99):.1f}\n"
+            f"statuses {dict(results['statuses'])}  errors {dict(results['errors'])}"
+        )
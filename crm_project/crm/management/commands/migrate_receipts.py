@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction as db_transaction
+from django.db.models import Count
+
+from crm.models import CompanyVersion, ReceiptSequence, Transaction
+from crm.receipts import RECEIPT_PATTERN, format_receipt
+
+
+class Command(BaseCommand):
+    help = (
+        "Lists transactions whose receipt predates the per-company receipt sequences (e.g. the random "
+        "R-Nr-123456 ones). With --rewrite they are renumbered in id order from the same sequence new sales "
+        "use, --batch-size rows per transaction, so it can run while the API is up. Old and new receipts "
+        "cannot collide, so rewriting is optional; run it before new receipts are issued to keep receipts "
+        "in issue order."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rewrite', action='store_true', help="Renumber the legacy receipts.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, rewrite=False, batch_size=1000, **options):
+        legacy = Transaction.objects.exclude(receipt__regex=RECEIPT_PATTERN.pattern)
+        per_company = dict(legacy.order_by().values('company_id').annotate(n=Count('id'))
+                           .values_list('company_id', 'n'))
+        self.stdout.write(f"{sum(per_company.values())} legacy receipts in {len(per_company)} companies.")
+        if not rewrite:
+            return
+
+        for company_id in sorted(per_company):
+            rewritten = 0
+            while True:
+                with db_transaction.atomic():
+                    rows = list(legacy.filter(company_id=company_id).order_by('id')
+                                .select_for_update().only('id')[:batch_size])
+                    if not rows:
+                        break
+                    first = ReceiptSequence.allocate(company_id, len(rows))
+                    for number, row in enumerate(rows, first):
+                        row.receipt = format_receipt(company_id, number)
+                    Transaction.objects.bulk_update(rows, ['receipt'])
+                    # bulk_update sends no post_save
+                    CompanyVersion.bump(company_id, 'transactions')
+                rewritten += len(rows)
+            self.stdout.write(f"company {company_id}: {rewritten} receipts rewritten")
+        self.stdout.write(self.style.SUCCESS("Done."))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from crm.availability import rebuild
+
+
+class Command(BaseCommand):
+    help = ("Recomputes the per-day car occupancy behind car_availability from the active leases. "
+            "Run once after deploying it, or to repair the table after manual data fixes.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--car', type=int, action='append', dest='car_ids',
+                            help="Only rebuild this car (repeatable).")
+
+    def handle(self, *args, car_ids=None, **options):
+        days = rebuild(car_ids)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt occupancy: {days} car-days."))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from crm.stats import rebuild
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the dashboard summary tables (CompanyStats, DailyRevenue) from cars, leases and transactions."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', type=int, action='append', dest='company_ids',
+                            help="Only rebuild this company id (can be repeated).")
+
+    def handle(self, *args, company_ids=None, **options):
+        companies = rebuild(company_ids)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt dashboard stats for {companies} companies."))
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.models import ACTIVE_LEASE, Leasing
+from crm.pricing import REPRICE_BATCH_SIZE, reprice
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes lease amounts from the current rate tables (see api/lease_rates/) and writes the "
+        "changed ones with one bulk_update per --batch-size leases. Only active leases are repriced unless "
+        "--include-returned is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', type=int, action='append', dest='company_ids',
+                            help="Only this company's leases; repeat for several.")
+        parser.add_argument('--include-returned', action='store_true')
+        parser.add_argument('--batch-size', type=int, default=REPRICE_BATCH_SIZE)
+
+    def handle(self, *args, company_ids=None, include_returned=False, batch_size=REPRICE_BATCH_SIZE, **options):
+        if batch_size <= 0:
+            raise CommandError("--batch-size must be a positive integer.")
+        leases = Leasing.objects.all()
+        if company_ids:
+            leases = leases.for_companies(company_ids)
+        if not include_returned:
+            leases = leases.filter(ACTIVE_LEASE)
+
+        started = time.perf_counter()
+        read, repriced = reprice(leases, batch_size)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"repriced {repriced} of {read} leases in {elapsed:.2f} s "
+            f"({read / elapsed if elapsed else 0:.0f} leases/s)"
+        )
@@ -0,0 +1,63 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from crm.expiry import EXPIRY_BATCH_SIZE, due_summary, return_due_leases
+
+
+class Command(BaseCommand):
+    help = (
+        "Marks leases whose lease_end_date has passed as returned and puts the cars back in stock, in "
+        "batches of --batch-size leases per transaction. Run it from cron, or keep it running with --every. "
+        "--dry-run only reports what is due."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--as-of', help="Return leases that ended before this date (YYYY-MM-DD, default today).")
+        parser.add_argument('--batch-size', type=int, default=EXPIRY_BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true')
+        parser.add_argument('--every', type=float, help="Repeat every N seconds instead of exiting.")
+
+    def handle(self, *args, as_of=None, batch_size=EXPIRY_BATCH_SIZE, dry_run=False, every=None, **options):
+        if as_of:
+            try:
+                as_of = date.fromisoformat(as_of)
+            except ValueError:
+                raise CommandError("--as-of must be a date in YYYY-MM-DD format.")
+        if batch_size <= 0:
+            raise CommandError("--batch-size must be a positive integer.")
+
+        while True:
+            run_date = as_of or timezone.localdate()
+            if dry_run:
+                summary = due_summary(run_date)
+                self.stdout.write(
+                    f"due before {run_date}: {summary['leases']} leases, {summary['cars']} cars, "
+                    f"{summary['companies']} companies, oldest end date {summary['oldest_end_date']}"
+                )
+            else:
+                self.run(run_date, batch_size, options['verbosity'])
+            if not every:
+                return
+            time.sleep(every)
+
+    def run(self, run_date, batch_size, verbosity):
+        started = time.perf_counter()
+        leases = cars = batches = 0
+        slowest = 0.0
+        for batch in return_due_leases(run_date, batch_size):
+            batches += 1
+            leases += batch['leases']
+            cars += batch['cars']
+            slowest = max(slowest, batch['seconds'])
+            if verbosity > 1:
+                self.stdout.write(f"batch {batches}: {batch['leases']} leases, {batch['cars']} cars, "
+                                  f"{batch['seconds'] * 1000:.0f} ms")
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"returned {leases} leases ending before {run_date} ({cars} car updates) in {batches} batches, "
+            f"{elapsed:.2f} s, {leases / elapsed if elapsed else 0:.0f} leases/s, "
+            f"slowest batch {slowest * 1000:.0f} ms"
+        )
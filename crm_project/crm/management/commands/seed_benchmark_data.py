@@ -0,0 +1,51 @@
+import time
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.benchmarks import SCALES, SEED_BATCH_SIZE, seed_dataset
+from crm.models import Cars, Company, Customer, Leasing, Transaction
+
+
+class Command(BaseCommand):
+    help = (
+        "Fills an empty database with a synthetic, reproducible dataset for bench_api: --scale rows "
+        "(10k, 1m or 10m) split over cars, customers, transactions and leases of --companies companies, "
+        "all owned by --user. The same --seed and --today give the same rows."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=sorted(SCALES), default='10k')
+        parser.add_argument('--rows', type=int, help="Exact row count; overrides --scale.")
+        parser.add_argument('--companies', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--today', type=date.fromisoformat,
+                            help="Date the data is generated around, YYYY-MM-DD (default today).")
+        parser.add_argument('--user', default='bench')
+        parser.add_argument('--password', default='bench')
+        parser.add_argument('--batch-size', type=int, default=SEED_BATCH_SIZE)
+
+    def handle(self, *args, scale='10k', rows=None, companies=10, seed=0, today=None, user='bench',
+               password='bench', batch_size=SEED_BATCH_SIZE, **options):
+        if companies <= 0 or batch_size <= 0:
+            raise CommandError("--companies and --batch-size must be positive integers.")
+        for model in (Company, Cars, Customer, Transaction, Leasing):
+            if model.objects.exists():
+                raise CommandError(f"The database already has {model._meta.verbose_name_plural}; "
+                                   f"seed a fresh one so runs compare.")
+        if User.objects.filter(username=user).exists():
+            raise CommandError(f"User '{user}' already exists.")
+
+        started = time.perf_counter()
+        try:
+            counts = seed_dataset(rows or SCALES[scale], companies, seed, user, password, batch_size, today,
+                                  log=self.stdout.write)
+        except ValueError as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - started
+        total = sum(counts.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {total} rows ({', '.join(f'{count} {name}' for name, count in counts.items())}) "
+            f"in {elapsed:.1f} s ({total / elapsed:.0f} rows/s)."
+        ))
@@ -0,0 +1,216 @@
+# crm_project/crm/metrics.py
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+from .cache import response_cache
+
+
+logger = logging.getLogger('crm.requests')
+
+# seconds; the last bucket of every histogram is +Inf
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+# RequestMetrics of the current request when it is sampled, else None
+current_metrics = ContextVar('current_metrics', default=None)
+
+
+class RequestMetrics:
+    """
+    What one sampled request spent on SQL, on turning rows into response data
+    (serializers and fastpath plans) and on encoding that data as the body.
+    """
+
+    __slots__ = ('queries', 'db_seconds', 'serialize_seconds', 'render_seconds')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.render_seconds = 0.0
+
+
+def record_query(execute, sql, params, many, context):
+    """Execute wrapper installed on every connection; a no-op outside sampled requests."""
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_seconds += time.perf_counter() - started
+        metrics.queries += 1
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    # connection_created fires on every reconnect of the same wrapper
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@contextmanager
+def recording(phase):
+    """Adds the block's time to `phase` ('serialize' or 'render'), less the SQL it ran, which db counts."""
+    metrics = current_metrics.get()
+    if metrics is None:
+        yield
+        return
+    started, db_seconds = time.perf_counter(), metrics.db_seconds
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started - (metrics.db_seconds - db_seconds)
+        setattr(metrics, f'{phase}_seconds', getattr(metrics, f'{phase}_seconds') + elapsed)
+
+
+class Histogram:
+    __slots__ = ('bounds', 'counts', 'total')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+
+
+def label_value(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def format_labels(labels):
+    return ','.join(f'{name}="{label_value(value)}"' for name, value in labels)
+
+
+class MetricsRegistry:
+    """
+    Per-process request counters and per-endpoint histograms, rendered in
+    the Prometheus text format. Every request is counted and timed; the
+    query, DB and render histograms only see sampled requests.
+
+    Nothing is shared between server workers: every series carries a
+    worker="<pid>" label, and each worker has to be scraped on its own
+    (one scrape target per worker). A scrape through the load balancer
+    only sees whichever worker answered it.
+    """
+
+    HISTOGRAMS = {
+        'duration': ('crm_request_duration_seconds', "Time from the first middleware to the response.",
+                     DURATION_BUCKETS),
+        'db': ('crm_request_db_seconds', "Time spent executing SQL, sampled requests.", DURATION_BUCKETS),
+        'serialize': ('crm_request_serialize_seconds',
+                      "Time spent turning rows into response data, SQL excluded, sampled requests.",
+                      DURATION_BUCKETS),
+        'render': ('crm_request_render_seconds', "Time spent encoding response bodies, sampled requests.",
+                   DURATION_BUCKETS),
+        'queries': ('crm_request_queries', "SQL statements per request, sampled requests.", QUERY_BUCKETS),
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._requests = {}
+            self._histograms = {name: {} for name in self.HISTOGRAMS}
+
+    def observe(self, endpoint, method, status, seconds, metrics=None):
+        labels = (('endpoint', endpoint), ('method', method))
+        values = {'duration': seconds}
+        if metrics is not None:
+            values.update(db=metrics.db_seconds, serialize=metrics.serialize_seconds,
+                          render=metrics.render_seconds, queries=metrics.queries)
+        with self._lock:
+            key = (*labels, ('status', status))
+            self._requests[key] = self._requests.get(key, 0) + 1
+            for name, value in values.items():
+                histograms = self._histograms[name]
+                histogram = histograms.get(labels)
+                if histogram is None:
+                    histogram = histograms[labels] = Histogram(self.HISTOGRAMS[name][2])
+                histogram.observe(value)
+
+    def exposition(self):
+        # read at scrape time: workers forked from a preloaded app share the import
+        worker = (('worker', os.getpid()),)
+        with self._lock:
+            requests = sorted(self._requests.items())
+            histograms = {name: sorted((labels, (list(h.counts), h.total)) for labels, h in rows.items())
+                          for name, rows in self._histograms.items()}
+
+        lines = ["# HELP crm_requests_total Requests handled, by endpoint, method and status.",
+                 "# TYPE crm_requests_total counter"]
+        lines += [f'crm_requests_total{{{format_labels((*worker, *labels))}}} {count}'
+                  for labels, count in requests]
+        for name, (metric, help_text, bounds) in self.HISTOGRAMS.items():
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} histogram"]
+            for labels, (counts, total) in histograms[name]:
+                labels = (*worker, *labels)
+                cumulative = 0
+                for bound, count in zip((*bounds, '+Inf'), counts):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{{{format_labels((*labels, ("le", bound)))}}} {cumulative}')
+                lines.append(f'{metric}_sum{{{format_labels(labels)}}} {total}')
+                lines.append(f'{metric}_count{{{format_labels(labels)}}} {cumulative}')
+
+        cache = response_cache.stats()
+        for name in ('hits', 'misses', 'errors'):
+            lines += [f"# HELP crm_response_cache_{name}_total Response cache {name} in this process.",
+                      f"# TYPE crm_response_cache_{name}_total counter",
+                      f"crm_response_cache_{name}_total{{{format_labels(worker)}}} {cache[name]}"]
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def sampled():
+    rate = getattr(settings, 'REQUEST_METRICS_SAMPLE_RATE', 1.0)
+    return rate >= 1 or (rate > 0 and random.random() < rate)
+
+
+def endpoint_name(request):
+    match = getattr(request, 'resolver_match', None)
+    # unmatched paths share one label so scanners cannot grow the registry
+    return match.view_name if match else 'unresolved'
+
+
+def finish(request, response, started, metrics):
+    """Records a finished request; the time a streamed body takes to send is not included."""
+    total = time.perf_counter() - started
+    endpoint = endpoint_name(request)
+    method = request.method if request.method in METHODS else 'other'
+    registry.observe(endpoint, method, response.status_code, total, metrics)
+    if metrics is None:
+        return
+    db_ms, serialize_ms, render_ms = (metrics.db_seconds * 1000, metrics.serialize_seconds * 1000,
+                                      metrics.render_seconds * 1000)
+    total_ms = total * 1000
+    if getattr(settings, 'SERVER_TIMING_HEADER', False):
+        # timings tell clients about the server's internals; opt-in only
+        response['Server-Timing'] = (
+            f'db;dur={db_ms:.1f};desc="{metrics.queries} queries", serialize;dur={serialize_ms:.1f}, '
+            f'render;dur={render_ms:.1f}, app;dur={max(total_ms - db_ms - serialize_ms - render_ms, 0):.1f}, '
+            f'total;dur={total_ms:.1f}'
+        )
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps({
+            'endpoint': endpoint, 'method': method, 'path': request.path, 'status': response.status_code,
+            'queries': metrics.queries, 'db_ms': round(db_ms, 2), 'serialize_ms': round(serialize_ms, 2),
+            'render_ms': round(render_ms, 2), 'total_ms': round(total_ms, 2),
+        }))
@@ -0,0 +1,123 @@
+# crm_project/crm/middleware.py
+
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.utils.functional import SimpleLazyObject
+
+from .companies import company_ids_for
+from .metrics import RequestMetrics, current_metrics, finish, sampled
+from .routers import RequestRouting, current_routing
+
+
+class CompanyMiddleware:
+    """
+    Exposes the caller's company ids as `request.company_ids`.
+
+    Resolution is lazy so it runs after DRF has authenticated the JWT user
+    (DRF copies the user onto the underlying HttpRequest), and at most once
+    per request.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # runs natively under ASGI so async views are not pushed onto a thread
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        # Async views must use `await acompany_ids_for(user)` instead: the
+        # lazy object below runs the synchronous ORM.
+        request.company_ids = SimpleLazyObject(lambda: company_ids_for(request.user))
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        return await self.get_response(request)
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Installs the request's RequestRouting for crm.routers.PrimaryReplicaRouter
+    and, when the request wrote to the primary, pins the client to the
+    primary for settings.REPLICA_PIN_SECONDS so its next reads see the write.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        routing = RequestRouting(request)
+        token = current_routing.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_routing.reset(token)
+        if routing.wrote and routing.client_key:
+            routing.pin()
+        return response
+
+    async def __acall__(self, request):
+        routing = RequestRouting(request)
+        token = current_routing.set(routing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_routing.reset(token)
+        if routing.wrote and routing.client_key:
+            await routing.apin()
+        return response
+
+
+class RequestMetricsMiddleware:
+    """
+    Times every request per endpoint for the metrics endpoint. Requests
+    picked by settings.REQUEST_METRICS_SAMPLE_RATE also count their SQL
+    statements, DB, serialize and render time, log them as one JSON line on
+    the crm.requests logger and, with settings.SERVER_TIMING_HEADER, report
+    them in a Server-Timing header.
+    First in MIDDLEWARE so the total covers the other middleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        metrics = RequestMetrics() if sampled() else None
+        token = current_metrics.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        finish(request, response, started, metrics)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        metrics = RequestMetrics() if sampled() else None
+        token = current_metrics.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        finish(request, response, started, metrics)
+        return response
@@ -1,7 +1,13 @@
-from django.db import models
-from decimal import Decimal
-from django.utils.crypto import get_random_string
+from collections import defaultdict
+
+from django.db import IntegrityError, models, transaction as db_transaction
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.functions import Coalesce
+from datetime import timedelta
 from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .routers import unpinned_writes
 
 
 class Company(models.Model):
@@ -17,7 +23,83 @@ class Company(models.Model):
 
 
 
-class Cars(models.Model):
+class TrackedFieldsMixin:
+    """
+    Remembers the values of `tracked_fields` (attnames) as they were loaded
+    from, or last written to, the database, so save() can tell what changed
+    without reading the row again.
+    """
+    tracked_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.snapshot_tracked_fields()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        self.snapshot_tracked_fields(fields)
+
+    def snapshot_tracked_fields(self, fields=None):
+        loaded = self.__dict__.setdefault('_loaded_values', {})
+        for name in self.tracked_fields:
+            if fields is not None and name not in fields and name.removesuffix('_id') not in fields:
+                continue
+            # deferred fields are skipped instead of being fetched
+            if name in self.__dict__:
+                loaded[name] = self.__dict__[name]
+
+    def loaded_value(self, name, default=None):
+        return self.__dict__.get('_loaded_values', {}).get(name, default)
+
+    def ensure_snapshot(self):
+        # Instances that did not come through from_db (e.g. from bulk_create)
+        # read their stored values once.
+        loaded = self.__dict__.setdefault('_loaded_values', {})
+        missing = [name for name in self.tracked_fields if name not in loaded]
+        if missing and not self._state.adding:
+            stored = type(self)._base_manager.filter(pk=self.pk).values(*missing).first()
+            loaded.update(stored or {})
+
+    def changed_fields(self):
+        loaded = self.__dict__.get('_loaded_values', {})
+        return [
+            name for name in self.tracked_fields
+            if name in self.__dict__ and (name not in loaded or loaded[name] != self.__dict__[name])
+        ]
+
+
+def apply_counter_deltas(model, lookup, deltas, create=True):
+    """
+    Adds `deltas` to the counters of the summary row matching `lookup` with a
+    single F() UPDATE, creating the row on first use.
+    """
+    deltas = {name: value for name, value in deltas.items() if value}
+    if not deltas or None in lookup.values():
+        return
+    increments = {name: F(name) + value for name, value in deltas.items()}
+    if model.objects.filter(**lookup).update(**increments) or not create:
+        return
+    try:
+        with db_transaction.atomic():
+            model.objects.create(**lookup, **deltas)
+    except IntegrityError:
+        # another request created the row first
+        model.objects.filter(**lookup).update(**increments)
+
+
+class CompanyQuerySet(models.QuerySet):
+    def for_companies(self, company_ids):
+        # Tenant scope for list/detail views; served by the (company, -id) indexes
+        return self.filter(company_id__in=list(company_ids))
+
+
+class OutOfStockError(ValueError):
+    """Raised when a sale or lease asks for more cars than are available."""
+
+
+class Cars(TrackedFieldsMixin, models.Model):
     company = models.ForeignKey(Company, on_delete=models.CASCADE)
     brand = models.CharField(max_length=50,null=True)
     model = models.CharField(max_length=50,null=True)
@@ -30,6 +112,21 @@ class Cars(models.Model):
     is_still_in_stock = models.BooleanField(null=True)
     sold_cars = models.IntegerField(default=False)
 
+    objects = CompanyQuerySet.as_manager()
+    version_resource = 'cars'  # CompanyVersion counter bumped on writes
+
+    tracked_fields = ('company_id', 'total_available_number', 'number_of_cars_in_lease', 'sold_cars')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['company', '-id'], name='cars_company_id_desc_idx'),
+            models.Index(fields=['company', 'brand'], name='cars_company_brand_idx'),
+            models.Index(fields=['company', 'model'], name='cars_company_model_idx'),
+            models.Index(fields=['company', 'year'], name='cars_company_year_idx'),
+            models.Index(fields=['company', 'color'], name='cars_company_color_idx'),
+            models.Index(fields=['company', 'is_still_in_stock'], name='cars_company_in_stock_idx'),
+        ]
+
     def __str__(self):
         return f"{self.brand}"
 
@@ -37,26 +134,57 @@ class Cars(models.Model):
         return self.total_available_number > 0
 
 
+    def _take_from_stock(self, number, **counters):
+        # Single conditional UPDATE: the stock check and the decrement happen
+        # atomically in the database, so concurrent requests cannot oversell.
+        updated = Cars.objects.filter(pk=self.pk, total_available_number__gte=number).update(
+            total_available_number=F('total_available_number') - number,
+            is_still_in_stock=Case(
+                When(total_available_number__gt=number, then=Value(True)),
+                default=Value(False),
+            ),
+            **counters,
+        )
+        if not updated:
+            return False
+        # update() sends no post_save, so the car list version is bumped here
+        CompanyVersion.bump(self.company_id, 'cars')
+        self.refresh_from_db(fields=['total_available_number', 'is_still_in_stock', *counters])
+        return True
+
     def sold(self, number_of_sold):
-        if self.total_available_number >= number_of_sold: #check if there are any cars left to sell
-            self.total_available_number -= number_of_sold
-            self.sold_cars += 1
-            self.save()  # Save the updated value to the database
-        else:
-            # Handle the case where the available number is less than the sold quantity
-            raise ValueError("Not enough cars available for sale.")
+        #check if there are any cars left to sell and take them in the same query
+        with db_transaction.atomic():
+            if not self._take_from_stock(number_of_sold, sold_cars=F('sold_cars') + number_of_sold):
+                # Handle the case where the available number is less than the sold quantity
+                raise OutOfStockError("Not enough cars available for sale.")
+            CompanyStats.apply(self.company_id, cars_in_stock=-number_of_sold, units_sold=number_of_sold)
 
     def lease(self, number_of_lease):
-        if self.total_available_number >= number_of_lease:
-            self.total_available_number -= number_of_lease
-            if self.number_of_cars_in_lease is not None:
-                self.number_of_cars_in_lease += number_of_lease
-            else:
-                self.number_of_cars_in_lease = number_of_lease
-            self.save()  # Save the updated value to the database
-        else:
-            # Handle the case where the available number is less than the leased quantity
-            raise ValueError("Not enough cars available for lease.")
+        in_lease = Coalesce(F('number_of_cars_in_lease'), 0) + number_of_lease
+        with db_transaction.atomic():
+            if not self._take_from_stock(number_of_lease, number_of_cars_in_lease=in_lease):
+                # Handle the case where the available number is less than the leased quantity
+                raise OutOfStockError("Not enough cars available for lease.")
+            CompanyStats.apply(self.company_id, cars_in_stock=-number_of_lease, cars_leased=number_of_lease)
+
+    def stats_counters(self, loaded=False):
+        value = self.loaded_value if loaded else lambda name: getattr(self, name)
+        return {
+            'cars_in_stock': value('total_available_number') or 0,
+            'cars_leased': value('number_of_cars_in_lease') or 0,
+            'units_sold': value('sold_cars') or 0,
+        }
+
+    def update_dashboard_stats(self):
+        old_company_id = self.loaded_value('company_id')
+        old = self.stats_counters(loaded=True)
+        new = self.stats_counters()
+        if old_company_id is not None and old_company_id != self.company_id:
+            CompanyStats.apply(old_company_id, **{name: -value for name, value in old.items()})
+            old = dict.fromkeys(old, 0)
+        CompanyStats.apply(self.company_id, **{name: new[name] - old[name] for name in new})
+        self.snapshot_tracked_fields()
 
 
     def save(self, *args, **kwargs):
@@ -64,7 +192,9 @@ class Cars(models.Model):
         if self.is_still_in_stock is None or self.is_still_in_stock != self.is_still_in_stock_method():
             self.is_still_in_stock = self.is_still_in_stock_method()
 
-        super().save(*args, **kwargs)
+        with db_transaction.atomic():
+            super().save(*args, **kwargs)
+            self.update_dashboard_stats()
 
 
 
@@ -75,50 +205,106 @@ class Customer(models.Model):
     email = models.EmailField()
     phone_number = models.IntegerField()
     address = models.TextField()
+    # The cars themselves are read from Transaction / Leasing (see the
+    # customer_purchases and customer_leases endpoints); only counters live here
     nr_of_bought_cars = models.IntegerField(default=0)
-    bought_cars = models.TextField(default='')
     nr_of_leased_cars = models.IntegerField(default=0)
-    leased_cars = models.TextField(default='')
 
     cars = models.ForeignKey('Cars', on_delete=models.CASCADE, null=True, blank=True)
 
+    objects = CompanyQuerySet.as_manager()
+    version_resource = 'customers'
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['company', '-id'], name='customer_company_id_desc_idx'),
+            models.Index(fields=['company', 'name'], name='customer_company_name_idx'),
+            models.Index(fields=['company', 'email'], name='customer_company_email_idx'),
+        ]
+
+    @classmethod
+    def add_history(cls, field, deltas):
+        """Adds {customer id: delta} to the `field` counter, one UPDATE per distinct delta."""
+        by_delta = defaultdict(list)
+        for customer_id, delta in deltas.items():
+            if delta and customer_id is not None:
+                by_delta[delta].append(customer_id)
+        for delta, ids in by_delta.items():
+            cls.objects.filter(pk__in=ids).update(**{field: F(field) + delta})
+
     def __str__(self):
         return f"{self.name}"
 
 
 
 
-class Transaction(models.Model):
+class Transaction(TrackedFieldsMixin, models.Model):
     company = models.ForeignKey(Company, on_delete=models.CASCADE)
     customer = models.ForeignKey('Customer', on_delete=models.CASCADE)
     car = models.ForeignKey('Cars', on_delete=models.CASCADE)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     date = models.DateField()
     receipt = models.CharField(max_length=50, unique=True)  # Unique constraint for the receipt ID
-    
 
-    def generate_receipt_id(self):
-        # Combines 'R-Nr-' with a random 6-digit number
-        return f'R-Nr-{get_random_string(length=6, allowed_chars="1234567890")}'
+    objects = CompanyQuerySet.as_manager()
+    version_resource = 'transactions'
+    customer_history_field = 'nr_of_bought_cars'  # Customer counter of these rows
 
-    def map_bought_cars_by_customer(self):
-        self.customer.nr_of_bought_cars += 1
-        self.customer.bought_cars += f"{self.car.brand} {self.car.model} ({self.car.year})"
-        self.customer.save()
+    tracked_fields = ('company_id', 'customer_id', 'date', 'amount')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['company', '-id'], name='transaction_company_id_idx'),
+            models.Index(fields=['company', 'date'], name='transaction_company_date_idx'),
+            models.Index(fields=['customer', '-id'], name='transaction_customer_id_idx'),
+        ]
+    
+
+    def generate_receipt_id(self):
+        # Next number of the company's receipt sequence, e.g. R-12-0000000042
+        from .receipts import next_receipts
+        return next_receipts(self.company_id, 1)[0]
+
+    def update_customer_history(self, adding):
+        old = None if adding else self.loaded_value('customer_id')
+        if old != self.customer_id:
+            Customer.add_history(self.customer_history_field, {self.customer_id: 1, old: -1})
+
+    def update_dashboard_stats(self):
+        old_key = (self.loaded_value('company_id'), self.loaded_value('date'))
+        new_key = (self.company_id, self.date)
+        old_amount = self.loaded_value('amount')
+        if old_key == new_key and old_amount == self.amount:
+            return
+        if old_amount is not None:
+            DailyRevenue.apply(*old_key, revenue=-old_amount, transactions=-1)
+        DailyRevenue.apply(*new_key, revenue=self.amount, transactions=1)
 
     def save(self, *args, **kwargs):
+        adding = self._state.adding
+        self.ensure_snapshot()
         # Generate receipt ID 
         if not self.receipt:
             self.receipt = self.generate_receipt_id()
-        super().save(*args, **kwargs)
+        with db_transaction.atomic():
+            super().save(*args, **kwargs)
+            self.update_customer_history(adding)
+            self.update_dashboard_stats()
+            self.snapshot_tracked_fields()
 
     def __str__(self):
         return f"Transaction #{self.id} - Receipt: {self.receipt} - {self.customer.name} "
 
 
 
-class Leasing(models.Model):
+# Leases that still hold a car unit; NULL counts as not returned (see Leasing.is_active)
+ACTIVE_LEASE = Q(mark_as_returned_from_lease=False) | Q(mark_as_returned_from_lease__isnull=True)
+
+# Leasing fields a lease's price depends on; the amount itself is always computed
+PRICED_FIELDS = {'company_id', 'car_id', 'lease_start_date', 'lease_end_date', 'amount'}
+
+
+class Leasing(TrackedFieldsMixin, models.Model):
     company = models.ForeignKey(Company, on_delete=models.CASCADE)
     customer = models.ForeignKey('Customer', on_delete=models.CASCADE)
     car = models.ForeignKey('Cars', on_delete=models.CASCADE)
@@ -127,53 +313,330 @@ class Leasing(models.Model):
     amount = models.DecimalField(default=0.0, max_digits=10, decimal_places=2, null=True)
     mark_as_returned_from_lease = models.BooleanField(default=False, null=True, blank=True)
 
-    def calculate_amount(self):
-        # fixed cost per day, $20
-        cost_per_day = Decimal('20')
-        # Calculate the number of days between start and end dates
-        num_days = (self.lease_end_date - self.lease_start_date).days + 1
-        # Calculate the total amount
-        total_amount = cost_per_day * num_days
+    objects = CompanyQuerySet.as_manager()
+    version_resource = 'leases'
+    customer_history_field = 'nr_of_leased_cars'
 
-        return total_amount
+    tracked_fields = ('company_id', 'customer_id', 'car_id', 'lease_start_date', 'lease_end_date',
+                      'amount', 'mark_as_returned_from_lease')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['company', '-id'], name='leasing_company_id_idx'),
+            models.Index(fields=['company', 'lease_end_date'], name='leasing_company_end_idx'),
+            # the export's range filter and (company, lease_start_date, id) ordering
+            models.Index(fields=['company', 'lease_start_date', 'id'], name='leasing_company_start_idx'),
+            models.Index(fields=['customer', '-id'], name='leasing_customer_id_idx'),
+            # partial index over active leases only, for the expiry job's due-lease scan
+            models.Index(fields=['lease_end_date', 'id'], name='leasing_due_idx', condition=ACTIVE_LEASE),
+        ]
+
+    def calculate_amount(self):
+        # priced from the company's rate tables; crm.pricing prices many leases at once
+        from .pricing import price_lease
+        return price_lease(self.company_id, self.car_id, self.lease_start_date, self.lease_end_date)
+
+    def move_car_unit(self, step):
+        # Moves one unit of the car between "in lease" and "available" with a
+        # single F() UPDATE instead of loading and saving the whole Car row.
+        Cars.objects.filter(pk=self.car_id).update(
+            number_of_cars_in_lease=Coalesce(F('number_of_cars_in_lease'), 0) - step,
+            total_available_number=F('total_available_number') + step,
+            is_still_in_stock=Case(
+                When(total_available_number__gt=-step, then=Value(True)),
+                default=Value(False),
+            ),
+        )
+        CompanyVersion.bump(self.company_id, 'cars')
+        if Leasing.car.is_cached(self):
+            car = self.car
+            car.number_of_cars_in_lease = (car.number_of_cars_in_lease or 0) - step
+            car.total_available_number += step
+            car.is_still_in_stock = car.is_still_in_stock_method()
+            car.snapshot_tracked_fields()
+        return {'cars_in_stock': step, 'cars_leased': -step}
+
+    def flip_returned(self):
+        # a conditional UPDATE, so of two requests flipping the flag from the
+        # same snapshot only one moves the car unit and the calendar
+        rows = Leasing.objects.filter(pk=self.pk)
+        rows = rows.filter(ACTIVE_LEASE) if self.mark_as_returned_from_lease else rows.exclude(ACTIVE_LEASE)
+        return rows.update(mark_as_returned_from_lease=self.mark_as_returned_from_lease) == 1
 
     def mark_car_as_returned(self):
         if self.mark_as_returned_from_lease:
-            self.car.number_of_cars_in_lease -= 1
-            self.car.total_available_number += 1
-            self.car.save()
+            return self.move_car_unit(1)
+        return {}
 
     def un_mark_car_as_returned(self):
         if not self.mark_as_returned_from_lease:
-            self.car.number_of_cars_in_lease += 1
-            self.car.total_available_number -= 1
-            self.car.save()
-
-    def map_leased_cars_by_customer(self):
-        self.customer.nr_of_leased_cars += 1
-        self.customer.leased_cars += f"{self.car.brand} {self.car.model} ({self.car.year})"
-        self.customer.save()
+            return self.move_car_unit(-1)
+        return {}
+
+    def update_customer_history(self, adding):
+        # counts every lease the customer made, returned ones included
+        old = None if adding else self.loaded_value('customer_id')
+        if old != self.customer_id:
+            Customer.add_history(self.customer_history_field, {self.customer_id: 1, old: -1})
+
+    def is_active(self, loaded=False):
+        returned = self.loaded_value('mark_as_returned_from_lease') if loaded else self.mark_as_returned_from_lease
+        return not returned
+
+    def occupancy_key(self, loaded=False):
+        # (car, first day, last day) this lease holds a unit for, None once returned
+        if not self.is_active(loaded=loaded):
+            return None
+        value = self.loaded_value if loaded else lambda name: getattr(self, name)
+        return value('car_id'), value('lease_start_date'), value('lease_end_date')
+
+    def update_occupancy(self, adding):
+        old = None if adding else self.occupancy_key(loaded=True)
+        new = self.occupancy_key()
+        if old != new:
+            if old:
+                CarOccupancy.add(*old, -1)
+            if new:
+                CarOccupancy.add(*new, 1)
+
+    def update_dashboard_stats(self, adding, car_deltas):
+        old_company_id = None if adding else self.loaded_value('company_id')
+        old_active = 0 if adding else int(self.is_active(loaded=True))
+        new_active = int(self.is_active())
+        if old_company_id is not None and old_company_id != self.company_id:
+            CompanyStats.apply(old_company_id, active_leases=-old_active)
+            old_active = 0
+        CompanyStats.apply(self.company_id, active_leases=new_active - old_active, **car_deltas)
+        self.snapshot_tracked_fields()
 
     def save(self, *args, **kwargs):
-        # Calculate the amount only if it's not set or needs an update
-        self.amount = self.calculate_amount()
-
-        # Check if mark_as_returned_from_lease has changed
-        if self.pk is not None:
-            orig = Leasing.objects.get(pk=self.pk)
-            if orig.mark_as_returned_from_lease != self.mark_as_returned_from_lease:
-                if self.mark_as_returned_from_lease:
-                    self.mark_car_as_returned()
+        adding = self._state.adding
+        self.ensure_snapshot()
+        # Calculate the amount only if it's not set or needs an update, so
+        # returning a lease keeps the price it was made at
+        if adding or self.amount is None or PRICED_FIELDS.intersection(self.changed_fields()):
+            self.amount = self.calculate_amount()
+
+        if not adding and kwargs.get('update_fields') is None:
+            # Only write the columns that changed since the row was loaded
+            changed = self.changed_fields()
+            if not changed:
+                return
+            kwargs['update_fields'] = changed
+
+        with db_transaction.atomic():
+            # Check if mark_as_returned_from_lease has changed since the row was loaded
+            car_deltas = {}
+            if not adding and self.loaded_value('mark_as_returned_from_lease') != self.mark_as_returned_from_lease:
+                if not self.flip_returned():
+                    # another request flipped it since this row was loaded and moved the unit
+                    self._loaded_values['mark_as_returned_from_lease'] = self.mark_as_returned_from_lease
+                elif self.mark_as_returned_from_lease:
+                    car_deltas = self.mark_car_as_returned()
                 else:
-                    self.un_mark_car_as_returned()
+                    car_deltas = self.un_mark_car_as_returned()
 
-        super().save(*args, **kwargs)
+            super().save(*args, **kwargs)
+            self.update_occupancy(adding)
+            self.update_customer_history(adding)
+            self.update_dashboard_stats(adding, car_deltas)
 
     def __str__(self):
         return f"Leasing #{self.id} - {self.customer.name} - {self.car.brand} - Amount: ${self.amount}"
 
 
 
+class CarOccupancy(models.Model):
+    """Units of a car held by active leases on each day, maintained from the lease writes."""
+    car = models.ForeignKey(Cars, on_delete=models.CASCADE, related_name='occupancy')
+    date = models.DateField()
+    leased = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # also the index range queries for one car walk
+            models.UniqueConstraint(fields=['car', 'date'], name='car_occupancy_car_date_uniq'),
+        ]
+
+    @classmethod
+    def add(cls, car_id, start, end, units):
+        """Adds `units` to each day from start to end: two statements whatever the lease length."""
+        if not units or start > end:
+            return
+        days = (end - start).days + 1
+        if units > 0:
+            cls.objects.bulk_create([cls(car_id=car_id, date=start + timedelta(days=day)) for day in range(days)],
+                                    ignore_conflicts=True, batch_size=500)
+        cls.objects.filter(car_id=car_id, date__range=(start, end)).update(leased=F('leased') + units)
+
+    def __str__(self):
+        return f"Car #{self.car_id} on {self.date}: {self.leased} leased"
+
+
+class LeaseRate(models.Model):
+    """
+    Daily lease price of a company's cars, or of one car when `car` is set,
+    for leases of at least `min_days` days. crm.pricing applies the highest
+    tier a lease reaches.
+    """
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='lease_rates')
+    car = models.ForeignKey(Cars, on_delete=models.CASCADE, null=True, blank=True, related_name='lease_rates')
+    min_days = models.PositiveIntegerField(default=1)
+    daily_rate = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'min_days'], condition=Q(car__isnull=True),
+                                    name='lease_rate_company_tier_uniq'),
+            models.UniqueConstraint(fields=['company', 'car', 'min_days'], name='lease_rate_car_tier_uniq'),
+        ]
+
+    def __str__(self):
+        return f"Rate for company #{self.company_id} car #{self.car_id}: {self.daily_rate}/day from {self.min_days} days"
 
 
+class SeasonalRate(models.Model):
+    """Multiplies the daily price of the days from start_date to end_date; overlapping seasons multiply."""
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='seasonal_rates')
+    car = models.ForeignKey(Cars, on_delete=models.CASCADE, null=True, blank=True, related_name='seasonal_rates')
+    name = models.CharField(max_length=50, blank=True, default='')
+    start_date = models.DateField()
+    end_date = models.DateField()
+    multiplier = models.DecimalField(max_digits=6, decimal_places=3)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['company', 'start_date'], name='seasonal_rate_company_idx'),
+        ]
+
+    def __str__(self):
+        return f"Season {self.name or self.id} for company #{self.company_id}: x{self.multiplier}"
 
+
+class CompanyStats(models.Model):
+    """Dashboard counters per company, kept up to date by the model saves above."""
+    company = models.OneToOneField(Company, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    cars_in_stock = models.BigIntegerField(default=0)
+    cars_leased = models.BigIntegerField(default=0)
+    units_sold = models.BigIntegerField(default=0)
+    active_leases = models.BigIntegerField(default=0)
+
+    COUNTERS = ('cars_in_stock', 'cars_leased', 'units_sold', 'active_leases')
+
+    @classmethod
+    def apply(cls, company_id, create=True, **deltas):
+        apply_counter_deltas(cls, {'company_id': company_id}, deltas, create=create)
+
+    def __str__(self):
+        return f"Stats for company #{self.company_id}"
+
+
+
+class DailyRevenue(models.Model):
+    """Transaction revenue per company and day, so the dashboard never scans Transaction."""
+    company = models.ForeignKey(Company, on_delete=models.CASCADE)
+    date = models.DateField()
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    transactions = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'date'], name='daily_revenue_company_date_uniq'),
+        ]
+
+    @classmethod
+    def apply(cls, company_id, date, create=True, **deltas):
+        apply_counter_deltas(cls, {'company_id': company_id, 'date': date}, deltas, create=create)
+
+    def __str__(self):
+        return f"Revenue {self.date} - company #{self.company_id}: ${self.revenue}"
+
+
+
+class CompanyVersion(models.Model):
+    """Per-company change counters for each list resource, used to build ETags."""
+    company = models.OneToOneField(Company, on_delete=models.CASCADE, primary_key=True, related_name='versions')
+    cars = models.BigIntegerField(default=0)
+    customers = models.BigIntegerField(default=0)
+    transactions = models.BigIntegerField(default=0)
+    leases = models.BigIntegerField(default=0)
+    details = models.BigIntegerField(default=0)  # the Company row itself
+    rates = models.BigIntegerField(default=0)  # lease rate tables; keys the price list cache, not an ETag
+
+    RESOURCES = ('cars', 'customers', 'transactions', 'leases', 'details')
+
+    @classmethod
+    def bump(cls, company_id, *resources, create=True):
+        apply_counter_deltas(cls, {'company_id': company_id}, dict.fromkeys(resources, 1), create=create)
+
+    @classmethod
+    def current(cls, company_ids, resources):
+        """Versions of `resources` per company; missing rows are created so later deletes can bump them."""
+        company_ids = sorted(company_ids)
+        rows = {row[0]: row[1:] for row in
+                cls.objects.filter(company_id__in=company_ids).values_list('company_id', *resources)}
+        missing = [company_id for company_id in company_ids if company_id not in rows]
+        if missing:
+            # made on reads too; the zero versions need no read-back from the primary
+            with unpinned_writes():
+                cls.objects.bulk_create([cls(company_id=company_id) for company_id in missing], ignore_conflicts=True)
+        return cls.version_rows(company_ids, resources, rows)
+
+    @classmethod
+    async def acurrent(cls, company_ids, resources):
+        company_ids = sorted(company_ids)
+        queryset = cls.objects.filter(company_id__in=company_ids).values_list('company_id', *resources)
+        rows = {row[0]: row[1:] async for row in queryset}
+        missing = [company_id for company_id in company_ids if company_id not in rows]
+        if missing:
+            with unpinned_writes():
+                await cls.objects.abulk_create([cls(company_id=company_id) for company_id in missing],
+                                               ignore_conflicts=True)
+        return cls.version_rows(company_ids, resources, rows)
+
+    @staticmethod
+    def version_rows(company_ids, resources, rows):
+        return [(company_id, *rows.get(company_id, (0,) * len(resources))) for company_id in company_ids]
+
+    def __str__(self):
+        return f"Versions for company #{self.company_id}"
+
+
+
+class ReceiptSequence(models.Model):
+    """Receipt numbers handed out per company; crm.receipts allocates them in blocks."""
+    company = models.OneToOneField(Company, on_delete=models.CASCADE, primary_key=True, related_name='receipts')
+    allocated = models.BigIntegerField(default=0)  # highest number handed out
+
+    @classmethod
+    def allocate(cls, company_id, count):
+        """
+        Reserves `count` consecutive numbers and returns the first. The F()
+        UPDATE holds the row lock until the surrounding transaction ends, so
+        no two transactions can get the same numbers.
+        """
+        with db_transaction.atomic():
+            apply_counter_deltas(cls, {'company_id': company_id}, {'allocated': count})
+            return cls.objects.filter(company_id=company_id).values_list('allocated', flat=True).get() - count + 1
+
+    def __str__(self):
+        return f"Receipts for company #{self.company_id}: {self.allocated}"
+
+
+class IdempotencyKey(models.Model):
+    """Outcome of a request sent with an Idempotency-Key header, replayed when the request is retried."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    endpoint = models.CharField(max_length=100)
+    fingerprint = models.CharField(max_length=64)  # sha256 of the request body
+    status_code = models.PositiveSmallIntegerField()
+    response = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'endpoint', 'key'], name='idempotency_user_endpoint_key_uniq'),
+        ]
+
+    def __str__(self):
+        return f"Idempotency key {self.key} - {self.endpoint}"
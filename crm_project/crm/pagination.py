@@ -0,0 +1,141 @@
+# crm_project/crm/pagination.py
+
+import base64
+import binascii
+import json
+
+
+DEFAULT_PAGE_SIZE = 10
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(pk, direction):
+    # Opaque token: url-safe base64 of the boundary id and the paging direction
+    raw = json.dumps({'id': pk, 'd': direction}, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        pk = int(data['id'])
+        direction = data['d']
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise ValueError("Invalid cursor.")
+
+    if direction not in ('next', 'prev'):
+        raise ValueError("Invalid cursor.")
+    return pk, direction
+
+
+def get_page_size(request):
+    page_size = int(request.GET.get('page_size', DEFAULT_PAGE_SIZE))
+    if page_size <= 0:
+        raise ValueError("page_size must be a positive integer.")
+    return min(page_size, MAX_PAGE_SIZE)
+
+
+def wants_total(request):
+    return request.GET.get('include_total', '').lower() in ('1', 'true', 'yes')
+
+
+def row_id(row):
+    # pages are model instances, or dicts from a .values() queryset
+    return row['id'] if isinstance(row, dict) else row.id
+
+
+def cursor_window(request, queryset, page_size):
+    """
+    Keyset page over `id`, newest first. Each page is a single indexed range
+    scan (`id < X` / `id > X`), so deep pages cost the same as the first one.
+    Returns the page queryset (one extra row to detect more pages), the
+    boundary id and the direction.
+    """
+    token = request.GET.get('cursor')
+    if token:
+        pk, direction = decode_cursor(token)
+    else:
+        pk, direction = None, 'next'
+
+    if direction == 'next':
+        qs = queryset.order_by('-id')
+        if pk is not None:
+            qs = qs.filter(id__lt=pk)
+    else:
+        qs = queryset.filter(id__gt=pk).order_by('id')
+    return qs[:page_size + 1], pk, direction
+
+
+def cursor_result(rows, pk, direction, page_size):
+    has_more = len(rows) > page_size
+    if direction == 'next':
+        rows = rows[:page_size]
+        has_next, has_prev = has_more, pk is not None
+    else:
+        rows = rows[:page_size][::-1]
+        has_next, has_prev = True, has_more
+
+    meta = {
+        'next': encode_cursor(row_id(rows[-1]), 'next') if rows and has_next else None,
+        'prev': encode_cursor(row_id(rows[0]), 'prev') if rows and has_prev else None,
+    }
+    return rows, meta
+
+
+def cursor_page(request, queryset, page_size):
+    window, pk, direction = cursor_window(request, queryset, page_size)
+    rows, meta = cursor_result(list(window), pk, direction, page_size)
+    if wants_total(request):
+        meta['total_count'] = queryset.count()
+    return rows, meta
+
+
+async def acursor_page(request, queryset, page_size):
+    window, pk, direction = cursor_window(request, queryset, page_size)
+    rows, meta = cursor_result([row async for row in window], pk, direction, page_size)
+    if wants_total(request):
+        meta['total_count'] = await queryset.acount()
+    return rows, meta
+
+
+def paginate(request, queryset, ordering=('-id',)):
+    """
+    Returns (rows, meta) for a list endpoint.
+
+    Passing `cursor` (or `pagination=cursor` for the first page) switches to
+    keyset mode with `next`/`prev` tokens; the exact `total_count` is then
+    only computed when `include_total=true`. Without it the classic
+    `page`/`page_size` OFFSET mode is kept for existing clients, which is
+    also the only mode that honours a custom `ordering`.
+    Raises ValueError on malformed paging parameters.
+    """
+    page_size = get_page_size(request)
+    if wants_cursor(request, ordering):
+        return cursor_page(request, queryset, page_size)
+    rows = offset_window(request, queryset, ordering, page_size)
+    return rows, {'total_count': queryset.count()}
+
+
+async def apaginate(request, queryset, ordering=('-id',)):
+    """Async variant of paginate() for the async views, using the async ORM."""
+    page_size = get_page_size(request)
+    if wants_cursor(request, ordering):
+        return await acursor_page(request, queryset, page_size)
+    window = offset_window(request, queryset, ordering, page_size)
+    return [row async for row in window], {'total_count': await queryset.acount()}
+
+
+def wants_cursor(request, ordering):
+    if 'cursor' in request.GET or request.GET.get('pagination') == 'cursor':
+        if tuple(ordering) != ('-id',):
+            raise ValueError("Cursor pagination only supports the default ordering.")
+        return True
+    return False
+
+
+def offset_window(request, queryset, ordering, page_size):
+    page = int(request.GET.get('page', 1))
+    if page <= 0:
+        raise ValueError("page must be a positive integer.")
+    return queryset.order_by(*ordering)[(page-1)*page_size:page*page_size]
@@ -0,0 +1,266 @@
+# crm_project/crm/pricing.py
+
+from bisect import bisect_right
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import date, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+
+from .companies import TTLCache
+from .models import PRICED_FIELDS, Cars, CompanyVersion, LeaseRate, Leasing, SeasonalRate
+
+
+# what a lease day costs when the company has no rate table
+DEFAULT_DAILY_RATE = Decimal('20')
+CENT = Decimal('0.01')
+MAX_QUOTE_ITEMS = 5000
+REPRICE_BATCH_SIZE = 1000
+
+# QuerySet.update() keys that move a lease's price
+PRICE_CHANGES = {name.removesuffix('_id') for name in PRICED_FIELDS} - {'amount'}
+
+
+class QuoteItemError(ValueError):
+    """Some quote items are invalid or reference unknown cars; `errors` is per item, like BatchItemError."""
+
+    def __init__(self, errors):
+        super().__init__("Invalid quote items.")
+        self.errors = errors
+
+
+class SeasonCalendar:
+    """
+    Sum of the daily multipliers of a date range under some seasons, 1 for
+    the days outside every season. The multiplier only changes at season
+    boundaries, so a range costs two binary searches over the boundaries
+    whatever its length.
+    """
+
+    def __init__(self, seasons):
+        self.bounds = sorted({day for start, end, _ in seasons for day in (start, end + timedelta(days=1))})
+        self.multipliers = []
+        self.totals = []  # weight of the days from bounds[0] up to bounds[i]
+        total = Decimal(0)
+        for i, day in enumerate(self.bounds):
+            multiplier = Decimal(1)
+            for start, end, factor in seasons:
+                if start <= day <= end:
+                    multiplier *= factor
+            self.multipliers.append(multiplier)
+            self.totals.append(total)
+            if i + 1 < len(self.bounds):
+                total += multiplier * (self.bounds[i + 1] - day).days
+
+    def weight_before(self, day):
+        i = bisect_right(self.bounds, day) - 1
+        if i < 0:
+            return Decimal((day - self.bounds[0]).days)
+        return self.totals[i] + self.multipliers[i] * (day - self.bounds[i]).days
+
+    def weight(self, start, end):
+        return self.weight_before(end + timedelta(days=1)) - self.weight_before(start)
+
+
+class CompanyPrices:
+    """
+    A company's rate tiers and seasons, indexed for pricing. A car's own
+    tiers win over the company's, which win over DEFAULT_DAILY_RATE; a car's
+    own seasons apply on top of the company's.
+    """
+
+    def __init__(self, rates, seasons):
+        tiers = defaultdict(list)
+        for car_id, min_days, daily_rate in sorted(rates, key=lambda rate: rate[1]):
+            tiers[car_id].append((min_days, daily_rate))
+        self.tiers = {car_id: ([row[0] for row in rows], [row[1] for row in rows]) for car_id, rows in tiers.items()}
+
+        shared = [season[1:] for season in seasons if season[0] is None]
+        own = defaultdict(list)
+        for car_id, *season in seasons:
+            if car_id is not None:
+                own[car_id].append(season)
+        self.calendars = {None: SeasonCalendar(shared) if shared else None}
+        for car_id, car_seasons in own.items():
+            self.calendars[car_id] = SeasonCalendar(shared + car_seasons)
+
+    def daily_rate(self, car_id, days):
+        for key in (car_id, None):
+            tiers = self.tiers.get(key)
+            if tiers:
+                i = bisect_right(tiers[0], days)
+                if i:
+                    return tiers[1][i - 1]
+        return DEFAULT_DAILY_RATE
+
+    def price(self, car_id, start, end):
+        days = (end - start).days + 1
+        calendar = self.calendars.get(car_id, self.calendars[None])
+        weight = calendar.weight(start, end) if calendar else days
+        return (self.daily_rate(car_id, days) * weight).quantize(CENT, ROUND_HALF_UP)
+
+
+price_list_cache = TTLCache(
+    maxsize=getattr(settings, 'PRICE_LIST_CACHE_SIZE', 1024),
+    ttl=getattr(settings, 'PRICE_LIST_CACHE_TTL', 60),
+)
+
+
+def load_prices(company_ids):
+    """
+    CompanyPrices per company id, cached per process under the company's
+    rates version, so a rate change committed by any process retires the
+    cached tables everywhere; the missing companies are read with two queries.
+    """
+    company_ids = set(company_ids)
+    versions = dict(CompanyVersion.objects.filter(company_id__in=company_ids).values_list('company_id', 'rates'))
+    prices, missing = {}, []
+    for company_id in company_ids:
+        cached = price_list_cache.get((company_id, versions.get(company_id, 0)))
+        if cached is None:
+            missing.append(company_id)
+        else:
+            prices[company_id] = cached
+    if missing:
+        rates, seasons = defaultdict(list), defaultdict(list)
+        for company_id, *rate in (LeaseRate.objects.filter(company_id__in=missing)
+                                  .values_list('company_id', 'car_id', 'min_days', 'daily_rate')):
+            rates[company_id].append(rate)
+        for company_id, *season in (SeasonalRate.objects.filter(company_id__in=missing)
+                                    .values_list('company_id', 'car_id', 'start_date', 'end_date', 'multiplier')):
+            seasons[company_id].append(season)
+        for company_id in missing:
+            prices[company_id] = CompanyPrices(rates[company_id], seasons[company_id])
+            price_list_cache.set((company_id, versions.get(company_id, 0)), prices[company_id])
+    return prices
+
+
+def forget_prices(company_id, create=True):
+    # a new rates version; visible to this transaction now and to the others on commit
+    CompanyVersion.bump(company_id, 'rates', create=create)
+
+
+def invalidate_prices(sender, instance, **kwargs):
+    forget_prices(instance.company_id)
+
+
+def invalidate_prices_on_delete(sender, instance, **kwargs):
+    # create=False: the company itself may be going away in the same cascade
+    forget_prices(instance.company_id, create=False)
+
+
+def price_leases(leases):
+    """Amounts of (company id, car id, first day, last day) tuples, in order, reading the rate tables once."""
+    leases = list(leases)
+    prices = load_prices({lease[0] for lease in leases})
+    return [prices[company_id].price(car_id, start, end) for company_id, car_id, start, end in leases]
+
+
+def price_lease(company_id, car_id, start, end):
+    return price_leases([(company_id, car_id, start, end)])[0]
+
+
+def replace_rate_table(company_id, rates, seasons):
+    """Swaps a company's rate tiers and seasons for validated `rates` and `seasons` in one transaction."""
+    with db_transaction.atomic():
+        LeaseRate.objects.filter(company_id=company_id).delete()
+        SeasonalRate.objects.filter(company_id=company_id).delete()
+        LeaseRate.objects.bulk_create([LeaseRate(company_id=company_id, **rate) for rate in rates])
+        SeasonalRate.objects.bulk_create([SeasonalRate(company_id=company_id, **season) for season in seasons])
+        forget_prices(company_id)
+
+
+def reprice(leases, batch_size=REPRICE_BATCH_SIZE):
+    """
+    Recomputes the amount of every lease of the `leases` queryset, in id
+    order and `batch_size` rows per transaction, and writes the ones that
+    changed with one UPDATE per distinct new amount. A batch only holds a few
+    distinct amounts, and bulk_update() costs more per row to build its
+    CASE than these statements take. Returns (leases read, leases repriced).
+    """
+    read = repriced = 0
+    last_id = 0
+    while True:
+        with db_transaction.atomic():
+            rows = list(leases.filter(id__gt=last_id).order_by('id').select_for_update()
+                        .values_list('id', 'company_id', 'car_id', 'lease_start_date', 'lease_end_date', 'amount')
+                        [:batch_size])
+            if not rows:
+                return read, repriced
+            amounts = price_leases(row[1:5] for row in rows)
+            changed = defaultdict(list)
+            for row, amount in zip(rows, amounts):
+                if row[5] != amount:
+                    changed[amount].append(row)
+            for amount, changed_rows in changed.items():
+                Leasing.objects.filter(id__in=[row[0] for row in changed_rows]).update(amount=amount)
+            # update() sends no post_save
+            for company_id in {row[1] for changed_rows in changed.values() for row in changed_rows}:
+                CompanyVersion.bump(company_id, 'leases')
+        read += len(rows)
+        repriced += sum(map(len, changed.values()))
+        last_id = rows[-1][0]
+
+
+@contextmanager
+def track_prices(model, ids, changes):
+    """
+    Wraps a QuerySet.update() over leases `ids`, which skips Leasing.save():
+    leases whose car or dates changed are repriced after it. Must run inside
+    the same transaction as the update.
+    """
+    yield
+    if model is Leasing and PRICE_CHANGES & set(changes):
+        reprice(Leasing.objects.filter(id__in=ids))
+
+
+def parse_quote_item(item):
+    if not isinstance(item, dict):
+        return None, {'non_field_errors': ["Expected an object."]}
+    errors = {}
+    car = item.get('car')
+    if isinstance(car, bool) or not isinstance(car, int):
+        errors['car'] = ["A valid integer is required."]
+    dates = []
+    for name in ('lease_start_date', 'lease_end_date'):
+        try:
+            dates.append(date.fromisoformat(item.get(name)))
+        except (TypeError, ValueError):
+            errors[name] = ["Date has wrong format. Use one of these formats instead: YYYY-MM-DD."]
+    if not errors and dates[1] < dates[0]:
+        errors['non_field_errors'] = ["lease_end_date must not be before lease_start_date."]
+    return (None if errors else (car, *dates)), errors
+
+
+def quote_leases(data, company_ids):
+    """
+    Prices the candidate leases of data['leases'] ({'car', 'lease_start_date',
+    'lease_end_date'}) on the caller's cars. Items are checked by hand rather
+    than through a serializer each, which would cost more than pricing them;
+    the cars are looked up with one query.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Expected a JSON object.")
+    items = data.get('leases')
+    if not isinstance(items, list) or not items:
+        raise ValueError("'leases' must be a non-empty list.")
+    if len(items) > MAX_QUOTE_ITEMS:
+        raise ValueError(f"At most {MAX_QUOTE_ITEMS} leases can be quoted per request.")
+
+    parsed, errors = zip(*map(parse_quote_item, items))
+    car_ids = {item[0] for item in parsed if item}
+    cars = dict(Cars.objects.for_companies(company_ids).filter(id__in=car_ids).values_list('id', 'company_id'))
+    for item, item_errors in zip(parsed, errors):
+        if item and item[0] not in cars:
+            item_errors['car'] = ["Car not found."]
+    if any(errors):
+        raise QuoteItemError(list(errors))
+
+    amounts = price_leases((cars[car_id], car_id, start, end) for car_id, start, end in parsed)
+    return [
+        {'car': car_id, 'lease_start_date': start, 'lease_end_date': end, 'days': (end - start).days + 1,
+         'amount': str(amount)}
+        for (car_id, start, end), amount in zip(parsed, amounts)
+    ]
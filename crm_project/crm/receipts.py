@@ -0,0 +1,71 @@
+# crm_project/crm/receipts.py
+
+import re
+import threading
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+
+from .models import ReceiptSequence
+
+
+# Company id plus a zero-padded per-company number: unique by construction
+# and increasing with issue order within a company (strictly so with
+# RECEIPT_BLOCK_SIZE = 1, per process otherwise), so new rows land at the end
+# of the company's range of the receipt index instead of at random positions.
+RECEIPT_FORMAT = 'R-{company_id}-{number:010d}'
+RECEIPT_PATTERN = re.compile(r'^R-\d+-\d{10,}$')
+LEGACY_RECEIPT_PREFIX = 'R-Nr-'  # random 6-digit receipts written before the sequences
+
+
+def format_receipt(company_id, number):
+    return RECEIPT_FORMAT.format(company_id=company_id, number=number)
+
+
+class ReceiptBlocks:
+    """
+    Per-process cache of reserved receipt numbers, so most receipts need no
+    write to the ReceiptSequence row. Numbers reserved inside a transaction
+    are only cached once it commits; after a rollback the same numbers are
+    handed out again by the sequence. Unused numbers are skipped, which
+    leaves gaps but never duplicates.
+    """
+
+    def __init__(self):
+        self._blocks = {}  # company id -> (next number, end)
+        self._lock = threading.Lock()
+
+    @property
+    def block_size(self):
+        return getattr(settings, 'RECEIPT_BLOCK_SIZE', 50)
+
+    def take(self, company_id, count):
+        """`count` increasing receipt numbers for the company."""
+        with self._lock:
+            start, end = self._blocks.pop(company_id, (0, 0))
+            if end - start >= count:
+                if end - start > count:
+                    self._blocks[company_id] = (start + count, end)
+                return range(start, start + count)
+
+        size = max(count, self.block_size)
+        first = ReceiptSequence.allocate(company_id, size)
+        if size > count:
+            spare = (first + count, first + size)
+            db_transaction.on_commit(lambda: self.keep(company_id, spare))
+        return range(first, first + count)
+
+    def keep(self, company_id, block):
+        with self._lock:
+            self._blocks[company_id] = block
+
+    def clear(self):
+        with self._lock:
+            self._blocks.clear()
+
+
+receipt_blocks = ReceiptBlocks()
+
+
+def next_receipts(company_id, count):
+    return [format_receipt(company_id, number) for number in receipt_blocks.take(company_id, count)]
@@ -0,0 +1,53 @@
+# crm_project/crm/renderers.py
+
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+
+from .metrics import recording
+
+try:
+    import orjson
+except ImportError:  # optional speed-up; the stock renderer is used without it
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that encodes with orjson when it is installed and the output
+    would be the compact, non-ASCII-escaped form. Dates, decimals and other
+    non-native types still go through DRF's encoder, so the bytes match the
+    stock renderer. Indented output (browsable API, `; indent=` media types)
+    and anything orjson refuses fall back to the stock path.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with recording('render'):
+            return self.encode(data, accepted_media_type, renderer_context)
+
+    def encode(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(
+                data,
+                default=self.encoder_class().default,
+                # let DRF's encoder format these so the output stays identical
+                option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_NON_STR_KEYS,
+            )
+        except (orjson.JSONEncodeError, TypeError):
+            return super().render(data, accepted_media_type, renderer_context)
+        # same strict-javascript escaping as the stock renderer
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+def json_response(data, status=200):
+    """
+    JSON HttpResponse for views that run outside DRF (the async views).
+    Rendered like a DRF Response; the unrendered `data` is kept for caching.
+    """
+    response = HttpResponse(FastJSONRenderer().render(data), content_type='application/json', status=status)
+    response.data = data
+    return response
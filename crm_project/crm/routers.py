@@ -0,0 +1,121 @@
+# crm_project/crm/routers.py
+
+import hashlib
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+
+from .cache import CACHE_ERRORS
+
+
+READ_ONLY_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# RequestRouting of the request being handled; None outside requests
+current_routing = ContextVar('crm_current_routing', default=None)
+
+
+def pin_cache():
+    return caches[getattr(settings, 'REPLICA_PIN_CACHE', 'default')]
+
+
+@contextmanager
+def unpinned_writes():
+    """
+    Writes in the block neither move the request's later reads to the
+    primary nor pin the client: for bookkeeping rows a replica may lack
+    without harm, like the CompanyVersion rows a GET creates.
+    """
+    routing = current_routing.get()
+    wrote = routing is not None and routing.wrote
+    try:
+        yield
+    finally:
+        if routing is not None:
+            routing.wrote = wrote
+
+
+def client_key(request):
+    """
+    Who gets pinned after a write: the bearer token or, for browser
+    sessions, the session cookie. Hashed so no credential ends up in the cache.
+    """
+    credential = request.META.get('HTTP_AUTHORIZATION') or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if not credential:
+        return None
+    return 'replica-pin:' + hashlib.sha1(credential.encode()).hexdigest()
+
+
+class RequestRouting:
+    """Per-request routing state, installed by crm.middleware.ReplicaRoutingMiddleware."""
+
+    def __init__(self, request):
+        self.method = request.method
+        self.client_key = client_key(request)
+        self.wrote = False
+        self._pinned = None
+
+    def pinned(self):
+        # looked up on the first routed read only
+        if self._pinned is None:
+            try:
+                self._pinned = self.client_key is not None and pin_cache().get(self.client_key) is not None
+            except CACHE_ERRORS:
+                self._pinned = True  # unknown, so read from the primary
+        return self._pinned
+
+    def reads_from_replica(self):
+        return self.method in READ_ONLY_METHODS and not self.wrote and not self.pinned()
+
+    def pin(self):
+        try:
+            pin_cache().set(self.client_key, 1, getattr(settings, 'REPLICA_PIN_SECONDS', 10))
+        except CACHE_ERRORS:
+            pass  # the write itself succeeded; only read-your-writes is lost
+
+    async def apin(self):
+        try:
+            await pin_cache().aset(self.client_key, 1, getattr(settings, 'REPLICA_PIN_SECONDS', 10))
+        except CACHE_ERRORS:
+            pass
+
+
+class PrimaryReplicaRouter:
+    """
+    Writes go to 'default'; reads of GET/HEAD/OPTIONS requests go to a random
+    alias from settings.DATABASE_REPLICAS.
+
+    Everything else reads from the primary: requests that change data, reads
+    after the request's first write, clients that wrote within the last
+    REPLICA_PIN_SECONDS (read-your-writes across requests) and code running
+    outside a request, e.g. management commands.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas:
+            return DEFAULT_DB_ALIAS
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            # related objects come from where the instance came from
+            return instance._state.db
+        routing = current_routing.get()
+        if routing is None or not routing.reads_from_replica():
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        routing = current_routing.get()
+        if routing is not None:
+            routing.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
@@ -0,0 +1,124 @@
+# crm_project/crm/search.py
+
+import re
+
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Cars, Customer
+
+
+# Text columns covered by the `search` parameter, per model
+SEARCH_FIELDS = {
+    Cars: ('brand', 'model', 'more_info'),
+    Customer: ('name', 'email'),
+}
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def fts_table(model):
+    return f'{model._meta.db_table}_fts'
+
+
+def pg_document(model):
+    # Must match the indexed expression exactly for Postgres to use the GIN index
+    columns = " || ' ' || ".join(f'coalesce("{field}", \'\')' for field in SEARCH_FIELDS[model])
+    return f"to_tsvector('simple', {columns})"
+
+
+def sqlite_rows(model):
+    # (delete, insert) statements of the FTS row for the trigger's old/new row
+    fts, fields = fts_table(model), SEARCH_FIELDS[model]
+    columns = ', '.join(fields)
+    new_values = ', '.join(f'new.{field}' for field in fields)
+    old_values = ', '.join(f'old.{field}' for field in fields)
+    return (f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old_values});",
+            f"INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_values});")
+
+
+def sqlite_update_trigger(model):
+    # only updates of the indexed columns touch the index, not stock or lease counters
+    table, fts = model._meta.db_table, fts_table(model)
+    delete_row, insert_row = sqlite_rows(model)
+    return [
+        f"DROP TRIGGER IF EXISTS {fts}_au",
+        f"CREATE TRIGGER {fts}_au AFTER UPDATE OF {', '.join(SEARCH_FIELDS[model])} ON {table} "
+        f"BEGIN {delete_row} {insert_row} END",
+    ]
+
+
+def sqlite_statements(model):
+    table, fts = model._meta.db_table, fts_table(model)
+    columns = ', '.join(SEARCH_FIELDS[model])
+    delete_row, insert_row = sqlite_rows(model)
+    return [
+        # external-content FTS5 index kept in sync by triggers
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({columns}, content='{table}', content_rowid='id')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN {insert_row} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN {delete_row} END",
+        *sqlite_update_trigger(model),
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+
+def postgres_statements(model):
+    table = model._meta.db_table
+    return [
+        f'CREATE INDEX IF NOT EXISTS {table}_search_idx ON "{table}" USING gin (({pg_document(model)}))',
+    ]
+
+
+def setup_search(using='default'):
+    """Creates the full-text index structures for the current database backend."""
+    connection = connections[using]
+    if connection.vendor == 'sqlite':
+        build = sqlite_statements
+    elif connection.vendor == 'postgresql':
+        build = postgres_statements
+    else:
+        return
+    with connection.cursor() as cursor:
+        existing = connection.introspection.table_names(cursor)
+        for model in SEARCH_FIELDS:
+            if model._meta.db_table not in existing:
+                continue
+            statements = build(model)
+            if connection.vendor == 'sqlite' and fts_table(model) in existing:
+                # already set up and kept current by triggers; only replace an
+                # update trigger made before it was limited to the indexed columns
+                statements = sqlite_update_trigger(model)
+            for statement in statements:
+                cursor.execute(statement)
+
+
+def setup_search_after_migrate(sender, using='default', **kwargs):
+    setup_search(using)
+
+
+def search_queryset(queryset, term):
+    """Narrows `queryset` to rows whose text columns match every word of `term` (prefix match)."""
+    model = queryset.model
+    tokens = TOKEN_RE.findall(term)
+    if not tokens:
+        return queryset
+
+    vendor = connections[queryset.db].vendor
+    if vendor == 'sqlite':
+        match = ' '.join('"{}"*'.format(token.replace('"', '""')) for token in tokens)
+        fts = fts_table(model)
+        return queryset.filter(id__in=RawSQL(f'SELECT rowid FROM {fts} WHERE {fts} MATCH %s', [match]))
+    if vendor == 'postgresql':
+        query = ' & '.join(f'{token}:*' for token in tokens)
+        table = model._meta.db_table
+        return queryset.filter(id__in=RawSQL(
+            f'SELECT id FROM "{table}" WHERE {pg_document(model)} @@ to_tsquery(\'simple\', %s)', [query]))
+
+    # other backends: unindexed fallback
+    for token in tokens:
+        condition = Q()
+        for field in SEARCH_FIELDS[model]:
+            condition |= Q(**{f'{field}__icontains': token})
+        queryset = queryset.filter(condition)
+    return queryset
@@ -1,43 +1,93 @@
 # #crm_project\crm\serializers.py
 
+from decimal import Decimal
+
 from rest_framework import serializers
-from .models import Transaction, Customer, Cars,Leasing,Company
+from .metrics import recording
+from .models import Transaction, Customer, Cars,Leasing,Company,LeaseRate,SeasonalRate
+
+
+class CompanyScopedMixin:
+    """
+    Looks the car and customer references up in context['company_ids'] only,
+    so a write cannot point at another tenant's rows.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        company_ids = self.context.get('company_ids')
+        if company_ids is not None:
+            for name, model in (('car', Cars), ('customer', Customer)):
+                if name in fields and not fields[name].read_only:
+                    fields[name].queryset = model.objects.for_companies(company_ids)
+        return fields
+
+
+class TimedDataMixin:
+    """Counts building `.data` as the serialize time of sampled requests (crm.metrics)."""
+
+    @property
+    def data(self):
+        with recording('serialize'):
+            return super().data
+
 
+class TimedListSerializer(TimedDataMixin, serializers.ListSerializer):
+    # Meta.list_serializer_class of the serializers returned with many=True
+    pass
 
-class CompanySerializer(serializers.ModelSerializer):
+
+class CompanySerializer(TimedDataMixin, serializers.ModelSerializer):
     owner_username = serializers.SerializerMethodField()
 
     class Meta:
         model = Company
         fields = ['name', 'address', 'owner_username']
+        list_serializer_class = TimedListSerializer
 
     def get_owner_username(self, obj):
         return obj.owner.username if obj.owner else None
 
 
-class CustomerSerializer(serializers.ModelSerializer):
+class CustomerSerializer(TimedDataMixin, serializers.ModelSerializer):
     class Meta:
         model = Customer
         fields = ['id','name', 'email', 'phone_number', 'address','company']
+        # set by the view from the caller's companies, never from the payload
+        read_only_fields = ['company']
+
 
 
+class CustomerCreateSerializer(CustomerSerializer):
+    # company comes from the caller
+    class Meta(CustomerSerializer.Meta):
+        read_only_fields = ['company']
 
-class CarSerializer(serializers.ModelSerializer):
+
+class CarSerializer(TimedDataMixin, serializers.ModelSerializer):
     class Meta:
         model = Cars
         fields = ['id', 'brand', 'model', 'year', 'color', 'engine', 
                   'more_info', 'total_available_number', 'number_of_cars_in_lease',
                   'is_still_in_stock', 'company']
+        read_only_fields = ['company']
+
 
+class CarImportSerializer(CarSerializer):
+    # company comes from the caller and stock status is computed during import
+    class Meta(CarSerializer.Meta):
+        read_only_fields = ['company', 'is_still_in_stock']
 
-class TransactionCreateSerializer(serializers.ModelSerializer):
+
+class TransactionCreateSerializer(CompanyScopedMixin, TimedDataMixin, serializers.ModelSerializer):
     class Meta:
         model = Transaction
         fields = ['customer', 'car', 'amount', 'date','company']
+        read_only_fields = ['company']
 
 
 
-class TransactionReadSerializer(serializers.ModelSerializer):
+class TransactionReadSerializer(TimedDataMixin, serializers.ModelSerializer):
     customer = CustomerSerializer()
     car = CarSerializer()
 
@@ -47,14 +97,15 @@ class TransactionReadSerializer(serializers.ModelSerializer):
 
 
 
-class LeasingCreateSerializer(serializers.ModelSerializer):
+class LeasingCreateSerializer(CompanyScopedMixin, TimedDataMixin, serializers.ModelSerializer):
     class Meta:
         model = Leasing
         fields = ['customer', 'car', 'lease_start_date','lease_end_date','company']
+        read_only_fields = ['company']
 
 
 
-class LeasingReadSerializer(serializers.ModelSerializer):
+class LeasingReadSerializer(TimedDataMixin, serializers.ModelSerializer):
     customer = CustomerSerializer()
     car = CarSerializer()
 
@@ -62,3 +113,117 @@ class LeasingReadSerializer(serializers.ModelSerializer):
         model = Leasing
         fields = '__all__'
 
+
+
+class SaleItemSerializer(serializers.Serializer):
+    # ids are checked against the caller's companies in one query per batch
+    customer = serializers.IntegerField()
+    car = serializers.IntegerField()
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    date = serializers.DateField()
+
+
+class LeaseItemSerializer(serializers.Serializer):
+    customer = serializers.IntegerField()
+    car = serializers.IntegerField()
+    lease_start_date = serializers.DateField()
+    lease_end_date = serializers.DateField()
+
+    def validate(self, data):
+        if data['lease_end_date'] < data['lease_start_date']:
+            raise serializers.ValidationError("lease_end_date must not be before lease_start_date.")
+        return data
+
+
+class TransactionBatchResultSerializer(TimedDataMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Transaction
+        fields = ['id', 'receipt', 'customer', 'car', 'amount', 'date', 'company']
+        list_serializer_class = TimedListSerializer
+
+
+class LeasingBatchResultSerializer(TimedDataMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Leasing
+        fields = ['id', 'customer', 'car', 'lease_start_date', 'lease_end_date', 'amount', 'company']
+        list_serializer_class = TimedListSerializer
+
+
+
+class LeaseRateSerializer(TimedDataMixin, serializers.ModelSerializer):
+    # no car: the company-wide tier
+    car = serializers.IntegerField(source='car_id', required=False, allow_null=True, default=None)
+
+    class Meta:
+        model = LeaseRate
+        fields = ['company', 'car', 'min_days', 'daily_rate']
+        read_only_fields = ['company']
+        list_serializer_class = TimedListSerializer
+        extra_kwargs = {'min_days': {'min_value': 1}, 'daily_rate': {'min_value': Decimal(0)}}
+
+
+class SeasonalRateSerializer(TimedDataMixin, serializers.ModelSerializer):
+    car = serializers.IntegerField(source='car_id', required=False, allow_null=True, default=None)
+
+    class Meta:
+        model = SeasonalRate
+        fields = ['company', 'car', 'name', 'start_date', 'end_date', 'multiplier']
+        read_only_fields = ['company']
+        list_serializer_class = TimedListSerializer
+        extra_kwargs = {'multiplier': {'min_value': Decimal(0)}}
+
+    def validate(self, data):
+        if data['end_date'] < data['start_date']:
+            raise serializers.ValidationError("end_date must not be before start_date.")
+        return data
+
+
+class RateTableSerializer(serializers.Serializer):
+    # replaces the whole table of one company
+    company = serializers.IntegerField()
+    rates = LeaseRateSerializer(many=True)
+    seasons = SeasonalRateSerializer(many=True, required=False, default=list)
+
+    def validate_rates(self, rates):
+        tiers = [(rate['car_id'], rate['min_days']) for rate in rates]
+        if len(set(tiers)) != len(tiers):
+            raise serializers.ValidationError("Each car and min_days pair may appear only once.")
+        return rates
+
+
+class RevenuePeriodSerializer(serializers.Serializer):
+    period = serializers.DateField()
+    revenue = serializers.DecimalField(max_digits=16, decimal_places=2)
+    transactions = serializers.IntegerField()
+
+
+class DashboardStatsSerializer(TimedDataMixin, serializers.Serializer):
+    cars_in_stock = serializers.IntegerField()
+    cars_leased = serializers.IntegerField()
+    units_sold = serializers.IntegerField()
+    active_leases = serializers.IntegerField()
+    revenue_total = serializers.DecimalField(max_digits=16, decimal_places=2)
+    revenue = RevenuePeriodSerializer(many=True)
+
+
+
+class CarSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Cars
+        fields = ['id', 'brand', 'model', 'year']
+
+
+class CustomerPurchaseSerializer(serializers.ModelSerializer):
+    car = CarSummarySerializer()
+
+    class Meta:
+        model = Transaction
+        fields = ['id', 'date', 'amount', 'receipt', 'car']
+
+
+class CustomerLeaseSerializer(serializers.ModelSerializer):
+    car = CarSummarySerializer()
+
+    class Meta:
+        model = Leasing
+        fields = ['id', 'lease_start_date', 'lease_end_date', 'amount', 'mark_as_returned_from_lease', 'car']
@@ -0,0 +1,89 @@
+# crm_project/crm/signals.py
+
+from django.db.models.signals import post_delete, post_save
+
+from .cache import clear_response_cache
+from .companies import invalidate_company_ids
+from .models import (CarOccupancy, Cars, Company, CompanyStats, CompanyVersion, Customer, DailyRevenue, LeaseRate,
+                     Leasing, SeasonalRate, Transaction)
+from .pricing import invalidate_prices, invalidate_prices_on_delete
+
+
+post_save.connect(invalidate_company_ids, sender=Company, dispatch_uid='company_ids_on_save')
+post_delete.connect(invalidate_company_ids, sender=Company, dispatch_uid='company_ids_on_delete')
+
+
+def remove_car_from_stats(sender, instance, **kwargs):
+    counters = instance.stats_counters(loaded=True)
+    company_id = instance.loaded_value('company_id', instance.company_id)
+    CompanyStats.apply(company_id, create=False, **{name: -value for name, value in counters.items()})
+
+
+def remove_transaction_from_stats(sender, instance, **kwargs):
+    amount = instance.loaded_value('amount')
+    if amount is not None:
+        DailyRevenue.apply(instance.loaded_value('company_id'), instance.loaded_value('date'),
+                           create=False, revenue=-amount, transactions=-1)
+
+
+def remove_lease_from_stats(sender, instance, **kwargs):
+    company_id = instance.loaded_value('company_id', instance.company_id)
+    CompanyStats.apply(company_id, create=False, active_leases=-int(instance.is_active(loaded=True)))
+
+
+post_delete.connect(remove_car_from_stats, sender=Cars, dispatch_uid='stats_car_delete')
+post_delete.connect(remove_transaction_from_stats, sender=Transaction, dispatch_uid='stats_transaction_delete')
+post_delete.connect(remove_lease_from_stats, sender=Leasing, dispatch_uid='stats_lease_delete')
+
+
+def release_lease_occupancy(sender, instance, **kwargs):
+    key = instance.occupancy_key(loaded=True)
+    if key:
+        CarOccupancy.add(*key, -1)
+
+
+post_delete.connect(release_lease_occupancy, sender=Leasing, dispatch_uid='occupancy_lease_delete')
+
+
+def remove_from_customer_history(sender, instance, **kwargs):
+    customer_id = instance.loaded_value('customer_id', instance.customer_id)
+    Customer.add_history(sender.customer_history_field, {customer_id: -1})
+
+
+for model in (Transaction, Leasing):
+    post_delete.connect(remove_from_customer_history, sender=model,
+                        dispatch_uid=f'customer_history_{model.__name__}_delete')
+
+
+for model in (LeaseRate, SeasonalRate):
+    post_save.connect(invalidate_prices, sender=model, dispatch_uid=f'prices_{model.__name__}_save')
+    post_delete.connect(invalidate_prices_on_delete, sender=model, dispatch_uid=f'prices_{model.__name__}_delete')
+
+
+VERSIONED_MODELS = (Cars, Customer, Transaction, Leasing)
+
+
+def bump_version_on_save(sender, instance, **kwargs):
+    CompanyVersion.bump(instance.company_id, sender.version_resource)
+    # a row moved to another company also leaves the old company's list
+    old_company_id = instance.loaded_value('company_id') if hasattr(instance, 'loaded_value') else None
+    if old_company_id is not None and old_company_id != instance.company_id:
+        CompanyVersion.bump(old_company_id, sender.version_resource, create=False)
+
+
+def bump_version_on_delete(sender, instance, **kwargs):
+    # create=False: the company itself may be going away in the same cascade
+    CompanyVersion.bump(instance.company_id, sender.version_resource, create=False)
+
+
+for model in VERSIONED_MODELS:
+    post_save.connect(bump_version_on_save, sender=model, dispatch_uid=f'version_{model.version_resource}_save')
+    post_delete.connect(bump_version_on_delete, sender=model, dispatch_uid=f'version_{model.version_resource}_delete')
+
+
+def bump_company_version(sender, instance, **kwargs):
+    CompanyVersion.bump(instance.pk, 'details')
+
+
+post_save.connect(bump_company_version, sender=Company, dispatch_uid='version_company_save')
+post_delete.connect(clear_response_cache, sender=Company, dispatch_uid='response_cache_company_delete')
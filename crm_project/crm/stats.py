@@ -0,0 +1,126 @@
+# crm_project/crm/stats.py
+
+from contextlib import contextmanager
+
+from django.db import transaction as db_transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Coalesce, TruncMonth
+
+from .models import ACTIVE_LEASE, Cars, CompanyStats, DailyRevenue, Leasing, Transaction
+
+
+# Fields whose changes move the dashboard numbers, per model
+STATS_FIELDS = {
+    Cars: {'company', 'total_available_number', 'number_of_cars_in_lease', 'sold_cars'},
+    Leasing: {'company', 'mark_as_returned_from_lease'},
+    Transaction: {'company', 'date', 'amount'},
+}
+
+
+def company_totals(queryset):
+    """CompanyStats counters contributed by a Cars or Leasing queryset, keyed by company id."""
+    if queryset.model is Cars:
+        rows = queryset.order_by().values('company_id').annotate(
+            cars_in_stock=Coalesce(Sum('total_available_number'), 0),
+            cars_leased=Coalesce(Sum('number_of_cars_in_lease'), 0),
+            units_sold=Coalesce(Sum('sold_cars'), 0),
+        )
+    else:
+        rows = queryset.order_by().values('company_id').annotate(active_leases=Count('id', filter=ACTIVE_LEASE))
+    return {row.pop('company_id'): row for row in rows}
+
+
+def daily_totals(queryset):
+    """DailyRevenue counters contributed by a Transaction queryset, keyed by (company id, date)."""
+    rows = queryset.order_by().values('company_id', 'date').annotate(
+        revenue=Sum('amount'), transactions=Count('id'))
+    return {(row.pop('company_id'), row.pop('date')): row for row in rows}
+
+
+def totals_for(queryset):
+    if queryset.model is Transaction:
+        return daily_totals(queryset)
+    return company_totals(queryset)
+
+
+def apply_difference(model, before, after):
+    for key in before.keys() | after.keys():
+        old, new = before.get(key, {}), after.get(key, {})
+        deltas = {name: new.get(name, 0) - old.get(name, 0) for name in old.keys() | new.keys()}
+        if model is Transaction:
+            DailyRevenue.apply(*key, **deltas)
+        else:
+            CompanyStats.apply(key, **deltas)
+
+
+@contextmanager
+def track_bulk_change(model, ids, changes):
+    """
+    Wraps a QuerySet.update() over `ids`. update() skips save(), so the
+    dashboard contribution of those rows is aggregated before and after the
+    update and the difference is applied. Must run inside the same
+    transaction as the update.
+    """
+    if not STATS_FIELDS.get(model, set()) & set(changes):
+        yield
+        return
+    rows = model.objects.filter(id__in=ids)
+    before = totals_for(rows)
+    yield
+    after = totals_for(rows)
+    apply_difference(model, before, after)
+
+
+def rebuild(company_ids=None):
+    """Recomputes the summary tables from Cars, Leasing and Transaction."""
+    querysets = {
+        'stats': CompanyStats.objects.all(),
+        'revenue': DailyRevenue.objects.all(),
+        'cars': Cars.objects.all(),
+        'leases': Leasing.objects.all(),
+        'transactions': Transaction.objects.all(),
+    }
+    if company_ids is not None:
+        querysets = {name: qs.filter(company_id__in=company_ids) for name, qs in querysets.items()}
+
+    with db_transaction.atomic():
+        querysets['stats'].delete()
+        querysets['revenue'].delete()
+
+        counters = company_totals(querysets['cars'])
+        for company_id, row in company_totals(querysets['leases']).items():
+            counters.setdefault(company_id, {}).update(row)
+        CompanyStats.objects.bulk_create(
+            [CompanyStats(company_id=company_id, **row) for company_id, row in counters.items()])
+
+        DailyRevenue.objects.bulk_create([
+            DailyRevenue(company_id=company_id, date=day, **row)
+            for (company_id, day), row in daily_totals(querysets['transactions']).items()
+        ], batch_size=1000)
+
+    return len(counters)
+
+
+def dashboard(company_ids, group_by='day', date_from=None, date_to=None):
+    """Dashboard numbers for `company_ids`, read only from the summary tables."""
+    company_ids = list(company_ids)
+    counters = CompanyStats.objects.filter(company_id__in=company_ids).aggregate(
+        **{name: Coalesce(Sum(name), 0) for name in CompanyStats.COUNTERS})
+
+    revenue = DailyRevenue.objects.filter(company_id__in=company_ids, transactions__gt=0)
+    if date_from:
+        revenue = revenue.filter(date__gte=date_from)
+    if date_to:
+        revenue = revenue.filter(date__lte=date_to)
+
+    period = TruncMonth('date') if group_by == 'month' else F('date')
+    series = list(
+        revenue.annotate(period=period).values('period')
+        .annotate(revenue=Sum('revenue'), transactions=Sum('transactions'))
+        .order_by('period')
+    )
+    return {
+        **counters,
+        'revenue_total': sum((row['revenue'] for row in series), 0),
+        'revenue': series,
+    }
@@ -1,4 +1,4 @@
-from . import views
+from . import async_views, views
 from django.urls import path
 
 app_name = 'crm'
@@ -8,27 +8,56 @@ urlpatterns = [
     # company
     path('api/create_company/', views.create_company, name='create_company'),
     path('api/get_company/', views.get_company, name='get_company'),
+    path('api/dashboard_stats/', views.dashboard_stats, name='dashboard_stats'),
+    path('api/metrics/', views.metrics, name='metrics'),
+    path('api/export_transactions/', views.export_transactions, name='export_transactions'),
+    path('api/export_leases/', views.export_leases, name='export_leases'),
     # customers
     path('api/customers/', views.customer_details, name='customer_details'),
     path('api/add_customer/', views.add_customer, name='add_customer'),
     path('api/update_customer/<int:user_id>/', views.update_customer, name="update_customer"),
     path('api/delete_customer/<int:user_id>/', views.delete_customer, name='delete_customer'),
+    path('api/customer_purchases/<int:user_id>/', views.customer_purchases, name='customer_purchases'),
+    path('api/customer_leases/<int:user_id>/', views.customer_leases, name='customer_leases'),
+    path('api/bulk_delete_customers/', views.bulk_delete_customers, name='bulk_delete_customers'),
+    path('api/bulk_update_customers/', views.bulk_update_customers, name='bulk_update_customers'),
     # cars get_car_options
     path('api/cars/', views.show_all_cars, name='show_all_cars'),
     path('api/add_car/', views.add_car, name='add_car'),
+    path('api/import_cars/', views.import_cars, name='import_cars'),
     path('api/update_car/<int:car_id>/', views.update_car, name='update_car'),
     path('api/delete_car/<int:car_id>/', views.delete_car, name='delete_car'),
+    path('api/bulk_delete_cars/', views.bulk_delete_cars, name='bulk_delete_cars'),
+    path('api/bulk_update_cars/', views.bulk_update_cars, name='bulk_update_cars'),
     # sell
     path('api/transactions/', views.transaction_list, name='transaction_list'),
     path('api/add_transaction/', views.add_transaction, name='add_transaction'),
     path('api/update_transaction/<int:transaction_id>/', views.update_transaction, name='update_transaction'),
     path('api/delete_transaction/<int:transaction_id>/', views.delete_transaction, name='delete_transaction'),
+    path('api/bulk_delete_transactions/', views.bulk_delete_transactions, name='bulk_delete_transactions'),
+    path('api/bulk_update_transactions/', views.bulk_update_transactions, name='bulk_update_transactions'),
+    path('api/batch_transactions/', views.batch_transactions, name='batch_transactions'),
     path('api/sold/', views.sold, name='sold'),
     # lease
     path('api/leases/', views.leasing_list, name='leasing_list'),
     path('api/add_lease/', views.add_lease, name='add_lease'),
     path('api/update_lease/<int:lease_id>/', views.update_lease, name='update_lease'),
     path('api/delete_lease/<int:lease_id>/', views.delete_lease, name='delete_lease'),
+    path('api/bulk_delete_leases/', views.bulk_delete_leases, name='bulk_delete_leases'),
+    path('api/bulk_update_leases/', views.bulk_update_leases, name='bulk_update_leases'),
+    path('api/car_availability/<int:car_id>/', views.car_availability, name='car_availability'),
+    path('api/quote_leases/', views.quote_leases, name='quote_leases'),
+    path('api/lease_rates/', views.lease_rates, name='lease_rates'),
+    path('api/batch_leases/', views.batch_leases, name='batch_leases'),
     path('api/update_mark_as_returned/<int:lease_id>/', views.update_mark_as_returned, name='update_mark_as_returned'),
+    # async versions of the hot paths, for the ASGI entry point
+    path('api/async/cars/', async_views.show_all_cars, name='async_show_all_cars'),
+    path('api/async/customers/', async_views.customer_details, name='async_customer_details'),
+    path('api/async/transactions/', async_views.transaction_list, name='async_transaction_list'),
+    path('api/async/leases/', async_views.leasing_list, name='async_leasing_list'),
+    path('api/async/add_car/', async_views.add_car, name='async_add_car'),
+    path('api/async/add_customer/', async_views.add_customer, name='async_add_customer'),
+    path('api/async/sold/', async_views.sold, name='async_sold'),
+    path('api/async/lease/', async_views.lease, name='async_lease'),
     
 ]
\ No newline at end of file
@@ -1,7 +1,12 @@
 # crm_app/views.py
+from datetime import date
 from django.shortcuts import get_object_or_404
-from django.http import JsonResponse
-from .models import Cars,Customer,Transaction,Leasing,Company
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_GET
+from .models import Cars,Customer,Transaction,Leasing,Company,LeaseRate,SeasonalRate,OutOfStockError
+from django.db import IntegrityError, transaction as db_transaction
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
 from rest_framework.permissions import IsAuthenticated
@@ -10,6 +15,20 @@ from rest_framework.response import Response
 from rest_framework import status
 
 from .serializers import *
+from .pagination import cursor_page, get_page_size, paginate
+from .filters import CAR_FILTERS, CAR_ORDERING, CUSTOMER_FILTERS, CUSTOMER_ORDERING, filter_queryset, get_ordering
+from .importers import detect_format, import_cars as import_car_rows, iter_rows
+from .stats import dashboard
+from .bulk import bulk_delete, bulk_update, car_changes, lease_changes, parse_ids
+from .batches import BatchItemError, create_leases, create_sales, parse_items
+from .idempotency import IDEMPOTENCY_HEADER, IdempotencyConflict, request_key, run_once
+from .etags import conditional_list
+from .fastpath import (CAR_ROWS, CUSTOMER_LEASE_ROWS, CUSTOMER_ROWS, LEASING_ROWS, PURCHASE_ROWS,
+                       TRANSACTION_ROWS)
+from .exports import EXPORT_FORMATS, export_queryset, export_stream
+from .availability import availability
+from .metrics import registry
+from .pricing import QuoteItemError, quote_leases as price_quotes, replace_rate_table
 
 # ------------------------------------------------------------------------------------------------------------
 
@@ -34,6 +53,7 @@ def create_company(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@conditional_list('details')
 def get_company(request):
     companies = Company.objects.filter(owner=request.user)
     serializer = CompanySerializer(companies, many=True)
@@ -53,25 +73,24 @@ def invite_user_to_company(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@conditional_list('customers')
 def customer_details(request):
     if request.method == 'GET':
-        user = request.user
-        owner = Company.objects.filter(owner=user)
-        if owner:
-            page = int(request.GET.get('page', 1))
-            page_size = int(request.GET.get('page_size', 10))
-            
-            total_count = Customer.objects.count()
-            customers = Customer.objects.all().order_by('-id')[(page-1)*page_size:page*page_size]
+        if request.company_ids:
+            try:
+                queryset = Customer.objects.for_companies(request.company_ids)
+                queryset = filter_queryset(request, queryset, CUSTOMER_FILTERS)
+                customers, page_info = paginate(request, CUSTOMER_ROWS.values(queryset),
+                                                get_ordering(request, CUSTOMER_ORDERING))
+            except ValueError as ve:
+                return Response({'error': str(ve)}, status=status.HTTP_400_BAD_REQUEST)
 
             if not customers:
                 return Response({'message': 'No customers found!'}, status=status.HTTP_204_NO_CONTENT)
 
-            serializer = CustomerSerializer(customers, many=True)
-
             return Response({
-                    'total_count': total_count,
-                    'customers': serializer.data  # key is 'customers'
+                    **page_info,
+                    'customers': CUSTOMER_ROWS.represent(customers)  # key is 'customers'
                 }, status=status.HTTP_200_OK)
         else:
             return Response({'error': 'Not authorized'}, status=status.HTTP_403_FORBIDDEN)
@@ -86,12 +105,10 @@ def customer_details(request):
 def add_customer(request):
 
     if request.method == 'POST':
-        user = request.user
-        owner = Company.objects.filter(owner=user)
-        if owner:
+        if request.company_ids:
             serializer = CustomerSerializer(data=request.data)
             if serializer.is_valid():
-                serializer.save()
+                serializer.save(company_id=request.company_ids[0])
                 return Response(serializer.data, status=status.HTTP_201_CREATED)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         else:
@@ -104,10 +121,8 @@ def add_customer(request):
 @permission_classes([IsAuthenticated])
 def update_customer(request, user_id):
     if request.method == 'PUT':
-        user = request.user
-        owner = Company.objects.filter(owner=user)
-        if owner:
-            customer = get_object_or_404(Customer, id=user_id)
+        if request.company_ids:
+            customer = get_object_or_404(Customer.objects.for_companies(request.company_ids), id=user_id)
             serializer = CustomerSerializer(customer, data=request.data, partial=True)
             
             if serializer.is_valid():
@@ -125,10 +140,8 @@ def update_customer(request, user_id):
 @permission_classes([IsAuthenticated])
 def delete_customer(request,user_id):
     if request.method == 'DELETE':
-        user = request.user
-        owner = Company.objects.filter(owner=user)
-        if owner:
-            customer = get_object_or_404(Customer, id=user_id)
+        if request.company_ids:
+            customer = get_object_or_404(Customer.objects.for_companies(request.company_ids), id=user_id)
             customer.delete()
             return Response({'message': 'Customer deleted successfully'}, status=status.HTTP_204_NO_CONTENT)
         else:
@@ -137,29 +150,70 @@ def delete_customer(request,user_id):
         return JsonResponse({'error': 'Invalid request method.'}, status=400)
 
 
+def customer_history_response(request, plan, queryset, key, empty_message):
+    # History pages are always keyset-paginated, newest first
+    try:
+        rows, page_info = cursor_page(request, plan.values(queryset), get_page_size(request))
+    except ValueError as ve:
+        return Response({'error': str(ve)}, status=status.HTTP_400_BAD_REQUEST)
+
+    if not rows:
+        return Response({'message': empty_message}, status=status.HTTP_204_NO_CONTENT)
+
+    return Response({**page_info, key: plan.represent(rows)}, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@conditional_list('transactions', 'cars')
+def customer_purchases(request, user_id):
+    if request.method == 'GET':
+        if request.company_ids:
+            queryset = Transaction.objects.for_companies(request.company_ids).filter(customer_id=user_id)
+            return customer_history_response(request, PURCHASE_ROWS, queryset,
+                                             'purchases', 'No purchases found!')
+        else:
+            return Response({'error': 'Not authorized'}, status=status.HTTP_403_FORBIDDEN)
+    else:
+        return JsonResponse({'error': 'Invalid request method.'}, status=400)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@conditional_list('leases', 'cars')
+def customer_leases(request, user_id):
+    if request.method == 'GET':
+        if request.company_ids:
+            queryset = Leasing.objects.for_companies(request.company_ids).filter(customer_id=user_id)
+            return customer_history_response(request, CUSTOMER_LEASE_ROWS, queryset,
+                                             'leases', 'No leases found!')
+        else:
+            return Response({'error': 'Not authorized'}, status=status.HTTP_403_FORBIDDEN)
+    else:
+        return JsonResponse({'error': 'Invalid request method.'}, status=400)
+
+
 # ------------------------------------------------------------------------------------------------------------
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@conditional_list('cars')
 def show_all_cars(request):
     if request.method == 'GET':
-        user = request.user
-        owner = Company.objects.filter(owner=user)
-        if owner:
-            page = int(request.GET.get('page', 1))
-            page_size = int(request.GET.get('page_size', 10))
-            
-            total_count = Cars.objects.count()
-            cars = Cars.objects.all().order_by('-id')[(page-1)*page_size:page*page_size]
+        if request.company_ids:
+            try:
+                queryset = Cars.objects.for_companies(request.company_ids)
+                queryset = filter_queryset(request, queryset, CAR_FILTERS)
+                cars, page_info = paginate(request, CAR_ROWS.values(queryset), get_ordering(request, CAR_ORDERING))
+            except ValueError as ve:
+                return Response({'error': str(ve)}, status=status.HTTP_400_BAD_REQUEST)
             
             if not cars:
                 return Response({'message': 'No cars found!'}, status=status.HTTP_204_NO_CONTENT)
-            
-            serializer = CarSerializer(cars, many=True)
 
             return Response({
-                'total_count': total_count,
-                'cars': serializer.data
+                **page_info,
+                'cars': CAR_ROWS.represent(cars)
             }, status=status.HTTP_200_OK)
         else:
             return Response({'error': 'Not authorized'}, status=status.HTTP_403_FORBIDDEN)
@@ -172,19 +226,13 @@ def show_all_cars(request):
 @permission_classes([IsAuthenticated])
 def add_car(request):
     if request.method == 'POST':
-        user = request.user
-        try:
-            # Fetch the company associated with the user
-            company = Company.objects.get(owner=user)
-        except Company.DoesNotExist:
+        # The company associated with the user, resolved once per request
+        if not request.company_ids:
             return Response({'error': 'Not authorized'}, status=status.HTTP_403_FORBIDDEN)
 
-        # Add the company_id to the request data
-        request.data['company'] = company.id
-
         serializer = CarSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            serializer.save(company_id=request.company_ids[0])
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     else:
@@ -193,14 +241,37 @@ def add_car(request):
 
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def import_cars(request):
+    if request.method == 'POST':
+        # The company associated with the user is resolved once for the whole feed
+        if not request.company_ids:
+            return Response({'error': 'Not authorized'}, status=status.HTTP_403_FORBIDDEN)
+
+        if request.stream is None:
+            return Response({'error': 'Empty request body.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            rows = iter_rows(request.stream, detect_format(request))
+            report = import_car_rows(rows, request.company_ids[0])
+        except ValueError as ve:
+            return Response({'error': str(ve)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # earlier chunks stay committed when the feed breaks; the report says how far it got
+        if 'error' in report or (report['created'] == 0 and report['failed']):
+            return Response(report, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report, status=status.HTTP_201_CREATED)
+    else:
+        return Response({'error': 'Invalid request method.'}, status=status.HTTP_400_BAD_REQUEST)
+
+
 @api_view(['PUT'])
 @permission_classes([IsAuthenticated])
 def update_car(request, car_id):
     if request.method == 'PUT':
-        user = request.user
-        owner = Company.objects.filter(owner=user)
-        if owner:
-            car = get_object_or_404(Cars, id=car_id)
+        if request.company_ids:
+            car = get_object_or_404(Cars.objects.for_companies(request.company_ids), id=car_id)
 
             if not car:
                 return Response(status=status.HTTP_204_NO_CONTENT)
@@ -221,10 +292,8 @@ def update_car(request, car_id):
 @permission_classes([IsAuthenticated])
 def delete_car(request, car_id):
     if request.method == 'DELETE':
-        user = request.user
-        owner = Company.objects.filter(owner=user)
-        if owner:
-            car = get_object_or_404(Cars, id=car_id)
+        if request.company_ids:
+            car = get_object_or_404(Cars.objects.for_companies(request.company_ids), id=car_id)
             car.delete()
             return Response({'message': 'Car deleted successfully'}, status=status.HTTP_204_NO_CONTENT)
         else:
@@ -238,22 +307,21 @@ def delete_car(request, car_id):
 # transactions view
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@conditional_list('transactions', 'cars', 'customers')
 def transaction_list(request):
     if request.method == 'GET':
-        page = int(request.GET.get('page'))
-        page_size = int(request.GET.get('page_size', 10))
-
-        total_count = Transaction.objects.count()
-        transactions = Transaction.objects.all().order_by('-id')[(page-1)*page_size:page*page_size]
+        try:
+            queryset = TRANSACTION_ROWS.values(Transaction.objects.for_companies(request.company_ids))
+            transactions, page_info = paginate(request, queryset)
+        except ValueError as ve:
+            return Response({'error': str(ve)}, status=status.HTTP_400_BAD_REQUEST)
 
         if not transactions:
             return Response({'message': 'No transactions found!'}, status=status.HTTP_204_NO_CONTENT)
-        
-        serializer = TransactionReadSerializer(transactions, many=True)
 
         return Response({
-            'total_count': total_count,
-            'transactions': serializer.data},  # key is 'transactions'
+            **page_info,
+            'transactions': TRANSACTION_ROWS.represent(transactions)},  # key is 'transactions'
 
             status=status.HTTP_200_OK)
     
@@ -264,20 +332,24 @@ def transaction_list(request):
 @permission_classes([IsAuthenticated])
 def add_transaction(request):
     if request.method == 'POST':
-        serializer = TransactionCreateSerializer(data=request.data)
+        if not request.company_ids:
+            return Response({'error': 'Not authorized'}, status=status.HTTP_403_FORBIDDEN)
+        serializer = TransactionCreateSerializer(data=request.data, context={'company_ids': request.company_ids})
         if serializer.is_valid():
-            car_id = serializer.validated_data['car'].id
+            car = serializer.validated_data['car']
             number_of_sold = 1  # each transaction represents the sale of one car
 
             try:
-                car = Cars.objects.get(id=car_id)
-                car.sold(number_of_sold)
-                transaction = serializer.save()
+                # stock decrement and the transaction insert commit or roll back together
+                with db_transaction.atomic():
+                    car.sold(number_of_sold)
+                    # the sale belongs to the company that owns the car
+                    transaction = serializer.save(company_id=car.company_id)
                 read_serializer = TransactionReadSerializer(transaction)
                 return Response(read_serializer.data, status=status.HTTP_201_CREATED)
             
-            except Cars.DoesNotExist:
-                return Response({"error": "Car not found."}, status=status.HTTP_404_NOT_FOUND)
+            except (OutOfStockError, IntegrityError) as e:
+                return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT)
             except ValueError as ve:
                 return Response({"error": str(ve)}, status=status.HTTP_400_BAD_REQUEST)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -289,8 +361,9 @@ def add_transaction(request):
 @permission_classes([IsAuthenticated])
 def update_transaction(request, transaction_id):
     if request.method == 'PUT':
-        transaction = get_object_or_404(Transaction, id=transaction_id)
-        serializer = TransactionCreateSerializer(transaction, data=request.data, partial=True)
+        transaction = get_object_or_404(Transaction.objects.for_companies(request.company_ids), id=transaction_id)
+        serializer = TransactionCreateSerializer(transaction, data=request.data, partial=True,
+                                                 context={'company_ids': request.company_ids})
         
         if serializer.is_valid():
             serializer.save()
@@ -306,7 +379,7 @@ def update_transaction(request, transaction_id):
 def delete_transaction(request, transaction_id):
     if request.method == 'DELETE':
 
-        transaction = get_object_or_404(Transaction, id=transaction_id)
+        transaction = get_object_or_404(Transaction.objects.for_companies(request.company_ids), id=transaction_id)
         transaction.delete()
         return Response({'message': 'Transaction deleted successfully'}, status=status.HTTP_204_NO_CONTENT)
 
@@ -319,20 +392,21 @@ def delete_transaction(request, transaction_id):
 # leas view
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@conditional_list('leases', 'cars', 'customers')
 def leasing_list(request):
     if request.method == 'GET':
-        page = int(request.GET.get('page'))
-        page_size = int(request.GET.get('page_size', 10))
-        total_count = Leasing.objects.count()
-        leases = Leasing.objects.all().order_by('-id')[(page-1)*page_size:page*page_size]
+        try:
+            queryset = LEASING_ROWS.values(Leasing.objects.for_companies(request.company_ids))
+            leases, page_info = paginate(request, queryset)
+        except ValueError as ve:
+            return Response({'error': str(ve)}, status=status.HTTP_400_BAD_REQUEST)
 
         if not leases:
             return Response({'message': 'No leases found!'}, status=status.HTTP_204_NO_CONTENT)
-        
-        serializer = LeasingReadSerializer(leases, many=True)
+
         return Response({
-            'total_count': total_count,
-            'leases': serializer.data},  # key is 'leases'
+            **page_info,
+            'leases': LEASING_ROWS.represent(leases)},  # key is 'leases'
          status=status.HTTP_200_OK)
     
     else:
@@ -343,20 +417,29 @@ def leasing_list(request):
 @permission_classes([IsAuthenticated])
 def add_lease(request):
     if request.method == 'POST':
-        serializer = LeasingCreateSerializer(data=request.data)
+        if not request.company_ids:
+            return Response({'error': 'Not authorized'}, status=status.HTTP_403_FORBIDDEN)
+        serializer = LeasingCreateSerializer(data=request.data, context={'company_ids': request.company_ids})
         if serializer.is_valid():
-            car_id = serializer.validated_data['car'].id
+            car = serializer.validated_data['car']
             lease_number = 1
 
             try:
-                car = Cars.objects.get(id=car_id)
-                car.lease(lease_number)
-                lease = serializer.save()
+                # stock decrement and the lease insert commit or roll back together
+                with db_transaction.atomic():
+                    # the car row lock makes concurrent leases of it check and book one at a time
+                    car = Cars.objects.for_companies(request.company_ids).select_for_update().get(id=car.id)
+                    # the calendar also sees units a changed stock count no longer covers
+                    data = serializer.validated_data
+                    if availability(car, data['lease_start_date'], data['lease_end_date'])['available'] < lease_number:
+                        raise OutOfStockError("No unit of this car is free for the whole lease period.")
+                    car.lease(lease_number)
+                    lease = serializer.save(car=car, company_id=car.company_id)
                 read_serializer = LeasingReadSerializer(lease)
                 return Response(read_serializer.data, status=status.HTTP_201_CREATED)
             
-            except Cars.DoesNotExist:
-                return Response({"error": "Car not found."}, status=status.HTTP_404_NOT_FOUND)
+            except (OutOfStockError, IntegrityError) as e:
+                return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT)
             except ValueError as ve:
                 return Response({"error": str(ve)}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -366,13 +449,75 @@ def add_lease(request):
 
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@conditional_list('cars', 'leases')
+def car_availability(request, car_id):
+    car = get_object_or_404(Cars.objects.for_companies(request.company_ids), id=car_id)
+    try:
+        date_from = date.fromisoformat(request.GET['date_from'])
+        date_to = date.fromisoformat(request.GET['date_to'])
+    except (KeyError, ValueError):
+        return Response({'error': 'date_from and date_to are required, in YYYY-MM-DD format.'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if date_to < date_from:
+        return Response({'error': 'date_to must not be before date_from.'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(availability(car, date_from, date_to), status=status.HTTP_200_OK)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def quote_leases(request):
+    if not request.company_ids:
+        return Response({'error': 'Not authorized'}, status=status.HTTP_403_FORBIDDEN)
+    try:
+        quotes = price_quotes(request.data, request.company_ids)
+    except QuoteItemError as e:
+        return Response({'leases': e.errors}, status=status.HTTP_400_BAD_REQUEST)
+    except ValueError as ve:
+        return Response({'error': str(ve)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({'quotes': quotes}, status=status.HTTP_200_OK)
+
+
+def rate_table_response(company_ids):
+    # request.company_ids is lazy, and an __in lookup rebuilds the value with its type
+    company_ids = list(company_ids)
+    rates = LeaseRate.objects.filter(company_id__in=company_ids).order_by('company', 'car', 'min_days')
+    seasons = SeasonalRate.objects.filter(company_id__in=company_ids).order_by('company', 'start_date', 'id')
+    return {'rates': LeaseRateSerializer(rates, many=True).data,
+            'seasons': SeasonalRateSerializer(seasons, many=True).data}
+
+
+@api_view(['GET', 'PUT'])
+@permission_classes([IsAuthenticated])
+def lease_rates(request):
+    if request.method == 'GET':
+        return Response(rate_table_response(request.company_ids), status=status.HTTP_200_OK)
+
+    serializer = RateTableSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    data = serializer.validated_data
+    if data['company'] not in request.company_ids:
+        return Response({'error': 'Not authorized'}, status=status.HTTP_403_FORBIDDEN)
+    car_ids = {row['car_id'] for row in [*data['rates'], *data['seasons']]} - {None}
+    if Cars.objects.filter(company_id=data['company'], id__in=car_ids).count() != len(car_ids):
+        return Response({'error': 'Car not found.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    # existing leases keep their amounts; manage.py reprice_leases applies the new table to them
+    replace_rate_table(data['company'], data['rates'], data['seasons'])
+    return Response(rate_table_response([data['company']]), status=status.HTTP_200_OK)
+
+
+
 @api_view(['PUT'])
 @permission_classes([IsAuthenticated])
 def update_lease(request, lease_id):
 
     if request.method == 'PUT':
-        lease = get_object_or_404(Leasing, id=lease_id)
-        serializer = LeasingCreateSerializer(lease, data=request.data, partial=True)
+        lease = get_object_or_404(Leasing.objects.for_companies(request.company_ids), id=lease_id)
+        serializer = LeasingCreateSerializer(lease, data=request.data, partial=True,
+                                             context={'company_ids': request.company_ids})
         
         if serializer.is_valid():
             serializer.save()
@@ -389,7 +534,7 @@ def update_lease(request, lease_id):
 def update_mark_as_returned(request, lease_id):
     if request.method == 'PUT':
         try:
-            lease = Leasing.objects.get(id=lease_id)
+            lease = Leasing.objects.for_companies(request.company_ids).get(id=lease_id)
             lease.mark_as_returned_from_lease = True
             lease.save()
             return Response({'message': 'Lease updated successfully'}, status=status.HTTP_200_OK)
@@ -404,7 +549,7 @@ def update_mark_as_returned(request, lease_id):
 def delete_lease(request, lease_id):
 
     if request.method == 'DELETE':
-        lease = get_object_or_404(Leasing, id=lease_id)
+        lease = get_object_or_404(Leasing.objects.for_companies(request.company_ids), id=lease_id)
         lease.delete()
         return Response({'message': 'Lease deleted successfully'}, status=status.HTTP_204_NO_CONTENT)
     else:
@@ -414,6 +559,239 @@ def delete_lease(request, lease_id):
 
 
 
+# ------------------------------------------------------------------------------------------------------------
+# dashboard view
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def dashboard_stats(request):
+    if request.method == 'GET':
+        if not request.company_ids:
+            return Response({'error': 'Not authorized'}, status=status.HTTP_403_FORBIDDEN)
+
+        group_by = request.GET.get('group_by', 'day')
+        if group_by not in ('day', 'month'):
+            return Response({'error': "group_by must be 'day' or 'month'."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            date_from = date.fromisoformat(request.GET['date_from']) if request.GET.get('date_from') else None
+            date_to = date.fromisoformat(request.GET['date_to']) if request.GET.get('date_to') else None
+        except ValueError:
+            return Response({'error': 'Dates must be in YYYY-MM-DD format.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        stats = dashboard(request.company_ids, group_by, date_from, date_to)
+        serializer = DashboardStatsSerializer(stats)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+    else:
+        return JsonResponse({'error': 'Invalid request method.'}, status=400)
+
+
+# Prometheus scrape target; a plain Django view so it answers in the text exposition format
+@require_GET
+def metrics(request):
+    token = settings.METRICS_TOKEN
+    if not token:
+        return HttpResponse(status=404)
+    if not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse(status=403)
+    return HttpResponse(registry.exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+
+# ------------------------------------------------------------------------------------------------------------
+
+def export_response(request, model, basename):
+    if not request.company_ids:
+        return Response({'error': 'Not authorized'}, status=status.HTTP_403_FORBIDDEN)
+
+    fmt = request.GET.get('output_format', 'csv').lower()
+    if fmt not in EXPORT_FORMATS:
+        return Response({'error': "output_format must be 'csv' or 'ndjson'."}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        date_from = date.fromisoformat(request.GET['date_from']) if request.GET.get('date_from') else None
+        date_to = date.fromisoformat(request.GET['date_to']) if request.GET.get('date_to') else None
+        company_ids = [int(pk) for pk in request.GET.getlist('company')] or list(request.company_ids)
+    except ValueError:
+        return Response({'error': 'Dates must be in YYYY-MM-DD format and company ids integers.'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if not set(company_ids) <= set(request.company_ids):
+        return Response({'error': 'Not authorized'}, status=status.HTTP_403_FORBIDDEN)
+
+    compress = request.GET.get('gzip', '').lower() in ('1', 'true', 'yes')
+    content_type, extension = EXPORT_FORMATS[fmt]
+    filename = f'{basename}.{extension}'
+    if compress:
+        content_type, filename = 'application/gzip', filename + '.gz'
+
+    queryset = export_queryset(model, company_ids, date_from, date_to)
+    response = StreamingHttpResponse(export_stream(queryset, fmt, compress), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_transactions(request):
+    if request.method == 'GET':
+        return export_response(request, Transaction, 'transactions')
+    else:
+        return JsonResponse({'error': 'Invalid request method.'}, status=400)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_leases(request):
+    if request.method == 'GET':
+        return export_response(request, Leasing, 'leases')
+    else:
+        return JsonResponse({'error': 'Invalid request method.'}, status=400)
+
+
+# ------------------------------------------------------------------------------------------------------------
+# bulk views
+def bulk_delete_response(request, model):
+    if not request.company_ids:
+        return Response({'error': 'Not authorized'}, status=status.HTTP_403_FORBIDDEN)
+    try:
+        ids = parse_ids(request.data)
+    except ValueError as ve:
+        return Response({'error': str(ve)}, status=status.HTTP_400_BAD_REQUEST)
+
+    results = bulk_delete(model.objects.for_companies(request.company_ids), ids)
+    return Response({'results': results}, status=status.HTTP_200_OK)
+
+
+def bulk_update_response(request, model, serializer_class, prepare_changes=None):
+    if not request.company_ids:
+        return Response({'error': 'Not authorized'}, status=status.HTTP_403_FORBIDDEN)
+    try:
+        ids = parse_ids(request.data)
+    except ValueError as ve:
+        return Response({'error': str(ve)}, status=status.HTTP_400_BAD_REQUEST)
+
+    changes = request.data.get('changes')
+    if not isinstance(changes, dict) or not changes:
+        return Response({'error': "'changes' must be a non-empty object."}, status=status.HTTP_400_BAD_REQUEST)
+
+    if 'company' in changes:
+        return Response({'error': "'company' cannot be changed; rows stay with their company."},
+                        status=status.HTTP_400_BAD_REQUEST)
+    # car and customer references are looked up in the caller's companies only
+    serializer = serializer_class(data=changes, partial=True, context={'company_ids': request.company_ids})
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        validated = dict(serializer.validated_data)
+        if prepare_changes:
+            validated = prepare_changes(validated)
+    except ValueError as ve:
+        return Response({'error': str(ve)}, status=status.HTTP_400_BAD_REQUEST)
+
+    results = bulk_update(model.objects.for_companies(request.company_ids), ids, validated)
+    return Response({'results': results}, status=status.HTTP_200_OK)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_delete_cars(request):
+    return bulk_delete_response(request, Cars)
+
+
+@api_view(['PATCH'])
+@permission_classes([IsAuthenticated])
+def bulk_update_cars(request):
+    return bulk_update_response(request, Cars, CarSerializer, car_changes)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_delete_customers(request):
+    return bulk_delete_response(request, Customer)
+
+
+@api_view(['PATCH'])
+@permission_classes([IsAuthenticated])
+def bulk_update_customers(request):
+    return bulk_update_response(request, Customer, CustomerSerializer)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_delete_transactions(request):
+    return bulk_delete_response(request, Transaction)
+
+
+@api_view(['PATCH'])
+@permission_classes([IsAuthenticated])
+def bulk_update_transactions(request):
+    return bulk_update_response(request, Transaction, TransactionCreateSerializer)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_delete_leases(request):
+    return bulk_delete_response(request, Leasing)
+
+
+@api_view(['PATCH'])
+@permission_classes([IsAuthenticated])
+def bulk_update_leases(request):
+    return bulk_update_response(request, Leasing, LeasingCreateSerializer, lease_changes)
+
+
+# ------------------------------------------------------------------------------------------------------------
+# batch create views
+def batch_create_response(request, name, item_serializer_class, create, result_serializer_class):
+    if not request.company_ids:
+        return Response({'error': 'Not authorized'}, status=status.HTTP_403_FORBIDDEN)
+    try:
+        key = request_key(request)
+        items = parse_items(request.data, name)
+    except ValueError as ve:
+        return Response({'error': str(ve)}, status=status.HTTP_400_BAD_REQUEST)
+
+    serializer = item_serializer_class(data=items, many=True)
+    if not serializer.is_valid():
+        return Response({name: serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+    def apply():
+        try:
+            created = create(serializer.validated_data, request.company_ids)
+        except BatchItemError as e:
+            return status.HTTP_400_BAD_REQUEST, {name: e.errors}
+        except (OutOfStockError, IntegrityError) as e:
+            return status.HTTP_409_CONFLICT, {'error': str(e)}
+        return status.HTTP_201_CREATED, {'created': len(created), name: result_serializer_class(created, many=True).data}
+
+    if key is None:
+        status_code, body = apply()
+        return Response(body, status=status_code)
+    try:
+        # a retried batch replays the stored response instead of running again
+        status_code, body, replayed = run_once(request.user, name, key, request.data, apply)
+    except IdempotencyConflict as e:
+        return Response({'error': str(e)}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    response = Response(body, status=status_code)
+    response[IDEMPOTENCY_HEADER] = key
+    if replayed:
+        response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def batch_transactions(request):
+    return batch_create_response(request, 'transactions', SaleItemSerializer, create_sales,
+                                 TransactionBatchResultSerializer)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def batch_leases(request):
+    return batch_create_response(request, 'leases', LeaseItemSerializer, create_leases,
+                                 LeasingBatchResultSerializer)
+
+
+
 # ------------------------------------------------------------------------------------------------------------
 @login_required
 @api_view(['POST'])
@@ -427,11 +805,13 @@ def sold(request):
         return JsonResponse({"error": "Invalid number_of_sold value. Must be a positive integer."}, safe=False, status=400)
 
     try:
-        car = Cars.objects.get(id=car_id)
+        car = Cars.objects.for_companies(request.company_ids).get(id=car_id)
         car.sold(number_of_sold)
         return JsonResponse({"message": "Car sold successfully."}, safe=False)
     except Cars.DoesNotExist:
         return JsonResponse({"error": "Car not found."}, safe=False, status=404)
+    except OutOfStockError as e:
+        return JsonResponse({"error": str(e)}, safe=False, status=409)
     except ValueError as ve:
         return JsonResponse({"error": str(ve)}, safe=False, status=400)
 
@@ -447,10 +827,12 @@ def lease(request):
         return JsonResponse({"error": "Invalid number_of_lease value. Must be a positive integer."}, safe=False, status=400)
 
     try:
-        car = Cars.objects.get(id=car_id)
+        car = Cars.objects.for_companies(request.company_ids).get(id=car_id)
         car.lease(number_of_lease)
         return JsonResponse({"message": "Car leased successfully."}, safe=False)
     except Cars.DoesNotExist:
         return JsonResponse({"error": "Car not found."}, safe=False, status=404)
+    except OutOfStockError as e:
+        return JsonResponse({"error": str(e)}, safe=False, status=409)
     except ValueError as ve:
         return JsonResponse({"error": str(ve)}, safe=False, status=400)
\ No newline at end of file
@@ -15,8 +15,12 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 from pathlib import Path
 import os
 from datetime import timedelta
+from corsheaders.defaults import default_headers
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
+from .database import database_from_env, env_flag, replicas_from_env
+
 # Load environment variables from a .env file
 load_dotenv()
 
@@ -68,12 +72,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'crm.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'crm.middleware.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'crm.middleware.CompanyMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -91,6 +98,17 @@ CORS_ALLOW_METHODS = [
     'PUT',
 ]
 
+# let the front-end read the list ETags for conditional requests
+# and retry batch creates with an Idempotency-Key
+CORS_EXPOSE_HEADERS = ['ETag', 'Idempotency-Key', 'Idempotent-Replayed']
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+
+# how long a batch create outcome is replayed for a retried Idempotency-Key
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60  # seconds
+
+# receipt numbers each process reserves per sequence write (see crm/receipts.py)
+RECEIPT_BLOCK_SIZE = int(os.getenv('RECEIPT_BLOCK_SIZE', 50))
+
 ROOT_URLCONF = 'crm_project.urls'
 
 TEMPLATES = [
@@ -114,6 +132,11 @@ REST_FRAMEWORK = {
         # Authentication classes for protected endpoints
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        # orjson-backed, byte-compatible with rest_framework.renderers.JSONRenderer
+        'crm.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
     'DEFAULT_PERMISSION_CLASSES': (
         # Permissions for protected endpoints
         'rest_framework.permissions.AllowAny',  # Allows public access
@@ -121,18 +144,107 @@ REST_FRAMEWORK = {
 }
 
 
+# Process-local cache of the company ids owned by each user (request.company_ids)
+COMPANY_CACHE_SIZE = 1024
+COMPANY_CACHE_TTL = 60  # seconds
+
+# Share of requests whose SQL, serialize and render time are measured and logged
+# on crm.requests (see crm/metrics.py); 0 turns this off
+REQUEST_METRICS_SAMPLE_RATE = float(os.getenv('REQUEST_METRICS_SAMPLE_RATE', 1.0))
+# Also send those timings to the client in a Server-Timing header (bench_api reads
+# query counts from it); off by default so clients don't see the server's internals
+SERVER_TIMING_HEADER = env_flag('SERVER_TIMING_HEADER', 'false')
+
+# Bearer token Prometheus sends to crm/api/metrics/; the endpoint is off without one.
+# Counters live in each server worker (labelled worker="<pid>"), so scrape every
+# worker as its own target rather than through the load balancer
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'requests': {'class': 'logging.StreamHandler', 'formatter': 'message'},
+    },
+    'loggers': {
+        # REQUEST_LOG_LEVEL=INFO logs one JSON line per sampled request
+        'crm.requests': {'handlers': ['requests'], 'level': os.getenv('REQUEST_LOG_LEVEL', 'WARNING'),
+                         'propagate': False},
+    },
+}
+
+# Process-local cache of each company's lease rate tables (crm/pricing.py), keyed
+# by the rates version in the database, so every process sees a change at once
+PRICE_LIST_CACHE_SIZE = 1024
+PRICE_LIST_CACHE_TTL = 60  # seconds
+
+
+# Read-through cache for list responses. Entries are keyed by the per-company
+# version counters, so writes invalidate them without explicit deletes.
+# Set RESPONSE_CACHE_URL=redis://host:6379/0 to share it between workers;
+# by default every process keeps its own bounded LRU.
+RESPONSE_CACHE_URL = os.getenv('RESPONSE_CACHE_URL')
+RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', 300))  # seconds
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', 2048))  # entries, local backend only
+RESPONSE_CACHE_ALIAS = 'responses'
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'crm-default',
+    },
+    RESPONSE_CACHE_ALIAS: {
+        'BACKEND': 'crm.cache_backends.RespCache',
+        'LOCATION': RESPONSE_CACHE_URL,
+        'TIMEOUT': RESPONSE_CACHE_TTL,
+        'KEY_PREFIX': 'crm',
+    } if RESPONSE_CACHE_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'crm-responses',
+        'TIMEOUT': RESPONSE_CACHE_TTL,
+        'OPTIONS': {'MAX_ENTRIES': RESPONSE_CACHE_SIZE},
+    },
+}
+
+
 WSGI_APPLICATION = 'crm_project.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
+# Configured from DATABASE_URL and friends, see crm_project/database.py.
+# Without it this is the same SQLite file as before, with persistent
+# connections and the WAL / busy_timeout pragmas applied on connect.
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_from_env(BASE_DIR),
 }
 
+# Read replicas from DATABASE_REPLICA_URLS. GET requests read from them
+# unless the client wrote within the last REPLICA_PIN_SECONDS; the pins live
+# in REPLICA_PIN_CACHE, shared by all workers through REPLICA_PIN_CACHE_URL
+# (default RESPONSE_CACHE_URL). Replicas are refused without it: with pins
+# kept per process, a read answered by another worker could miss the write.
+DATABASES.update(replicas_from_env(BASE_DIR))
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['crm.routers.PrimaryReplicaRouter']
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 10))
+REPLICA_PIN_CACHE_URL = os.getenv('REPLICA_PIN_CACHE_URL') or RESPONSE_CACHE_URL
+REPLICA_PIN_CACHE = 'replica_pins' if REPLICA_PIN_CACHE_URL else 'default'
+if REPLICA_PIN_CACHE_URL:
+    CACHES[REPLICA_PIN_CACHE] = {
+        'BACKEND': 'crm.cache_backends.RespCache',
+        'LOCATION': REPLICA_PIN_CACHE_URL,
+        'KEY_PREFIX': 'crm-pins',  # outside the response cache's namespace, which clear() empties
+    }
+elif DATABASE_REPLICAS:
+    raise ImproperlyConfigured("DATABASE_REPLICA_URLS needs REPLICA_PIN_CACHE_URL or RESPONSE_CACHE_URL, "
+                               "so replica pins are shared between workers.")
+
+SQLITE_TUNING = env_flag('SQLITE_TUNING', 'true')
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 